@@ -0,0 +1,95 @@
+'''Benchmarks of each source against its recorded fixture: fetching and
+parsing the pubs from a local HTTP server replaying the source, cleaning
+them, and geocoding them with the recorded GoogleMaps results.
+
+Usage: python -m pytest benchmarks [--update-baseline]
+
+Each benchmark fails when it is slower than its time in
+benchmarks/baseline.json, with the tolerance of conftest.py. CI runs the
+command above with no network access; the baseline is updated with
+``--update-baseline`` on the CI runner after an intended change.
+
+The fixtures are read from tests/fixtures (or the UK_PUBS_FIXTURES
+directory). Synthetic ones are committed there (see
+tests/fixtures/generate.py), and fixtures of the real sources are recorded
+with ``uk-pubs-record SOURCE --geocode``. Sources without a fixture are
+skipped.
+'''
+import os
+
+import pandas
+import pytest
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.registry import SOURCES
+from uk_pubs.replay import (
+    Fixture,
+    FixtureServer,
+    ReplayGeocoder,
+    ReplayTransport,
+)
+from uk_pubs.utils import get_geoinfo
+
+
+FIXTURES_DIR = os.environ.get(
+    'UK_PUBS_FIXTURES',
+    os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+)
+
+
+@pytest.fixture(params=sorted(SOURCES))
+def key(request) -> str:
+    return request.param
+
+
+@pytest.fixture
+def fixture(key) -> Fixture:
+    path = os.path.join(FIXTURES_DIR, key + '.json.gz')
+    if not os.path.exists(path):
+        pytest.skip('No fixture recorded for %s at %s' % (key, path))
+
+    return Fixture.load(path)
+
+
+def get_raw(key: str, fixture: Fixture) -> pandas.DataFrame:
+    connector = SOURCES[key].connector_class(ReplayTransport(fixture))
+
+    return concat_batches(connector.iter_batches())
+
+
+def test_fetch(benchmark, key, fixture):
+    connector_class = SOURCES[key].connector_class
+
+    with FixtureServer(fixture) as server, server.transport() as transport:
+        connector = connector_class(transport)
+        raw = benchmark(lambda: concat_batches(connector.iter_batches()))
+
+    assert len(raw) > 0
+
+
+def test_clean(benchmark, key, fixture):
+    source = SOURCES[key]
+    raw = get_raw(key, fixture)
+
+    clean = benchmark(source.process, raw)
+
+    assert len(clean) == len(raw)
+
+
+def test_geocode(benchmark, key, fixture):
+    if not fixture.geocode_results:
+        pytest.skip('No GoogleMaps results recorded for %s' % key)
+
+    source = SOURCES[key]
+    search_strings = source.search_strings(source.process(
+        get_raw(key, fixture)
+    )).dropna().unique()
+
+    geo_info = benchmark(
+        get_geoinfo,
+        ReplayGeocoder(fixture),
+        search_strings,
+        qps=float('inf')
+    )
+
+    assert len(geo_info) == len(search_strings)
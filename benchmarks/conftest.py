@@ -0,0 +1,137 @@
+'''Fallback ``benchmark`` fixture, for running the benchmarks without
+pytest-benchmark installed. It times a few rounds of the benchmarked function
+and reports the best and mean times at the end of the session.
+
+With either fixture, the best time of each benchmark is compared with the committed baseline
+(``baseline.json``), and the benchmark fails if it is more than the tolerance
+slower. Run with ``--update-baseline`` to save the times as the new baseline,
+e.g. on the CI runner after an intended change.
+'''
+import json
+import os
+import time
+
+import pytest
+
+try:
+    import pytest_benchmark
+except ImportError:
+    pytest_benchmark = None
+
+
+# Number of rounds timed by the fallback fixture
+ROUNDS = int(os.environ.get('BENCHMARK_ROUNDS', 5))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# Slowdown allowed over the baseline, as a fraction of it, and in ms (for
+# benchmarks of a few ms, dominated by noise)
+TOLERANCE = 1.0
+SLACK_MS = 10.0
+
+_timings = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('baseline')
+    group.addoption(
+        '--update-baseline', action='store_true',
+        help='Save the best times as the baseline instead of checking them'
+    )
+    group.addoption(
+        '--baseline-tolerance', type=float, default=TOLERANCE,
+        help='Slowdown allowed over the baseline, as a fraction of it '
+        '(default: %(default)s)'
+    )
+
+
+class _Benchmark:
+    def __init__(self, name: str):
+        self.name = name
+        self.extra_info = {}
+
+    def __call__(self, function, *args, **kwargs):
+        timings = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            timings.append(time.perf_counter() - start)
+
+        _timings[self.name] = timings
+
+        return result
+
+
+if pytest_benchmark is None:
+    @pytest.fixture
+    def benchmark(request) -> _Benchmark:
+        return _Benchmark(request.node.name)
+
+
+def _best_ms(name: str, benchmark) -> float:
+    if isinstance(benchmark, _Benchmark):
+        return 1000 * min(_timings[name])
+
+    return 1000 * benchmark.stats.stats.min
+
+
+def pytest_configure(config):
+    config._baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as file:
+            config._baseline = json.load(file)
+    config._measured = {}
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    result = yield
+
+    benchmark = item.funcargs.get('benchmark')
+    if benchmark is None:
+        return result
+
+    config = item.config
+    best = config._measured[item.name] = _best_ms(item.name, benchmark)
+    baseline = config._baseline.get(item.name)
+    if config.getoption('update_baseline') or baseline is None:
+        return result
+
+    allowed = baseline * (1 + config.getoption('baseline_tolerance')) \
+        + SLACK_MS
+    if best > allowed:
+        pytest.fail(
+            '%s took %.1f ms, more than the %.1f ms allowed by its baseline '
+            'of %.1f ms' % (item.name, best, allowed, baseline),
+            pytrace=False
+        )
+
+    return result
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if config.getoption('update_baseline') and config._measured:
+        baseline = {**config._baseline, **config._measured}
+        with open(BASELINE_PATH, 'w') as file:
+            json.dump(
+                {name: round(ms, 1) for name, ms in sorted(baseline.items())},
+                file, indent=2
+            )
+            file.write('\n')
+
+
+def pytest_terminal_summary(terminalreporter):
+    config = terminalreporter.config
+    missing = sorted(set(config._measured) - set(config._baseline))
+    if missing and not config.getoption('update_baseline'):
+        terminalreporter.write_line(
+            'No baseline for: %s' % ', '.join(missing)
+        )
+
+    if not _timings:
+        return
+
+    terminalreporter.section('benchmarks (best / mean of %d rounds)' % ROUNDS)
+    for name, timings in sorted(_timings.items()):
+        terminalreporter.write_line('%-50s %9.1f ms %9.1f ms' % (
+            name, 1000 * min(timings), 1000 * sum(timings) / len(timings)
+        ))
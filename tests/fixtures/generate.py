@@ -0,0 +1,196 @@
+'''Generate the synthetic fixture of every source, which the tests and the
+benchmarks replay offline.
+
+The fixtures are recorded with ``uk_pubs.replay.record_source`` from fake
+transports answering like each source, and a fake GoogleMaps client, so
+they go through the same code as ``uk-pubs-record``. Recorded fixtures of
+the real sources can be saved over them.
+
+Usage: python tests/fixtures/generate.py [SOURCE ...]
+'''
+import io
+import json
+import os
+import sys
+
+import requests
+
+from uk_pubs.registry import SOURCES
+from uk_pubs.replay import record_source
+
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Number of pubs of each source. Stonegate's fit in its first page, whose
+# size does not depend on the response times, so replays send the recorded
+# request
+PUBS = 240
+GREENE_KING_PAGE_SIZE = 25
+
+ADMIRAL_TAVERNS_CARD = (
+    '<div class="newsArticle table">'
+    '<div class="image"><a href="/find-a-pub/the-plough-{0}/">'
+    '<img src="/plough-{0}.jpg"></a></div>'
+    '<div><a href="/find-a-pub/the-plough-{0}/">The Plough {0}</a></div>'
+    '<p class="location">{0} Mill Lane, Town {1}, AB{1} 2CD</p>'
+    '<p class="price">Approximate Ingoings £{2:,}</p>'
+    '<div class="excerpt">A village pub with a garden and {3} rooms.</div>'
+    '</div>'
+)
+
+
+def _response(url: str, content: bytes, stream: bool) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    response.url = url
+    if stream:
+        response.raw = io.BytesIO(content)
+    else:
+        response._content = content
+
+    return response
+
+
+def _coordinates(index: int) -> tuple:
+    return 50.5 + (index % 40) / 10, -4.5 + (index // 40) / 2
+
+
+class AdmiralTavernsTransport:
+    def request(
+        self,
+        method: str,
+        url: str,
+        stream: bool = False,
+        **kwargs
+    ) -> requests.Response:
+        cards = ''.join(
+            ADMIRAL_TAVERNS_CARD.format(
+                index, index % 30, 5_000 + 250 * index, 2 + index % 4
+            )
+            for index in range(PUBS)
+        )
+        content = '<html><body><section>%s</section></body></html>' % cards
+
+        return _response(url, content.encode('utf-8'), stream)
+
+
+class GreeneKingTransport:
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        page_number = kwargs['data']['page']
+        first = page_number * GREENE_KING_PAGE_SIZE
+        indexes = range(first, min(first + GREENE_KING_PAGE_SIZE, PUBS))
+
+        features = []
+        for index in indexes:
+            lat, lng = _coordinates(index)
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                'properties': {'data': {
+                    'field_pub_name_only': 'The King&#039;s Head %d' % index,
+                    'title': '<a href="/pubs/kings-head-%d">The King&#039;s '
+                    'Head %d</a>' % (index, index),
+                    'address_line1': '%d Market Place' % index,
+                    'locality': 'Town %d' % (index % 30),
+                    'postal_code': 'GK%d 1AB' % (index % 30),
+                    'field_agreement_annual_rent': 18_000 + 100 * index,
+                }},
+            })
+        settings = {'geofield_google_map': {
+            'geofield-map-pub-search': {'data': {
+                'type': 'FeatureCollection', 'features': features,
+            }},
+        }} if features else {}
+        content = [{'command': 'settings', 'settings': settings}]
+
+        return _response(url, json.dumps(content).encode(), False)
+
+
+class PunchPubsTransport:
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        pubs = []
+        for index in range(PUBS):
+            lat, lng = _coordinates(index)
+            pubs.append({
+                'id': index,
+                'name': 'The Bell &amp; Anchor %d' % index,
+                'permalink': 'https://www.punchpubs.com/pubs/bell-%d/' % index,
+                'outgoing_value': '£%d PW' % (300 + index),
+                'latlng': {'lat': lat, 'lng': lng},
+                'address': '%d Station Road, Town %d' % (index, index % 30),
+                'town': 'Town %d' % (index % 30),
+                'tenancy_type': 'Leased' if index % 2 else 'Tenancy',
+            })
+
+        return _response(url, json.dumps(pubs).encode(), False)
+
+
+class StonegateTransport:
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        query = kwargs['json']
+        results = []
+        for index in range(PUBS)[query['skip']:][:query['take']]:
+            lat, lng = _coordinates(index)
+            results.append({
+                'PubName': 'The Swan %d' % index,
+                'PubLinkUrl': '/run-a-pub/pubs/swan-%d' % index,
+                'GuideRent': '£%d,000' % (20 + index % 40),
+                'Latitude': lat,
+                'Longitude': lng,
+                'PubAddress': '%d Church Lane' % index,
+                'Postcode': 'SG%d 3EF' % (index % 30),
+                'Images': [{'Url': '/swan-%d.jpg' % index}],
+            })
+        content = {'Results': results, 'TotalRows': PUBS}
+
+        return _response(url, json.dumps(content).encode(), False)
+
+
+class Geocoder:
+    '''GoogleMaps client answering every search string with a made-up
+    address.
+    '''
+
+    def geocode(self, search_string: str, **kwargs) -> list:
+        digits = sum(map(ord, search_string))
+
+        return [{
+            'formatted_address': '%d High Street, Town %d, UK'
+            % (digits % 100, digits % 30),
+            'address_components': [
+                {'short_name': str(digits % 100), 'types': ['street_number']},
+                {'short_name': 'High St', 'types': ['route']},
+                {'short_name': 'Town %d' % (digits % 30),
+                 'types': ['postal_town']},
+                {'short_name': 'County %s' % search_string[0],
+                 'types': ['administrative_area_level_2', 'political']},
+                {'short_name': 'England',
+                 'types': ['administrative_area_level_1', 'political']},
+                {'short_name': 'GB', 'types': ['country', 'political']},
+            ],
+            'geometry': {'location': {
+                'lat': 50 + digits % 500 / 100, 'lng': -3 + digits % 300 / 100,
+            }},
+        }]
+
+
+TRANSPORTS = {
+    'admiral_taverns': AdmiralTavernsTransport,
+    'greene_king': GreeneKingTransport,
+    'punch_pubs': PunchPubsTransport,
+    'stonegate': StonegateTransport,
+}
+
+
+def main():
+    for key in sys.argv[1:] or sorted(SOURCES):
+        record_source(
+            key,
+            os.path.join(DIRECTORY, key + '.json.gz'),
+            Geocoder(),
+            TRANSPORTS[key]()
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import os
+import unittest
+
+import pandas
+
+from uk_pubs.admiral_taverns.connector import AdmiralTavernsConnector
+from uk_pubs.replay import Fixture, ReplayTransport
+
+
+# Generated with: python tests/fixtures/generate.py admiral_taverns
+FIXTURE_PATH = os.path.join(
+    os.path.dirname(__file__), 'fixtures', 'admiral_taverns.json.gz'
+)
+
+
+@unittest.skipUnless(
+    os.path.exists(FIXTURE_PATH), 'No recorded Admiral Taverns fixture'
+)
+class TestRawData(unittest.TestCase):
+    data: pandas.DataFrame
+
+    def setUp(self) -> None:
+        transport = ReplayTransport(Fixture.load(FIXTURE_PATH))
+        connector = AdmiralTavernsConnector(transport)
+        self.data = connector.get()
+
+    def test_null(self) -> None:
+        null_data = self.data.loc[self.data.isna().any(axis=1)]\
+            .to_dict('records')
+
+        self.assertListEqual(null_data, [])
+
+    def test_approximate_price(self) -> None:
+        invalid = self.data.loc[
+            ~self.data['ApproximatePrice']
+            .str.match(r'Approximate Ingoings [£]?[\d,]+'),
+            ['ApproximatePrice']
+        ]
+        invalid = invalid.reset_index().to_dict('records')
+
+        self.assertListEqual(invalid, [])
+
+
+@unittest.skipUnless(
+    os.path.exists(FIXTURE_PATH), 'No recorded Admiral Taverns fixture'
+)
+class TestTransformed(unittest.TestCase):
+    data: pandas.DataFrame
+
+    def setUp(self) -> None:
+        transport = ReplayTransport(Fixture.load(FIXTURE_PATH))
+        connector = AdmiralTavernsConnector(transport)
+        self.data = connector.clean(connector.get())
+
+    def test_values(self) -> None:
+        rents = self.data['AnnualRent'].dropna()
+
+        self.assertGreater(len(rents), 0)
+        self.assertTrue((rents > 0).all())
@@ -0,0 +1,49 @@
+import unittest
+
+import pandas
+
+from uk_pubs.cdc import DELETE, INSERT, UPDATE, diff_snapshots, pub_keys
+
+
+class TestChangeDataCapture(unittest.TestCase):
+    previous = pandas.DataFrame({
+        'Name': ['The Red Lion', 'The Crown', 'The Swan'],
+        'URL': ['https://www.pubs.co.uk/red-lion/', None, 'pubs.co.uk/swan'],
+        'PostalCode': [None, 'sw1a 1aa', None],
+        'AnnualRent': [25000.0, None, 10000.0],
+        'ScrapeDate': ['2021-09-01'] * 3,
+        'Source': ['Stonegate'] * 3,
+    })
+    current = pandas.DataFrame({
+        'Name': ['The Red Lion', 'The  Crown', 'The Bell'],
+        'URL': ['http://pubs.co.uk/red-lion', None, 'pubs.co.uk/bell'],
+        'PostalCode': [None, 'SW1A1AA', None],
+        'AnnualRent': [30000.0, None, 5000.0],
+        'ScrapeDate': ['2021-09-02'] * 3,
+        'Source': ['Stonegate'] * 3,
+    })
+
+    def test_pub_keys(self) -> None:
+        keys = pub_keys(self.current)
+
+        self.assertEqual(keys[0], 'Stonegate|pubs.co.uk/red-lion')
+        self.assertEqual(keys[1], 'Stonegate|the crown|SW1A1AA')
+        self.assertEqual(keys[0], pub_keys(self.previous)[0])
+        self.assertEqual(keys[1], pub_keys(self.previous)[1])
+
+    def test_diff_snapshots(self) -> None:
+        changes = diff_snapshots(
+            self.previous.assign(PubKey=pub_keys(self.previous)),
+            self.current.assign(PubKey=pub_keys(self.current))
+        ).set_index('Name')
+
+        self.assertEqual(len(changes), 4)
+        self.assertEqual(changes.loc['The Bell', 'ChangeType'], INSERT)
+        self.assertEqual(changes.loc['The Red Lion', 'ChangeType'], UPDATE)
+        self.assertEqual(
+            changes.loc['The Red Lion', 'ChangedFields'], 'URL, AnnualRent'
+        )
+        self.assertEqual(
+            changes.loc['The  Crown', 'ChangedFields'], 'Name, PostalCode'
+        )
+        self.assertEqual(changes.loc['The Swan', 'ChangeType'], DELETE)
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs.checkpoint import PageCheckpoint
+from uk_pubs.greene_king.connector import GreeneKingAjaxConnector
+
+
+class FlakyConnector(GreeneKingAjaxConnector):
+    '''Connector over 10 pages of 2 pubs, failing once on page 4.'''
+
+    def __init__(self):
+        super().__init__(transport=object())
+        self.requested = []
+        self.failed = False
+
+    def get_page(self, page_number: int = 0) -> pandas.DataFrame:
+        self.requested.append(page_number)
+        if page_number == 4 and not self.failed:
+            self.failed = True
+            raise ConnectionError('Connection reset')
+        if page_number >= 10:
+            return pandas.DataFrame()
+
+        return pandas.DataFrame({
+            'Name': ['Pub %d.%d' % (page_number, pub) for pub in range(2)],
+            'AnnualRent': [1000.0, None],
+        })
+
+
+class TestPageCheckpoint(unittest.TestCase):
+    def test_resume(self) -> None:
+        for max_in_flight in (None, 4):
+            with self.subTest(max_in_flight=max_in_flight), \
+                    tempfile.TemporaryDirectory() as tmp_dir:
+                prefix = os.path.join(tmp_dir, 'raw')
+                connector = FlakyConnector()
+
+                with self.assertRaises(ConnectionError):
+                    connector.get(max_in_flight, PageCheckpoint(prefix))
+                fetched = set(connector.requested) - {4}
+                connector.requested = []
+
+                data = connector.get(max_in_flight, PageCheckpoint(prefix))
+
+                self.assertEqual(len(data), 20)
+                self.assertEqual(data['Name'][9], 'Pub 4.1')
+                self.assertTrue(data['AnnualRent'].isna()[1])
+                self.assertFalse(fetched & set(connector.requested))
+                self.assertEqual(os.listdir(tmp_dir), [])
@@ -0,0 +1,122 @@
+from datetime import date
+from unittest import mock
+import argparse
+import inspect
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs import etl
+from uk_pubs.http_cache import ResponseCache
+from uk_pubs.pipeline import add_arguments
+from uk_pubs.registry import SOURCES
+from uk_pubs.replay import Fixture, FixtureServer, ReplayGeocoder
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixtures(keys) -> Fixture:
+    '''Merge the fixtures of several sources into one.'''
+    fixture = Fixture('')
+    for key in keys:
+        source_fixture = Fixture.load(
+            os.path.join(FIXTURES_DIR, key + '.json.gz')
+        )
+        fixture.responses.update(source_fixture.responses)
+        fixture.geocode_results.update(source_fixture.geocode_results)
+
+    return fixture
+
+
+class TestRegistry(unittest.TestCase):
+    def test_sources(self) -> None:
+        for key, source in SOURCES.items():
+            with self.subTest(key):
+                connector_class = source.connector_class
+                parameters = inspect.signature(
+                    connector_class.iter_batches
+                ).parameters
+
+                self.assertTrue(source.name)
+                self.assertTrue(connector_class.RAW_SCHEMA)
+                for name in source.get_args:
+                    self.assertIn(name, parameters)
+                self.assertEqual(
+                    'checkpoint' in parameters, source.checkpointed
+                )
+
+
+class TestEtl(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+        self.database = os.path.join(self.directory, 'pubs.db')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def run_etl(self, fixture: Fixture):
+        '''Run the ETL of every source against a server replaying the
+        fixture, with the fixture's GoogleMaps results.
+        '''
+        parser = argparse.ArgumentParser()
+        add_arguments(parser, 'logs')
+        parser.add_argument('--sources', default=sorted(SOURCES))
+        # Pages are requested one at a time, as they were recorded
+        args = parser.parse_args([
+            self.directory, 'sqlite/%s.main.pubs' % self.database,
+            '--max-in-flight', '0', '--geocode-qps', '100000',
+        ])
+
+        with FixtureServer(fixture) as server, mock.patch.object(
+            etl, 'make_transport', lambda args: server.transport(
+                cache=ResponseCache(os.path.join(args.dir, 'http-cache'))
+            )
+        ), mock.patch(
+            'uk_pubs.pipeline.googlemaps.Client',
+            lambda key: ReplayGeocoder(fixture)
+        ), mock.patch.dict(os.environ, {'GOOGLEMAPS_KEY': 'key'}):
+            etl.run(args, date(2021, 9, 1))
+
+    def load_geo(self) -> pandas.DataFrame:
+        return pandas.read_parquet(
+            os.path.join(self.directory, '2021-09-01-geo.parquet')
+        )
+
+    def test_run(self) -> None:
+        self.run_etl(load_fixtures(SOURCES))
+
+        data = self.load_geo()
+        self.assertEqual(
+            set(data['Source']),
+            {source.name for source in SOURCES.values()}
+        )
+        self.assertEqual(data['Source'].value_counts().min(), 240)
+        self.assertEqual(data['City'].isna().sum(), 0)
+        for key in SOURCES:
+            self.assertTrue(os.path.exists(os.path.join(
+                self.directory, key, '2021-09-01-clean.parquet'
+            )))
+
+        with sqlite3.connect(self.database) as connection:
+            rows, = connection.execute('SELECT COUNT(*) FROM pubs').fetchone()
+        connection.close()
+        self.assertEqual(rows, len(data))
+
+    def test_failed_source(self) -> None:
+        keys = sorted(set(SOURCES) - {'stonegate'})
+
+        with self.assertLogs('uk_pubs.etl', 'ERROR'), \
+                self.assertRaises(SystemExit) as context:
+            self.run_etl(load_fixtures(keys))
+
+        self.assertEqual(context.exception.code, 1)
+        # The other sources are still geocoded and saved
+        self.assertEqual(
+            set(self.load_geo()['Source']),
+            {SOURCES[key].name for key in keys}
+        )
@@ -0,0 +1,113 @@
+import io
+import unittest
+
+from lxml import html
+import requests
+
+from uk_pubs import utils
+from uk_pubs.admiral_taverns.connector import AdmiralTavernsConnector
+from uk_pubs.utils import compile_structure, mount_html_elements
+
+
+CARD = (
+    '<div class="newsArticle table">'
+    '<div><a href="/pubs/{0}">The Pub {0}</a></div>'
+    '<p class="location">{0} High Street</p><p class="location">London</p>'
+    '<p class="price">Approximate Ingoings £1{0},000</p>'
+    '<div class="excerpt">A pub</div>'
+    '</div>'
+)
+PAGE = '<html><body><div id="results">{}</div></body></html>'.format(
+    ''.join(CARD.format(i) for i in range(500))
+).encode('utf-8')
+
+
+class PageTransport:
+    def get(self, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response.raw = io.BytesIO(PAGE)
+
+        return response
+
+
+class TestAdmiralTavernsExtraction(unittest.TestCase):
+    def test_streaming_matches_dom(self) -> None:
+        connector = AdmiralTavernsConnector(PageTransport())
+        connector.CHUNK_SIZE = 1000
+
+        streamed = connector.get(streaming=True)
+        parsed = connector.get(streaming=False)
+
+        self.assertEqual(len(streamed), 500)
+        self.assertEqual(
+            streamed.loc[7, 'StreetAddress'], '7 High Street, London'
+        )
+        self.assertEqual(streamed.loc[7, 'ApproximatePrice'][-6:], '17,000')
+        self.assertTrue(streamed.equals(parsed))
+
+
+SHOPPING_LIST = html.fromstring(
+    '<html><body><div class="shopping-list">'
+    '<a href="/1">Name1</a><a href="/2">Name2</a>'
+    '</div><span class="alert">Sold out</span></body></html>'
+)
+
+
+class TestExtractionPlan(unittest.TestCase):
+    def structure(self) -> dict:
+        return {
+            'shopping_items': (
+                './/div[@class = "shopping-list"]/a',
+                {'name': './text()', 'link': './@href'}
+            ),
+            'alert_messages': './/span[contains(@class, "alert")]/text()',
+        }
+
+    def test_outputs(self) -> None:
+        structure = self.structure()
+        plan = compile_structure(structure)
+
+        self.assertEqual(mount_html_elements(SHOPPING_LIST, structure), {
+            'shopping_items': [
+                {'name': ['Name1'], 'link': ['/1']},
+                {'name': ['Name2'], 'link': ['/2']},
+            ],
+            'alert_messages': ['Sold out'],
+        })
+        self.assertEqual(plan.columns(SHOPPING_LIST), {
+            'shopping_items': {
+                'name': ['Name1', 'Name2'], 'link': ['/1', '/2'],
+            },
+            'alert_messages': ['Sold out'],
+        })
+        _, _, item_plan = plan.inner_nodes[0]
+        item = SHOPPING_LIST.find('.//a')
+        self.assertEqual(
+            item_plan.record(item), {'name': 'Name1', 'link': '/1'}
+        )
+
+    def test_cache(self) -> None:
+        plan = compile_structure(self.structure())
+
+        # Equal structures share their plan
+        self.assertIs(compile_structure(self.structure()), plan)
+        self.assertIsNot(
+            compile_structure({'alert_messages': './/span/text()'}), plan
+        )
+
+    def test_cache_size(self) -> None:
+        # Structures built on every call do not pile up in the cache
+        plans = [
+            compile_structure({'name%d' % index: './text()'})
+            for index in range(2 * utils.PLAN_CACHE_SIZE)
+        ]
+
+        self.assertEqual(
+            [plan.names for plan in plans],
+            [['name%d' % index] for index in range(2 * utils.PLAN_CACHE_SIZE)]
+        )
+        self.assertEqual(
+            utils._compile.cache_info().currsize, utils.PLAN_CACHE_SIZE
+        )
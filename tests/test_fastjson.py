@@ -0,0 +1,76 @@
+import json
+import unittest
+
+import requests
+
+from uk_pubs.punch_pubs.connector import PunchPubsConnector
+from uk_pubs.punch_pubs.data_processor import PunchPubsDataProcessor
+from uk_pubs.stonegate.connector import StonegateConnector
+from uk_pubs.stonegate.data_processor import StonegateDataProcessor
+
+
+PUNCH_PUBS = [{
+    'name': 'The Crown &amp; Anchor %d' % i,
+    'permalink': 'https://www.punchpubs.co.uk/pubs/crown-%d/' % i,
+    'outgoing_value': '£%d PW' % (100 + i),
+    'address': '%d High Street' % i,
+    'town': 'Leeds',
+    'latlng': {'lat': 53.8 + i / 100, 'lng': -1.5},
+    'thumbnail': {'url': 'https://www.punchpubs.co.uk/%d.jpg' % i},
+    'features': ['Garden'],
+} for i in range(7)]
+# A pub without coordinates
+PUNCH_PUBS.append({'name': 'The Bell', 'latlng': None})
+
+STONEGATE_PUBS = {'Results': [{
+    'PubName': 'The Swan %d' % i,
+    'PubLinkUrl': '/pubs/swan-%d' % i,
+    'GuideRent': '£%d,000' % (20 + i),
+    'Latitude': 51.5,
+    'Longitude': -0.1 - i / 100,
+    'PubAddress': '%d Church Lane' % i,
+    'Postcode': 'SW1A 1AA',
+    'Images': [{'Url': '/swan-%d.jpg' % i}],
+} for i in range(5)], 'TotalRows': 5}
+
+
+class PayloadTransport:
+    def __init__(self, payload):
+        self.payload = json.dumps(payload).encode()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response._content = self.payload
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+class TestFastJson(unittest.TestCase):
+    def assert_same_processed(self, connector, processor) -> None:
+        fast = connector.get(fast_json=True)
+        default = connector.get()
+
+        self.assertEqual(len(fast), len(default))
+        self.assertTrue(processor.process(fast).reset_index(drop=True).equals(
+            processor.process(default).reset_index(drop=True)
+        ))
+
+    def test_punch_pubs(self) -> None:
+        connector = PunchPubsConnector(PayloadTransport(PUNCH_PUBS))
+        self.assert_same_processed(connector, PunchPubsDataProcessor())
+
+        batches = list(connector.iter_batches(batch_size=3, fast_json=True))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 2])
+        self.assertTrue(batches[-1]['latlng.lat'].isna().iloc[-1])
+
+    def test_stonegate(self) -> None:
+        connector = StonegateConnector(PayloadTransport(STONEGATE_PUBS))
+        self.assert_same_processed(connector, StonegateDataProcessor())
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from uk_pubs.geocache import GeocodeCache, normalise_search_string
+
+
+class TestGeocodeCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_normalise(self) -> None:
+        self.assertEqual(
+            normalise_search_string('  1 High St ,London,  UK '),
+            '1 high st, london, uk'
+        )
+
+    def test_hit_and_miss(self) -> None:
+        with GeocodeCache(self.path) as cache:
+            self.assertIsNone(cache.get('1 High St, London'))
+            cache.set('1 High St, London', [{'formatted_address': 'x'}])
+
+        with GeocodeCache(self.path) as cache:
+            self.assertEqual(
+                cache.get('1 HIGH ST,London'), [{'formatted_address': 'x'}]
+            )
+            self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_expired(self) -> None:
+        with GeocodeCache(self.path, ttl=0) as cache:
+            cache.set('foo', [])
+            time.sleep(0.01)
+
+            self.assertIsNone(cache.get('foo'))
+            self.assertEqual(cache.expired, 1)
+
+    def test_negative_ttl(self) -> None:
+        with GeocodeCache(self.path, negative_ttl=0) as cache:
+            cache.set('nowhere', [])
+            cache.set('1 High St', [{'formatted_address': 'x'}])
+            time.sleep(0.01)
+
+            self.assertIsNone(cache.get('nowhere'))
+            self.assertIsNotNone(cache.get('1 High St'))
+            self.assertEqual((cache.hits, cache.expired), (1, 1))
+
+    def test_periodic_commit(self) -> None:
+        cache = GeocodeCache(self.path, commit_every=2)
+        for name in ['a', 'b', 'c']:
+            cache.set(name, [{'formatted_address': name}])
+
+        # Another process only sees the committed writes
+        connection = sqlite3.connect(self.path)
+        keys = connection.execute('SELECT search_key FROM geocode').fetchall()
+        connection.close()
+        cache.close()
+
+        self.assertEqual(sorted(keys), [('a',), ('b',)])
+
+    def test_eviction(self) -> None:
+        with GeocodeCache(self.path, max_entries=2) as cache:
+            for name in ['a', 'b', 'c']:
+                cache.set(name, [])
+                time.sleep(0.01)
+            cache.get('a')
+
+            self.assertEqual(cache.evict(), 1)
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
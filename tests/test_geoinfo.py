@@ -0,0 +1,51 @@
+import unittest
+
+import numpy
+
+from uk_pubs.utils import format_geoinfo
+
+
+def make_result(**components) -> list:
+    return [{
+        'formatted_address': ', '.join(components.values()),
+        'geometry': {'location': {'lat': 51.5, 'lng': -0.1}},
+        'address_components': [
+            {'types': [component_type, 'political'], 'short_name': name}
+            for component_type, name in components.items()
+        ],
+    }]
+
+
+class TestFormatGeoinfo(unittest.TestCase):
+    def test_columns(self) -> None:
+        search_strings = ['a', 'b', 'c', 'd', 'e']
+        results = [
+            make_result(
+                street_number='1', route='High St', postal_town='London',
+                country='GB', neighborhood='Soho'
+            ),
+            make_result(route='Mill Lane', postal_code='AB1 2CD'),
+            make_result(street_number='7', route=''),
+            [],
+            make_result(),
+        ]
+
+        with self.assertLogs('uk_pubs.utils', 'WARNING'):
+            geo_info = format_geoinfo(search_strings, results)
+
+        self.assertEqual(geo_info.index.tolist(), search_strings)
+        self.assertEqual(geo_info['StreetAddress'].tolist(), [
+            '1, High St', 'Mill Lane', '7', None, None
+        ])
+        self.assertEqual(
+            geo_info['City'].tolist(), ['London', None, None, None, None]
+        )
+        self.assertEqual(
+            geo_info['PostalCode'].tolist(), [None, 'AB1 2CD', None, None, None]
+        )
+        self.assertEqual(geo_info['FormattedAddress'].tolist()[3:], [
+            None, None
+        ])
+        self.assertEqual(geo_info['Lat'].dtype, numpy.float64)
+        self.assertTrue(numpy.isnan(geo_info.loc['d', 'Lat']))
+        self.assertEqual(geo_info.loc['e', 'Long'], -0.1)
@@ -0,0 +1,169 @@
+import json
+import random
+import threading
+import time
+import unittest
+
+import pandas
+import requests
+
+from uk_pubs.greene_king.connector import (
+    GreeneKingAjaxConnector,
+    GreeneKingWebsiteConnector,
+    iter_pages_probing,
+)
+
+
+CARD = (
+    '<div class="card">'
+    '<div class="image"><a href="/pubs/{0}"></a><span>Pub {0}</span></div>'
+    '<h3><a href="/pubs/{0}">The Pub {0}</a></h3>'
+    '<div class="content"><h4>{0} High Street</h4></div>'
+    '</div>'
+)
+
+
+class Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SearchTransport:
+    '''Pub search of ``pages`` pages of 3 pubs, answering after a random
+    delay, so pages arrive out of order.
+    '''
+
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> Response:
+        page_number = int(url.rsplit('=', 1)[1])
+        with self.lock:
+            self.requested.append((page_number, time.monotonic()))
+        time.sleep(random.uniform(0, 0.02))
+
+        cards = ''.join(
+            CARD.format('%d-%d' % (page_number, pub)) for pub in range(3)
+        ) if page_number < self.pages else ''
+
+        return Response(
+            '<html><body><section class="search-results">%s</section>'
+            '</body></html>' % cards
+        )
+
+
+class AjaxTransport:
+    '''Ajax pub search of ``pages`` pages of 2 pubs.'''
+
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def post(self, url: str, data: dict, **kwargs) -> requests.Response:
+        page_number = data['page']
+        with self.lock:
+            self.requested.append(page_number)
+
+        features = [{
+            'geometry': {'coordinates': [-0.1, 51.5]},
+            'properties': {'data': {
+                'field_pub_name_only': 'The Bell %d-%d' % (page_number, pub),
+                'title': '<a href="/pubs/bell-%d-%d">' % (page_number, pub),
+                'address_line1': '1 Church Street',
+                'field_agreement_annual_rent': 20000,
+            }},
+        } for pub in range(2)] if page_number < self.pages else []
+        settings = {'geofield_google_map': {
+            'map': {'data': {'features': features}},
+        }} if features else {}
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps([{'settings': settings}]).encode()
+
+        return response
+
+
+class TestGreeneKingAjax(unittest.TestCase):
+    def test_crawl(self) -> None:
+        for pages in (1, 2, 13, 64):
+            for max_in_flight in (None, 1, 4):
+                with self.subTest(pages=pages, max_in_flight=max_in_flight):
+                    transport = AjaxTransport(pages)
+                    data = GreeneKingAjaxConnector(transport).get(
+                        max_in_flight
+                    )
+
+                    self.assertEqual(len(data), 2 * pages)
+                    self.assertEqual(
+                        data['Name'].iloc[-1], 'The Bell %d-1' % (pages - 1)
+                    )
+                    # Every page is requested once, up to the first empty
+                    # one, and the probes stay below twice the last page
+                    requested = transport.requested
+                    self.assertEqual(len(set(requested)), len(requested))
+                    self.assertTrue(set(range(pages + 1)) <= set(requested))
+                    if max_in_flight:
+                        self.assertLessEqual(max(requested), 2 * pages)
+                    else:
+                        self.assertEqual(requested, list(range(pages + 1)))
+
+    def test_empty_first_page(self) -> None:
+        for max_in_flight in (None, 4):
+            with self.subTest(max_in_flight=max_in_flight):
+                transport = AjaxTransport(0)
+                data = GreeneKingAjaxConnector(transport).get(max_in_flight)
+
+                self.assertEqual(len(data), 0)
+                self.assertEqual(transport.requested, [0])
+
+    def test_probing(self) -> None:
+        requested = []
+
+        def get_page(page_number: int) -> pandas.DataFrame:
+            requested.append(page_number)
+            return pandas.DataFrame({'Page': [page_number]}) \
+                if page_number < 100 else pandas.DataFrame()
+
+        pages = list(iter_pages_probing(get_page, 2, prefetch=2))
+
+        self.assertEqual([page['Page'][0] for page in pages], list(range(100)))
+        # The last page is found by probing, then binary search
+        self.assertLess(requested.index(128), requested.index(99))
+        self.assertEqual(sorted(set(requested)), sorted(requested))
+
+
+class TestGreeneKingWebsite(unittest.TestCase):
+    def test_pipelined_crawl(self) -> None:
+        random.seed(0)
+        sequential = GreeneKingWebsiteConnector(SearchTransport(12)).get()
+
+        for max_in_flight, parse_workers in [(1, 1), (4, 2), (16, 3)]:
+            with self.subTest(max_in_flight=max_in_flight):
+                transport = SearchTransport(12)
+                data = GreeneKingWebsiteConnector(transport).get(
+                    max_in_flight, parse_workers
+                )
+
+                self.assertTrue(data.equals(sequential))
+                self.assertEqual(len(data), 36)
+                self.assertEqual(data['Name'].iloc[-1], 'The Pub 11-2')
+                self.assertEqual(data['Description'].dtype, 'string')
+                # Every page is requested once, and the pages from the empty
+                # one on only while it is not known to be empty
+                requested = [page for page, _ in transport.requested]
+                self.assertEqual(sorted(set(requested)), sorted(requested))
+                self.assertLessEqual(len(requested), 12 + max_in_flight)
+
+    def test_politeness_delay(self) -> None:
+        transport = SearchTransport(5)
+        GreeneKingWebsiteConnector(transport).get(
+            4, politeness_delay=0.05
+        )
+
+        times = sorted(request_time for _, request_time in transport.requested)
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertGreaterEqual(min(gaps), 0.045)
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs.history import HistoryStore
+from uk_pubs.schema import PUB_SCHEMA, conform
+from uk_pubs.storage import ParquetStageStorage
+
+
+class TestHistoryStore(unittest.TestCase):
+    data = conform(pandas.DataFrame({
+        'PubKey': ['a', 'b', 'c'],
+        'Name': ['The Red Lion', 'The Crown', 'The Swan'],
+        'AnnualRent': [25000.0, 30000.0, None],
+        'Lat': [51.5, 53.4, 55.9],
+        'Long': [-0.12, -2.98, -3.19],
+        'Source': ['Stonegate', 'Punch Pubs', 'Punch Pubs'],
+    }))
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.history = HistoryStore(self.tmp_dir.name)
+        for day, rent in [('2021-01-01', 1.0), ('2021-02-01', 2.0)]:
+            self.history.append(
+                self.data.assign(AnnualRent=self.data['AnnualRent'] * rent),
+                day
+            )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_partitions(self) -> None:
+        self.assertTrue(os.path.exists(
+            os.path.join(
+                self.tmp_dir.name, 'Source=Punch%20Pubs',
+                'ScrapeDate=2021-02-01', 'part-0.parquet'
+            )
+        ))
+        self.assertEqual(
+            self.history.days('Punch Pubs'), ['2021-01-01', '2021-02-01']
+        )
+        self.assertEqual(self.history.days('Greene King'), [])
+
+    def test_query(self) -> None:
+        rents = self.history.query(
+            pubs=['b'], columns=['ScrapeDate', 'AnnualRent']
+        )
+        self.assertEqual(list(rents['AnnualRent']), [30000, 60000])
+        self.assertEqual(rents['ScrapeDate'].dtype, 'datetime64[ns]')
+
+        data = self.history.query(sources=['Punch Pubs'], start='2021-01-15')
+        self.assertEqual(sorted(data['PubKey']), ['b', 'c'])
+        self.assertEqual(set(data['ScrapeDate']), {
+            pandas.Timestamp('2021-02-01')
+        })
+        self.assertEqual(data['Source'].dtype, 'category')
+
+        data = self.history.query(end='2021-01-01', bbox=(53, -4, 56, -3))
+        self.assertEqual(sorted(data['PubKey']), ['c'])
+
+        self.assertEqual(len(self.history.query(pubs=['z'])), 0)
+        self.assertEqual(
+            set(self.history.query().columns), set(PUB_SCHEMA)
+        )
+
+    def test_append_again(self) -> None:
+        self.history.append(self.data.iloc[:1], '2021-02-01')
+        self.history.append(self.data.iloc[1:2], '2021-02-01')
+
+        data = self.history.query(start='2021-02-01')
+        self.assertEqual(sorted(data['PubKey']), ['a', 'b'])
+
+    def test_backfill(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage = ParquetStageStorage(tmp_dir, {'geo': PUB_SCHEMA})
+            storage.save(self.data, '2021-03-01', 'geo')
+
+            self.assertEqual(self.history.backfill(storage), 3)
+
+        self.assertEqual(
+            self.history.days('Stonegate'),
+            ['2021-01-01', '2021-02-01', '2021-03-01']
+        )
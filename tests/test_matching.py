@@ -0,0 +1,31 @@
+import unittest
+
+import numpy
+import pandas
+
+from uk_pubs.matching import cluster, resolve_pubs
+
+
+class TestResolvePubs(unittest.TestCase):
+    def test_resolve_pubs(self) -> None:
+        data = pandas.DataFrame({
+            'Name': [
+                'The Red Lion', 'Red Lion Inn', 'The Crown', 'Crown & Anchor',
+                'The Red Lion', None,
+            ],
+            'Source': ['Punch Pubs', 'Stonegate'] * 2 + ['Greene King'] * 2,
+            'PostalCode': [None, None, 'M1 2AB', 'M12AB', 'E1 6AN', None],
+            'Lat': [51.5, 51.5005, 53.0, 53.0, 52.0, numpy.nan],
+            'Long': [-0.1, -0.1, -2.0, -2.0, 0.0, numpy.nan],
+            'URL': ['a', 'b', 'c', 'd', 'e', 'f'],
+        })
+
+        ids = resolve_pubs(data)['PubId']
+
+        self.assertEqual(ids[0], ids[1])
+        self.assertEqual(ids.nunique(), 5)
+
+    def test_cluster(self) -> None:
+        labels = cluster(6, numpy.array([4, 3, 1]), numpy.array([5, 4, 0]))
+
+        numpy.testing.assert_array_equal(labels, [0, 0, 2, 3, 3, 3])
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas
+import requests
+
+from uk_pubs.metrics import MeteredTransport, RunMetrics
+from uk_pubs.storage import get_storage
+
+
+def slow_batches(count: int, delay: float):
+    for number in range(count):
+        time.sleep(delay)
+        yield pandas.DataFrame({'Number': [number] * 10})
+
+
+class TestRunMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_nested_stages(self) -> None:
+        metrics = RunMetrics()
+        fetch = metrics.stage('fetch', source='Test')
+        clean = metrics.stage('clean', source='Test')
+
+        def process(batch):
+            time.sleep(0.05)
+            return batch
+
+        for _ in clean.iter(
+            process(batch) for batch in fetch.iter(slow_batches(3, 0.02))
+        ):
+            pass
+
+        self.assertEqual((fetch.rows, clean.rows), (30, 30))
+        # The time spent fetching is not counted as cleaning time
+        self.assertGreaterEqual(fetch.wall_time, 0.06)
+        self.assertLess(fetch.wall_time, 0.12)
+        self.assertGreaterEqual(clean.wall_time, 0.15)
+        self.assertLess(clean.wall_time, 0.21)
+        self.assertFalse(fetch.failed)
+
+    def test_failed_stage(self) -> None:
+        metrics = RunMetrics()
+
+        with self.assertRaises(ValueError):
+            with metrics.stage('push'):
+                raise ValueError
+
+        self.assertTrue(metrics.stages[0].failed)
+
+    def test_storage(self) -> None:
+        metrics = RunMetrics()
+        storage = get_storage(
+            'parquet', self.directory, metrics=metrics,
+            labels={'source': 'Test'}
+        )
+
+        for _ in storage.write_batches(
+            slow_batches(2, 0), '2024-01-01', 'raw'
+        ):
+            pass
+        storage.load('2024-01-01', 'raw')
+
+        save, load = metrics.stages
+        path = storage.path('2024-01-01', 'raw')
+        self.assertEqual(save.labels, {'step': 'raw', 'source': 'Test'})
+        self.assertEqual((save.rows, load.rows), (20, 20))
+        self.assertEqual(save.bytes_out, os.path.getsize(path))
+        self.assertEqual(load.bytes_in, os.path.getsize(path))
+
+    def test_outputs(self) -> None:
+        metrics = RunMetrics()
+        for rows in (10, 5):
+            with metrics.stage('save', source='The "Pub"') as stage:
+                stage.rows = rows
+
+        json_path = os.path.join(self.directory, 'metrics.json')
+        metrics.write_json(json_path)
+        with open(json_path) as file:
+            summary = json.load(file)
+        self.assertEqual(
+            [stage['rows'] for stage in summary['stages']], [10, 5]
+        )
+
+        prometheus_path = os.path.join(self.directory, 'metrics.prom')
+        metrics.write_prometheus(prometheus_path)
+        with open(prometheus_path) as file:
+            lines = file.read().splitlines()
+        self.assertIn('# TYPE uk_pubs_stage_rows gauge', lines)
+        self.assertIn(
+            'uk_pubs_stage_rows{stage="save",source="The \\"Pub\\""} 15.0',
+            lines
+        )
+
+    def test_threads(self) -> None:
+        stage = RunMetrics().stage('fetch')
+
+        def consume():
+            for _ in stage.iter(slow_batches(50, 0)):
+                pass
+
+        threads = [threading.Thread(target=consume) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(stage.rows, 4 * 50 * 10)
+
+    def test_metered_transport(self) -> None:
+        class Transport:
+            def request(self, method, url, **kwargs) -> requests.Response:
+                response = requests.Response()
+                response.status_code = 200
+                response._content = b'x' * 100
+                if url.endswith('cached'):
+                    response.from_cache = True
+
+                return response
+
+        transport = MeteredTransport(Transport())
+        transport.get('https://pubs/')
+        transport.get('https://pubs/cached')
+
+        self.assertEqual(transport.bytes_received, 100)
+        self.assertEqual(transport.bytes_from_cache, 100)
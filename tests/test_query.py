@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from uk_pubs.query import PubIndex, load_index
+from uk_pubs.spatial import haversine
+from uk_pubs.storage import get_storage
+
+
+def random_pubs(size: int, seed: int = 0) -> pandas.DataFrame:
+    random = numpy.random.default_rng(seed)
+    pubs = pandas.DataFrame({
+        'Name': ['Pub %d' % number for number in range(size)],
+        'Lat': random.uniform(50, 58.5, size),
+        'Long': random.uniform(-6, 1.7, size),
+    })
+    pubs.loc[::50, 'Lat'] = numpy.nan
+
+    return pubs
+
+
+class TestPubIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pubs = random_pubs(5000)
+        self.index = PubIndex(self.pubs, cell_size=5)
+        random = numpy.random.default_rng(1)
+        self.lat = random.uniform(49, 59.5, 200)
+        self.lng = random.uniform(-7, 2, 200)
+        self.located = self.pubs.dropna().reset_index(drop=True)
+
+    def distances(self, query: int) -> numpy.ndarray:
+        return haversine(
+            self.lat[query], self.lng[query],
+            self.located['Lat'], self.located['Long']
+        )
+
+    def test_within(self) -> None:
+        results = self.index.within(self.lat, self.lng, 12)
+
+        for query in range(len(self.lat)):
+            distances = self.distances(query)
+            expected = set(self.located['Name'][distances <= 12])
+            found = results[results['Query'] == query]
+
+            self.assertEqual(set(found['Name']), expected)
+            self.assertTrue(found['Distance'].is_monotonic_increasing)
+
+    def test_nearest(self) -> None:
+        results = self.index.nearest(self.lat, self.lng, k=3)
+
+        self.assertEqual(len(results), 3 * len(self.lat))
+        for query in range(len(self.lat)):
+            distances = numpy.sort(self.distances(query))[:3]
+            found = results.loc[results['Query'] == query, 'Distance']
+
+            numpy.testing.assert_allclose(found, distances)
+
+    def test_small_index(self) -> None:
+        index = PubIndex(self.pubs.head(3))
+
+        results = index.nearest(51.5, -0.1, k=5)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(PubIndex(self.pubs.head(0)).within(51, 0, 1)), 0)
+
+    def test_load_index(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = get_storage('parquet', directory)
+            storage.save(self.pubs, '2024-01-01', 'geo')
+            index_path = os.path.join(directory, '2024-01-01-geo-index.npz')
+
+            built = load_index(storage, cell_size=5)
+            modified = os.path.getmtime(index_path)
+            loaded = load_index(storage, cell_size=5)
+
+            self.assertEqual(os.path.getmtime(index_path), modified)
+            self.assertTrue(
+                built.nearest(self.lat, self.lng).equals(
+                    loaded.nearest(self.lat, self.lng)
+                )
+            )
+
+            # The geo stage changed: the index is rebuilt
+            storage.save(self.pubs.head(100), '2024-01-01', 'geo')
+            self.assertLessEqual(len(load_index(storage, cell_size=5)), 100)
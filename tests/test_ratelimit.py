@@ -0,0 +1,90 @@
+import threading
+import unittest
+from unittest import mock
+
+from uk_pubs.ratelimit import TokenBucket
+from uk_pubs.utils import iter_geocode
+
+
+class FakeClock:
+    '''Stand-in for the ``time`` module, whose ``sleep`` moves the clock
+    forward instead of waiting. Rates are powers of two in the tests, so
+    the times add up exactly.
+    '''
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds: float):
+        with self.lock:
+            self.now += seconds
+
+
+class Geocoder:
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.times = []
+        self.lock = threading.Lock()
+
+    def geocode(self, search_string: str) -> list:
+        with self.lock:
+            self.times.append(self.clock.monotonic())
+
+        return [{'formatted_address': search_string}]
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch('uk_pubs.ratelimit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_and_burst(self) -> None:
+        bucket = TokenBucket(8, burst=4)
+        times = []
+        for _ in range(20):
+            bucket.acquire()
+            times.append(self.clock.now)
+
+        # The burst goes at once, and the others at 8 per second
+        self.assertEqual(times[:4], [0.0] * 4)
+        self.assertEqual(times[4:], [index / 8 for index in range(1, 17)])
+
+    def test_refill(self) -> None:
+        bucket = TokenBucket(2)
+        for _ in range(2):
+            bucket.acquire()
+
+        # Idle time refills the bucket, but not beyond the burst
+        self.clock.sleep(60)
+        start = self.clock.now
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.now - start, 0.5)
+
+    def test_invalid_rate(self) -> None:
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_iter_geocode(self) -> None:
+        geocoder = Geocoder(self.clock)
+        search_strings = ['%d High Street' % index for index in range(40)]
+
+        results = dict(iter_geocode(
+            geocoder, search_strings + ['1 HIGH STREET'], qps=16, burst=4
+        ))
+
+        self.assertEqual(len(results), 41)
+        self.assertEqual(len(geocoder.times), 40)
+        times = sorted(geocoder.times)
+        self.assertEqual(times[:4], [0.0] * 4)
+        # Never more requests than the burst plus the rate since the start
+        for count, sent_at in enumerate(times, 1):
+            self.assertLessEqual(count, 4 + sent_at * 16)
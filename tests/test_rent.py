@@ -0,0 +1,38 @@
+import unittest
+
+import numpy
+import pandas
+
+from uk_pubs.rent import annual_rent
+
+
+class TestAnnualRent(unittest.TestCase):
+    def test_annual_rent(self) -> None:
+        rents = pandas.Series([
+            '£1,000 PW',
+            '£1000PCM',
+            '£20,000',
+            'Approximate Ingoings £12,000',
+            '£20k - £25k per annum',
+            '£350 a week',
+            '3 bed flat, £20,000',
+            'Guide rent: 2 bed, £30k',
+            '£ 1 000 pw',
+            '25000',
+            'POA',
+            None,
+        ])
+
+        numpy.testing.assert_array_equal(
+            annual_rent(rents),
+            [
+                52000, 12000, 20000, 12000, 22500, 18200, 20000, 30000,
+                52000, 25000, numpy.nan, numpy.nan
+            ]
+        )
+
+    def test_missing_and_numeric(self) -> None:
+        self.assertTrue(annual_rent(pandas.Series([None, None])).isna().all())
+        self.assertEqual(
+            annual_rent(pandas.Series([25000]), 'monthly')[0], 300000
+        )
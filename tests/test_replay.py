@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+
+from uk_pubs.admiral_taverns.connector import AdmiralTavernsConnector
+from uk_pubs.punch_pubs.connector import PunchPubsConnector
+from uk_pubs.replay import (
+    Fixture,
+    FixtureServer,
+    MissingFixture,
+    RecordingGeocoder,
+    RecordingTransport,
+    ReplayGeocoder,
+    ReplayTransport,
+)
+from uk_pubs.utils import get_geoinfo
+
+
+CARD = (
+    '<div class="newsArticle table">'
+    '<div><a href="/pubs/{0}">The Pub {0}</a></div>'
+    '<p class="location">{0} High Street</p>'
+    '<p class="price">Approximate Ingoings £1{0},000</p>'
+    '</div>'
+)
+PAGE = '<html><body>{}</body></html>'.format(
+    ''.join(CARD.format(i) for i in range(500))
+).encode('utf-8')
+PUNCH_PUBS = json.dumps([{
+    'name': 'The Crown %d' % i,
+    'outgoing_value': '£%d PW' % (100 + i),
+    'latlng': {'lat': 53.8, 'lng': -1.5 + i / 100},
+} for i in range(20)]).encode('utf-8')
+
+
+class FakeTransport:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response.url = url
+        response.raw = io.BytesIO(self.content)
+
+        return response
+
+
+class FakeGeocoder:
+    def geocode(self, search_string: str) -> list:
+        return [{
+            'formatted_address': search_string.upper(),
+            'address_components': [],
+            'geometry': {'location': {'lat': 51.5, 'lng': -0.1}},
+        }]
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'fixture.json.gz')
+
+    def record(self, connector_class, transport):
+        fixture = Fixture(self.path)
+        data = connector_class(RecordingTransport(fixture, transport)).get()
+        fixture.save()
+
+        return data
+
+    def test_replay_transport(self) -> None:
+        recorded = self.record(AdmiralTavernsConnector, FakeTransport(PAGE))
+
+        transport = ReplayTransport(Fixture.load(self.path))
+        streamed = AdmiralTavernsConnector(transport).get(streaming=True)
+        parsed = AdmiralTavernsConnector(transport).get(streaming=False)
+
+        self.assertEqual(len(recorded), 500)
+        self.assertTrue(streamed.equals(recorded))
+        self.assertTrue(parsed.equals(recorded))
+
+    def test_fixture_server(self) -> None:
+        recorded = self.record(
+            PunchPubsConnector, FakeTransport(PUNCH_PUBS)
+        )
+
+        with FixtureServer(Fixture.load(self.path)) as server:
+            with server.transport() as transport:
+                served = PunchPubsConnector(transport).get()
+
+                response = transport.get(server.url + '/not-recorded')
+                self.assertEqual(response.status_code, 404)
+
+        self.assertTrue(served.equals(recorded))
+
+    def test_missing_request(self) -> None:
+        transport = ReplayTransport(Fixture(self.path))
+
+        with self.assertRaises(MissingFixture):
+            transport.get(PunchPubsConnector.URL)
+
+    def test_geocoder(self) -> None:
+        fixture = Fixture(self.path)
+        search_strings = ['1 High Street, UK', '2 High Street, UK']
+        recorded = get_geoinfo(
+            RecordingGeocoder(fixture, FakeGeocoder()), search_strings
+        )
+        fixture.save()
+
+        replayed = get_geoinfo(
+            ReplayGeocoder(Fixture.load(self.path)),
+            [' 2 high street , UK'] + search_strings
+        )
+
+        self.assertTrue(replayed.iloc[1:].equals(recorded))
+        self.assertEqual(
+            replayed['FormattedAddress'].iloc[0], '2 HIGH STREET, UK'
+        )
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.schema import PUB_SCHEMA, conform
+from uk_pubs.sql import get_loader
+from uk_pubs.storage import CsvStageStorage, ParquetStageStorage
+
+
+class TestSchema(unittest.TestCase):
+    data = pandas.DataFrame({
+        'PubKey': ['a', 'b'],
+        'Name': ['The Red Lion', 'The Crown'],
+        'Lat': [51.5007, 53.4084],
+        'Long': [-0.1246, -2.9916],
+        'City': ['London', None],
+        'ScrapeDate': ['2021-09-01', '2021-09-01'],
+        'Source': ['Stonegate', 'Stonegate'],
+    })
+
+    def test_conform(self) -> None:
+        data = conform(self.data)
+
+        self.assertEqual(data['Name'].dtype, 'string')
+        self.assertEqual(data['Lat'].dtype, 'float32')
+        self.assertEqual(data['City'].dtype, 'category')
+        self.assertEqual(data['Source'].dtype, 'category')
+        self.assertEqual(data['ScrapeDate'].dtype, 'datetime64[ns]')
+        self.assertEqual(data['ScrapeDate'][0], pandas.Timestamp('2021-09-01'))
+        self.assertAlmostEqual(data['Lat'][0], 51.5007, places=5)
+        self.assertTrue(pandas.isna(data['City'][1]))
+
+    def test_concat_batches(self) -> None:
+        data = concat_batches([
+            conform(self.data),
+            conform(self.data.assign(City='Leeds', Source='Punch Pubs')),
+        ])
+
+        self.assertEqual(data['City'].dtype, 'category')
+        self.assertEqual(
+            list(data['Source']), ['Stonegate'] * 2 + ['Punch Pubs'] * 2
+        )
+        self.assertEqual(set(data['City'].cat.categories), {'London', 'Leeds'})
+
+        # Text and object categories
+        data = concat_batches([
+            conform(self.data.astype({'City': 'string'})),
+            conform(self.data.assign(City=None)),
+        ])
+        self.assertEqual(data['City'].dtype, 'category')
+        self.assertEqual(list(data['City'].dropna()), ['London'])
+
+    def test_round_trip(self) -> None:
+        for storage_class in (CsvStageStorage, ParquetStageStorage):
+            with self.subTest(storage_class.__name__), \
+                    tempfile.TemporaryDirectory() as tmp_dir:
+                storage = storage_class(tmp_dir, {'clean': PUB_SCHEMA})
+                storage.save(conform(self.data), '2021-09-01', 'clean')
+
+                pandas.testing.assert_frame_equal(
+                    storage.load('2021-09-01', 'clean'),
+                    conform(self.data),
+                    check_categorical=False
+                )
+
+    def test_load_sqlite(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = os.path.join(tmp_dir, 'pubs.db')
+            loader = get_loader('sqlite/%s.main.pubs' % database)
+            with loader.pool:
+                loader.load(conform(self.data), (), PUB_SCHEMA)
+
+            with sqlite3.connect(database) as connection:
+                rows = connection.execute(
+                    'SELECT PubKey, City, ScrapeDate, Source FROM pubs '
+                    'ORDER BY PubKey'
+                ).fetchall()
+            connection.close()
+
+        self.assertEqual(rows, [
+            ('a', 'London', '2021-09-01', 'Stonegate'),
+            ('b', None, '2021-09-01', 'Stonegate'),
+        ])
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from uk_pubs.reverse_geocoder import ReverseGeocoder
+from uk_pubs.spatial import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+    def test_nearest_matches_brute_force(self) -> None:
+        rng = numpy.random.default_rng(0)
+        lat, lng = rng.uniform(50, 56, 5000), rng.uniform(-5, 1, 5000)
+        query_lat = numpy.append(rng.uniform(50, 56, 200), 60)
+        query_lng = numpy.append(rng.uniform(-5, 1, 200), -20)
+
+        index = GridIndex(lat, lng, cell_size=2)
+        nearest, _ = index.nearest(query_lat, query_lng)
+
+        x, y = index.project(lat, lng)
+        query_x, query_y = index.project(query_lat, query_lng)
+        expected = (
+            (x[None, :] - query_x[:, None]) ** 2
+            + (y[None, :] - query_y[:, None]) ** 2
+        ).argmin(axis=1)
+
+        numpy.testing.assert_array_equal(nearest, expected)
+
+    def test_dense_cluster(self) -> None:
+        class Index(GridIndex):
+            # Queries are split in several chunks
+            MAX_CELLS_PER_CHUNK = 500
+
+        rng = numpy.random.default_rng(1)
+        # A dense city in sparse countryside
+        lat = numpy.append(
+            rng.normal(51.5, 0.02, 4000), rng.uniform(50, 56, 1000)
+        )
+        lng = numpy.append(
+            rng.normal(-0.1, 0.03, 4000), rng.uniform(-5, 1, 1000)
+        )
+        query_lat = numpy.append(
+            rng.normal(51.5, 0.02, 300), rng.uniform(50, 56, 300)
+        )
+        query_lng = numpy.append(
+            rng.normal(-0.1, 0.03, 300), rng.uniform(-5, 1, 300)
+        )
+
+        index = Index(lat, lng)
+        nearest, distance = index.nearest(query_lat, query_lng)
+        near, _ = index.nearest(query_lat, query_lng, max_distance=5)
+
+        x, y = index.project(lat, lng)
+        query_x, query_y = index.project(query_lat, query_lng)
+        d2 = (x[None, :] - query_x[:, None]) ** 2 \
+            + (y[None, :] - query_y[:, None]) ** 2
+        # Cells are sized for the city
+        self.assertLess(index.cell_size, 1)
+        numpy.testing.assert_array_equal(nearest, d2.argmin(axis=1))
+        numpy.testing.assert_array_equal(
+            near, numpy.where(distance <= 5, nearest, -1)
+        )
+
+
+class TestReverseGeocoder(unittest.TestCase):
+    def test_geoinfo(self) -> None:
+        geocoder = ReverseGeocoder(pandas.DataFrame({
+            'PostalCode': ['SW1A 1AA', 'L1 8JQ'],
+            'Lat': [51.501, 53.401],
+            'Long': [-0.141, -2.981],
+            'City': ['London', 'Liverpool'],
+        }))
+
+        geo_info = geocoder.geoinfo(['53.4, -2.98', '51.5, -0.14', '0, 0'])
+
+        self.assertListEqual(
+            geo_info['PostalCode'].tolist(), ['L1 8JQ', 'SW1A 1AA', numpy.nan]
+        )
+        self.assertEqual(geo_info.loc['53.4, -2.98', 'Lat'], 53.4)
+
+    def test_from_csv(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'onspd.csv')
+            pandas.DataFrame({
+                'pcds': ['CF10 1EP', 'EH1 1YZ', 'EH1 9ZZ', 'ZZ99 9ZZ'],
+                'doterm': [None, None, '200012', None],
+                'lat': [51.48, 55.95, 55.95, 99.999999],
+                'long': [-3.18, -3.19, -3.19, 0],
+                'ctry': ['W92000004', 'S92000003', 'S92000003', 'L93000001'],
+                'City': ['Cardiff', 'Edinburgh', 'Edinburgh', None],
+                'oseast1m': [318_000, 325_000, 325_000, None],
+            }).to_csv(path, index=False)
+
+            geocoder = ReverseGeocoder.from_csv(path)
+
+        # Terminated postcodes and postcodes without coordinates are dropped
+        self.assertEqual(
+            geocoder.reference.columns.tolist(),
+            ['PostalCode', 'Lat', 'Long', 'State', 'City', 'Country']
+        )
+        geo_info = geocoder.geoinfo(['51.48, -3.18', '55.95, -3.19'])
+        self.assertEqual(geo_info['PostalCode'].tolist(), [
+            'CF10 1EP', 'EH1 1YZ'
+        ])
+        self.assertEqual(geo_info['State'].tolist(), ['Wales', 'Scotland'])
+        self.assertEqual(geo_info['Country'].tolist(), ['GB', 'GB'])
+        self.assertEqual(geo_info['City'].tolist(), ['Cardiff', 'Edinburgh'])
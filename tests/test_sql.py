@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs.schema import PUB_SCHEMA
+from uk_pubs.sql import get_loader, parse_table
+
+
+class TestSqlLoader(unittest.TestCase):
+    def test_parse_table(self) -> None:
+        location = parse_table('sqlite/data/pubs.db.main.pubs')
+
+        self.assertEqual(location.server, 'sqlite')
+        self.assertEqual(location.database, 'data/pubs.db')
+        self.assertEqual(location.schema, 'main')
+        self.assertEqual(location.table, 'pubs')
+        with self.assertRaises(ValueError):
+            parse_table('SERVER/DATABASE.TABLE')
+
+    def test_load_sqlite(self) -> None:
+        data = pandas.DataFrame({
+            'PubKey': ['a', 'b', 'c'],
+            'Name': ['The Red Lion', 'The Crown', None],
+            'AnnualRent': [25000.0, None, 1000.0],
+        })
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = os.path.join(tmp_dir, 'pubs.db')
+            loader = get_loader(
+                'sqlite/%s.main.pubs' % database, chunk_size=2
+            )
+            with loader.pool:
+                self.assertEqual(loader.load(data, (), PUB_SCHEMA), 3)
+                loader.load(
+                    data.iloc[[0]].assign(AnnualRent=30000.0), ['c'],
+                    PUB_SCHEMA
+                )
+
+            with sqlite3.connect(database) as connection:
+                rows = connection.execute(
+                    'SELECT PubKey, Name, AnnualRent FROM pubs ORDER BY PubKey'
+                ).fetchall()
+                tables = connection.execute(
+                    'SELECT name FROM sqlite_master WHERE type = "table"'
+                ).fetchall()
+            connection.close()
+
+        self.assertEqual(
+            rows, [('a', 'The Red Lion', 30000.0), ('b', 'The Crown', None)]
+        )
+        self.assertEqual(tables, [('pubs',)])
+
+    def test_new_columns(self) -> None:
+        data = pandas.DataFrame({
+            'PubKey': ['a', 'b'],
+            'Name': ['The Red Lion', 'The Crown'],
+        })
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = os.path.join(tmp_dir, 'pubs.db')
+            loader = get_loader('sqlite/%s.main.pubs' % database)
+            with loader.pool:
+                loader.load(data, (), PUB_SCHEMA)
+                # A later run with more columns, e.g. the combined run
+                loader.load(
+                    data.iloc[[1]].assign(PubId='1', AnnualRent=1000.0), (),
+                    PUB_SCHEMA
+                )
+
+            with sqlite3.connect(database) as connection:
+                rows = connection.execute(
+                    'SELECT PubKey, PubId, AnnualRent FROM pubs '
+                    'ORDER BY PubKey'
+                ).fetchall()
+                types = {
+                    name: column_type for _, name, column_type, *_ in
+                    connection.execute('PRAGMA table_info(pubs)')
+                }
+            connection.close()
+
+        self.assertEqual(rows, [('a', None, None), ('b', '1', 1000.0)])
+        self.assertEqual(types['AnnualRent'], 'REAL')
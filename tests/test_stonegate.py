@@ -0,0 +1,172 @@
+import json
+import threading
+import unittest
+
+import requests
+
+from uk_pubs.stonegate.connector import (
+    IncompleteResults,
+    PageSizer,
+    StonegateConnector,
+)
+
+
+class SearchTransport:
+    '''Stonegate search answering pages of ``size`` pubs, with at most
+    ``max_take`` pubs per page.
+    '''
+
+    def __init__(self, size: int, max_take: int = 10_000, total: int = None):
+        self.pubs = [{
+            'PubName': 'The Swan %d' % i,
+            'PubLinkUrl': '/pubs/swan-%d' % i,
+            'Latitude': 51.5,
+            'Longitude': -0.1,
+        } for i in range(size)]
+        self.max_take = max_take
+        self.total = size if total is None else total
+        self.pages = []
+        self.lock = threading.Lock()
+
+    def post(self, url: str, json: dict, **kwargs) -> requests.Response:
+        skip, take = json['skip'], min(json['take'], self.max_take)
+        with self.lock:
+            self.pages.append((json['skip'], json['take']))
+
+        content = {'Results': self.pubs[skip:skip + take]}
+        if self.total is not False:
+            content['TotalRows'] = self.total
+
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response._content = _dumps(content)
+
+        return response
+
+
+def _dumps(content: dict) -> bytes:
+    return json.dumps(content).encode()
+
+
+class TestStonegateConnector(unittest.TestCase):
+    def test_pages(self) -> None:
+        for max_in_flight in (None, 4):
+            with self.subTest(max_in_flight=max_in_flight):
+                transport = SearchTransport(2_345, max_take=300)
+                connector = StonegateConnector(transport)
+                data = connector.get(max_in_flight=max_in_flight)
+
+                self.assertEqual(len(data), 2_345)
+                self.assertEqual(data['PubName'].nunique(), 2_345)
+                # The first page is truncated by the server, and later pages
+                # are no larger than the server allows
+                self.assertEqual(transport.pages[0], (0, 500))
+                self.assertTrue(all(
+                    take <= 300 for _, take in transport.pages[1:]
+                ))
+
+    def test_truncated_pages(self) -> None:
+        class Connector(StonegateConnector):
+            PAGE_SIZE = 200
+
+        # Responses are fast, so pages grow past what the server allows
+        transport = SearchTransport(3_000, max_take=300)
+        data = Connector(transport).get(max_in_flight=2)
+
+        self.assertEqual(data['PubName'].nunique(), 3_000)
+        self.assertIn((200, 400), transport.pages)
+        self.assertIn((500, 100), transport.pages)
+
+    def test_fast_json(self) -> None:
+        connector = StonegateConnector(SearchTransport(1_200))
+        data = connector.get(fast_json=True, max_in_flight=3)
+
+        self.assertEqual(sorted(data['PubLinkUrl']), sorted(
+            '/pubs/swan-%d' % i for i in range(1_200)
+        ))
+
+    def test_incomplete_results(self) -> None:
+        connector = StonegateConnector(SearchTransport(700, total=750))
+
+        with self.assertRaises(IncompleteResults):
+            connector.get(max_in_flight=2)
+
+    def test_without_total(self) -> None:
+        transport = SearchTransport(1_100, total=False)
+        data = StonegateConnector(transport).get(max_in_flight=4)
+
+        # Responses are fast: the second page is larger than the first one
+        self.assertEqual(data['PubName'].nunique(), 1_100)
+        self.assertEqual(transport.pages[:2], [(0, 500), (500, 1_000)])
+        # Pages past the end are requested only until the first empty one
+        # comes back
+        self.assertLessEqual(
+            sum(skip >= 1_100 for skip, _ in transport.pages), 4
+        )
+
+    def test_without_total_truncated_pages(self) -> None:
+        for max_in_flight in (None, 4):
+            with self.subTest(max_in_flight=max_in_flight):
+                transport = SearchTransport(3_000, max_take=500, total=False)
+                connector = StonegateConnector(transport)
+                data = connector.get(max_in_flight=max_in_flight)
+
+                # Pages larger than the server allows come back short, which
+                # does not end the results
+                self.assertEqual(len(data), 3_000)
+                self.assertEqual(data['PubName'].nunique(), 3_000)
+                self.assertIn((1_000, 500), transport.pages)
+
+    def test_without_total_missing_pages(self) -> None:
+        class GapTransport(SearchTransport):
+            def post(self, url: str, json: dict, **kwargs):
+                if json['skip'] == 500:
+                    json = {**json, 'skip': 5_000}
+
+                return super().post(url, json, **kwargs)
+
+        connector = StonegateConnector(GapTransport(2_000, total=False))
+
+        with self.assertRaises(IncompleteResults):
+            connector.get(max_in_flight=2)
+
+    def test_without_total_skip_ignored(self) -> None:
+        class FirstPageTransport(SearchTransport):
+            def post(self, url: str, json: dict, **kwargs):
+                return super().post(url, {**json, 'skip': 0}, **kwargs)
+
+        class Connector(StonegateConnector):
+            MAX_RESULTS = 5_000
+
+        connector = Connector(FirstPageTransport(300, total=False))
+
+        with self.assertRaises(IncompleteResults):
+            connector.get(max_in_flight=2)
+
+    def test_fields_of_later_pages(self) -> None:
+        transport = SearchTransport(800)
+        for pub in transport.pubs[600:]:
+            pub['GuideRent'] = '£20,000'
+
+        data = StonegateConnector(transport).get()
+
+        self.assertEqual(data['GuideRent'].notna().sum(), 200)
+        self.assertTrue(data['GuideRent'].iloc[:600].isna().all())
+
+    def test_page_sizer(self) -> None:
+        sizer = PageSizer(500, 100, 2_000, target_time=1.0)
+
+        sizer.update(500, 0.1)
+        self.assertEqual(sizer.size, 1_000)
+        sizer.update(1_000, 0.5)
+        self.assertEqual(sizer.size, 2_000)
+        sizer.update(2_000, 0.1)
+        self.assertEqual(sizer.size, 2_000)
+        sizer.update(2_000, 8.0)
+        self.assertEqual(sizer.size, 1_000)
+
+        sizer.limit(300)
+        self.assertEqual(sizer.size, 300)
+        sizer.update(300, 0.1)
+        self.assertEqual(sizer.size, 300)
@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+
+import pandas
+
+from uk_pubs.schema import PUB_SCHEMA
+from uk_pubs.storage import CsvStageStorage, ParquetStageStorage
+
+
+class TestStageStorage(unittest.TestCase):
+    data = pandas.DataFrame({
+        'Name': ['The Red Lion', 'The Crown'],
+        'AnnualRent': ['25000', None],
+        'Lat': [51.5, 53.4],
+        'Long': [-0.12, -2.98],
+        'Source': ['Stonegate', 'Stonegate'],
+    })
+
+    def test_round_trip(self) -> None:
+        for storage_class in (CsvStageStorage, ParquetStageStorage):
+            with self.subTest(storage_class.__name__), \
+                    tempfile.TemporaryDirectory() as tmp_dir:
+                storage = storage_class(tmp_dir, {'clean': PUB_SCHEMA})
+                storage.save(self.data, '2021-09-01', 'clean')
+
+                self.assertTrue(storage.exists('2021-09-01', 'clean'))
+                data = storage.load('2021-09-01', 'clean')
+
+                self.assertEqual(data['Name'].dtype, 'string')
+                self.assertEqual(data['AnnualRent'].dtype, 'float64')
+                self.assertEqual(data['AnnualRent'][0], 25000)
+                self.assertTrue(pandas.isna(data['AnnualRent'][1]))
+
+    def test_write_batches(self) -> None:
+        batches = [
+            self.data.iloc[:1],
+            self.data.iloc[1:].drop(columns='Name').assign(Extra='x'),
+        ]
+
+        for storage_class in (CsvStageStorage, ParquetStageStorage):
+            with self.subTest(storage_class.__name__), \
+                    tempfile.TemporaryDirectory() as tmp_dir:
+                storage = storage_class(tmp_dir, {'raw': PUB_SCHEMA})
+                written = storage.write_batches(batches, '2021-09-01', 'raw')
+
+                self.assertEqual(len(next(written)), 1)
+                self.assertFalse(storage.exists('2021-09-01', 'raw'))
+                self.assertEqual(len(list(written)), 1)
+
+                data = storage.load('2021-09-01', 'raw')
+                self.assertEqual(list(data.columns), list(self.data.columns))
+                self.assertEqual(data['AnnualRent'][0], 25000)
+                self.assertTrue(pandas.isna(data['Name'][1]))
@@ -0,0 +1,187 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from requests.structures import CaseInsensitiveDict
+import requests
+
+from uk_pubs.http_cache import ResponseCache
+from uk_pubs.transport import (
+    HttpTransport,
+    RetryPolicy,
+    get_default_transport,
+    request_key,
+)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    '''Answers ``503`` to the first ``failures`` requests, then ``200``,
+    recording the client port of every request.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.ports.append(self.client_address[1])
+            failing = len(server.ports) <= server.failures
+
+        content = b'unavailable' if failing else b'ok'
+        self.send_response(503 if failing else 200)
+        if failing:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args):
+        pass
+
+
+class TestHttpTransport(unittest.TestCase):
+    def serve(self, failures: int = 0) -> str:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.ports = []
+        server.failures = failures
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+
+        return 'http://127.0.0.1:%d/' % server.server_address[1]
+
+    def test_session_reuse(self) -> None:
+        url = self.serve()
+
+        with HttpTransport(pool_size=2) as transport:
+            for _ in range(5):
+                self.assertEqual(transport.get(url).text, 'ok')
+
+        # Every request went through the same kept-alive connection
+        self.assertEqual(len(self.server.ports), 5)
+        self.assertEqual(len(set(self.server.ports)), 1)
+
+    def test_retry_statuses(self) -> None:
+        url = self.serve(failures=2)
+
+        with HttpTransport(retry_policy=RetryPolicy(retries=2)) as transport:
+            response = transport.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.ports), 3)
+
+    def test_retries_exhausted(self) -> None:
+        url = self.serve(failures=5)
+        policy = RetryPolicy(retries=1)
+
+        # The host's policy wins over the default one
+        with HttpTransport(host_policies={'127.0.0.1': policy}) as transport:
+            response = transport.get(url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.ports), 2)
+
+    def test_connection_errors(self) -> None:
+        url = self.serve()
+        self.server.shutdown()
+        self.server.server_close()
+        policy = RetryPolicy(retries=2, backoff=0)
+
+        with HttpTransport(retry_policy=policy, timeout=1) as transport:
+            with self.assertRaises(requests.ConnectionError):
+                transport.get(url)
+
+    def test_settings(self) -> None:
+        transport = HttpTransport(pool_size=7, headers={'User-Agent': 'pubs'})
+        adapter = transport.session.get_adapter('https://pubs/')
+
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 0)
+        self.assertEqual(transport.session.headers['User-Agent'], 'pubs')
+        self.assertIn('gzip', transport.session.headers['Accept-Encoding'])
+        self.assertIs(get_default_transport(), get_default_transport())
+
+    def test_wait_time(self) -> None:
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        response = requests.Response()
+        response.headers['Retry-After'] = '60'
+
+        self.assertEqual(policy.wait_time(0, response), 5)
+        for attempt in range(6):
+            wait_time = policy.wait_time(attempt)
+            self.assertGreaterEqual(wait_time, 0)
+            self.assertLessEqual(wait_time, min(5, 2 ** attempt))
+
+
+class ConditionalTransport(HttpTransport):
+    '''Transport answering ``304`` to requests carrying the ETag it sends.'''
+    ETAG = '"v1"'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent_headers = []
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        headers = kwargs.get('headers') or {}
+        self.sent_headers.append(headers)
+
+        response = requests.Response()
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({'ETag': self.ETAG})
+        if headers.get('If-None-Match') == self.ETAG:
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = b'[{"name": "The Crown"}]'
+
+        return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_not_modified(self) -> None:
+        cache = ResponseCache(self.tmp_dir.name)
+        transport = ConditionalTransport(cache=cache)
+
+        first = transport.get('https://pubs/', headers=None, use_cache=True)
+        second = transport.get('https://pubs/', headers=None, use_cache=True)
+
+        self.assertEqual(second.json(), first.json())
+        self.assertTrue(second.from_cache)
+        self.assertEqual(transport.sent_headers[1]['If-None-Match'], '"v1"')
+        self.assertEqual((cache.downloaded, cache.revalidated), (1, 1))
+
+    def test_prune(self) -> None:
+        cache = ResponseCache(self.tmp_dir.name)
+        transport = ConditionalTransport(cache=cache)
+        urls = ['https://pubs/%d' % page for page in range(4)]
+        keys = [request_key('GET', url) for url in urls]
+        now = time.time()
+        # The first page was last used long ago
+        used = [now - 10_000, now - 30, now - 20, now]
+        for url, key, used_at in zip(urls, keys, used):
+            transport.get(url, use_cache=True)
+            metadata_path, _ = cache._paths(key)
+            os.utime(metadata_path, (used_at, used_at))
+
+        cache = ResponseCache(self.tmp_dir.name, max_age=1_000, max_entries=2)
+
+        self.assertEqual(
+            [bool(cache.validators(key)) for key in keys],
+            [False, False, True, True]
+        )
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 4)
@@ -1,12 +1,21 @@
 from datetime import date
+from typing import Iterator, Optional
 import logging
 
 import pandas
-import requests
 
-from lxml import html
+from lxml import etree, html
 
-from uk_pubs.utils import mount_html_elements
+from uk_pubs.batches import (
+    DEFAULT_BATCH_SIZE,
+    chunks,
+    concat_batches,
+    make_batch,
+)
+from uk_pubs.rent import annual_rent
+from uk_pubs.schema import apply_schema, conform
+from uk_pubs.transport import HttpTransport, get_default_transport
+from uk_pubs.utils import ExtractionPlan, compile_structure
 
 
 logger = logging.getLogger(__name__)
@@ -16,9 +25,11 @@ class AdmiralTavernsConnector:
     '''Connector with Admiral Taverns data source for pubs in the UK.'''
     NAME = 'Admiral Taverns'
     URL = 'https://www.admiraltaverns.co.uk/find-a-pub/?pcSearch&z=2&ppp=-1'
+    CARD_CLASS = 'newsArticle table'
+    CHUNK_SIZE = 64 * 1024
     STRUCTURE = {
         'Pubs': [
-            './/div[@class = "newsArticle table"]',
+            './/div[@class = "%s"]' % CARD_CLASS,
             {
                 'Name': './div/a/text()',
                 'URL': './div/a/@href',
@@ -28,6 +39,24 @@ class AdmiralTavernsConnector:
             }
         ]
     }
+    RAW_SCHEMA = {
+        'Name': 'string',
+        'URL': 'string',
+        'StreetAddress': 'string',
+        'ApproximatePrice': 'string',
+        'Description': 'string',
+        'ScrapeDate': 'string',
+        'Source': 'string',
+    }
+
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        '''Create the connector.
+
+        :param transport: HTTP transport used to reach the source. Defaults
+            to the transport shared by all connectors
+        :type transport: HttpTransport, optional
+        '''
+        self.transport = transport or get_default_transport()
 
     def clean(self, raw_data: pandas.DataFrame) -> pandas.DataFrame:
         '''Clean the raw data from the website.
@@ -41,28 +70,97 @@ class AdmiralTavernsConnector:
 
         data = raw_data.copy()
 
-        data['AnnualRent'] = data['ApproximatePrice']\
-            .str.replace(r'Approximate Ingoings [£]?', '', regex=True)\
-            .str.replace(r'[.,]', '', regex=True)\
-            .astype('float64')
+        data['AnnualRent'] = annual_rent(data['ApproximatePrice'])
 
         del data['ApproximatePrice']
 
-        return data
+        return conform(data)
+
+    def iter_pubs(self) -> Iterator[dict]:
+        '''Stream the listing, yielding each pub as soon as its card has been
+        downloaded.
+
+        The page is fed to an incremental parser chunk by chunk, so parsing
+        overlaps with the download, and every card is removed from the tree
+        once extracted, so memory use does not grow with the listing.
+
+        :return: Iterator over the raw fields of each pub
+        :rtype: Iterator[dict]
+        '''
+        logger.info('Streaming AdmiralTaverns data from %s', self.URL)
+
+        _, _, card_plan = compile_structure(self.STRUCTURE).inner_nodes[0]
+
+        with self.transport.get(self.URL, stream=True) as response:
+            parser = etree.HTMLPullParser(
+                events=('end',), tag='div', encoding=response.encoding
+            )
+            for chunk in response.iter_content(self.CHUNK_SIZE):
+                parser.feed(chunk)
+                yield from self._read_cards(parser, card_plan)
+
+            parser.close()
+            yield from self._read_cards(parser, card_plan)
+
+    def _read_cards(
+        self,
+        parser: etree.HTMLPullParser,
+        card_plan: ExtractionPlan
+    ) -> Iterator[dict]:
+        for _, element in parser.read_events():
+            if element.get('class') != self.CARD_CLASS:
+                continue
+
+            yield card_plan.record(element)
+
+            # Free the card and the (already processed) elements before it
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def iter_batches(
+        self,
+        streaming: bool = True,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[pandas.DataFrame]:
+        '''Get the pubs of the listing, in batches typed as the
+        ``RAW_SCHEMA``.
+
+        :param streaming: Parse the listing while it is downloaded (see
+            ``iter_pubs``) instead of after downloading the whole page
+        :type streaming: bool
+        :param batch_size: Number of pubs in each batch, when streaming
+        :type batch_size: int
+        :return: Iterator over the batches of pubs
+        :rtype: Iterator[pandas.DataFrame]
+        '''
+        _, _, card_plan = compile_structure(self.STRUCTURE).inner_nodes[0]
+        columns = [name for name, _ in card_plan.leaves]
+        constants = {'ScrapeDate': str(date.today()), 'Source': self.NAME}
+
+        if streaming:
+            count = 0
+            for chunk in chunks(self.iter_pubs(), batch_size):
+                count += len(chunk)
+                yield make_batch(chunk, self.RAW_SCHEMA, columns, **constants)
 
-    def get(self) -> pandas.DataFrame:
-        logger.info('Getting AdmiralTaverns data from %s', self.URL)
+            logger.info('Streamed %d pubs', count)
+        else:
+            logger.info('Getting AdmiralTaverns data from %s', self.URL)
 
-        response = requests.get(self.URL)
+            response = self.transport.get(self.URL)
 
-        logger.info('HTML file retrieved. Getting DOM\'s elements')
+            logger.info('HTML file retrieved. Getting DOM\'s elements')
 
-        html_obj = html.fromstring(response.text)
-        page_elements = mount_html_elements(html_obj, self.STRUCTURE)
-        pubs_list = page_elements['Pubs']
-        data = pandas.DataFrame(pubs_list).applymap(', '.join)
+            html_obj = html.fromstring(response.text)
+            page_elements = compile_structure(self.STRUCTURE)\
+                .columns(html_obj)
+            data = pandas.DataFrame(page_elements['Pubs'], columns=columns)
+            data = data.assign(**constants)
 
-        data['ScrapeDate'] = str(date.today())
-        data['Source'] = self.NAME
+            yield apply_schema(data, self.RAW_SCHEMA)
 
-        return data
+    def get(self, streaming: bool = True) -> pandas.DataFrame:
+        '''Get all the pubs of the listing (see ``iter_batches``).'''
+        return concat_batches(self.iter_batches(streaming))
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+import itertools
+
+import pandas
+
+from uk_pubs.schema import apply_schema, unify_categories
+
+
+# Number of pubs in each batch yielded by the connectors' ``iter_batches``
+DEFAULT_BATCH_SIZE = 5_000
+
+
+def chunks(records: Iterable, size: int) -> Iterator[list]:
+    '''Split an iterable into lists of ``size`` items (the last one may be
+    shorter).
+    '''
+    records = iter(records)
+    while chunk := list(itertools.islice(records, size)):
+        yield chunk
+
+
+def flat_keys(records: Iterable[dict], sep: str = '.') -> List[str]:
+    '''Return the columns ``pandas.json_normalize`` would build from the
+    records, in order of appearance, without building them.
+    '''
+    keys = {}
+
+    def walk(record: dict, prefix: str):
+        for key, value in record.items():
+            if isinstance(value, dict) and value:
+                walk(value, prefix + key + sep)
+            else:
+                keys.setdefault(prefix + key)
+
+    for record in records:
+        walk(record, '')
+
+    return list(keys)
+
+
+def make_batch(
+    records: List[dict],
+    schema: Optional[Dict[str, str]] = None,
+    columns: Optional[List[str]] = None,
+    **constants
+) -> pandas.DataFrame:
+    '''Build a batch of pubs from their records.
+
+    :param records: Raw records, nested dicts being flattened as with
+        ``pandas.json_normalize``
+    :type records: List[dict]
+    :param schema: Column types of the batch
+    :type schema: dict, optional
+    :param columns: Columns of the batch, so every batch of a source has the
+        same ones. Defaults to the columns of the records
+    :type columns: List[str], optional
+    :param constants: Columns with the same value for every pub (e.g.
+        ``ScrapeDate``)
+    :return: Batch with typed columns
+    :rtype: pandas.DataFrame
+    '''
+    batch = pandas.json_normalize(records, sep='.')
+    if columns is not None:
+        batch = batch.reindex(columns=columns)
+    for column, value in constants.items():
+        batch[column] = value
+
+    return apply_schema(batch, schema)
+
+
+def concat_batches(batches: Iterable[pandas.DataFrame]) -> pandas.DataFrame:
+    '''Collect batches into a single DataFrame. Categorical columns stay
+    categorical, with the categories of all batches.
+    '''
+    batches = list(batches)
+    if not batches:
+        return pandas.DataFrame()
+
+    return pandas.concat(unify_categories(batches), ignore_index=True)
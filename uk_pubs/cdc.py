@@ -0,0 +1,142 @@
+from typing import Iterable, Optional
+import logging
+
+import numpy
+import pandas
+
+from uk_pubs.batches import concat_batches
+
+
+logger = logging.getLogger(__name__)
+
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+# Columns that change on every scrape or are derived from the others
+IGNORED_COLUMNS = {'PubKey', 'ScrapeDate', 'SearchString'}
+
+_MISSING = object()
+
+
+def pub_keys(data: pandas.DataFrame) -> pandas.Series:
+    '''Build a key identifying each pub across daily scrapes of its source.
+
+    The key is the source followed by the pub's URL without its scheme, or,
+    for pubs without URL, by their normalised name and postcode.
+
+    :param data: Pubs with at least a ``Name`` column, and optionally
+        ``URL``, ``PostalCode`` and ``Source`` columns
+    :type data: pandas.DataFrame
+    :return: Key of each pub
+    :rtype: pandas.Series
+    '''
+    def column(name: str) -> pandas.Series:
+        if name in data.columns:
+            return data[name].astype('string')
+        return pandas.Series(pandas.NA, index=data.index, dtype='string')
+
+    url = column('URL').str.strip()\
+        .str.replace(r'^https?://(?:www\.)?', '', regex=True)\
+        .str.rstrip('/')\
+        .str.lower()\
+        .replace('', pandas.NA)
+    name_postcode = column('Name').str.lower()\
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)\
+        .str.strip()\
+        + '|' + column('PostalCode').fillna('').str.upper()\
+        .str.replace(r'\s+', '', regex=True)
+
+    return (column('Source').fillna('') + '|' + url.fillna(name_postcode))\
+        .rename('PubKey')
+
+
+def diff_snapshots(
+    previous: pandas.DataFrame,
+    current: pandas.DataFrame,
+    columns: Optional[Iterable[str]] = None
+) -> pandas.DataFrame:
+    '''Compare two snapshots of pubs with a ``PubKey`` column.
+
+    :param previous: Previous snapshot
+    :type previous: pandas.DataFrame
+    :param current: Current snapshot
+    :type current: pandas.DataFrame
+    :param columns: Columns compared to detect updates. Defaults to the
+        columns of both snapshots but the ``IGNORED_COLUMNS``
+    :type columns: Iterable[str], optional
+    :return: The inserted and updated pubs with their current values and the
+        deleted pubs with their previous values, with a ``ChangeType`` column
+        (``INSERT``, ``UPDATE`` or ``DELETE``) and a ``ChangedFields`` column
+        listing the updated columns
+    :rtype: pandas.DataFrame
+    '''
+    previous = _unique_keys(previous, 'previous')
+    current = _unique_keys(current, 'current')
+
+    if columns is None:
+        columns = [
+            column for column in current.columns
+            if column in previous.columns and column not in IGNORED_COLUMNS
+        ]
+    columns = list(columns)
+
+    in_previous = current['PubKey'].isin(previous['PubKey'])
+    in_current = previous['PubKey'].isin(current['PubKey'])
+
+    kept = current[in_previous]
+    before = previous.set_index('PubKey')\
+        .reindex(kept['PubKey'])\
+        .set_axis(kept.index, axis=0)
+
+    changed = numpy.column_stack([
+        ~_equal(kept[column], before[column]) for column in columns
+    ]) if columns else numpy.zeros((len(kept), 0), dtype=bool)
+    updated = changed.any(axis=1)
+
+    column_names = numpy.array(columns, dtype=object)
+    changed_fields = [', '.join(column_names[row]) for row in changed[updated]]
+
+    changes = concat_batches([
+        current[~in_previous].assign(ChangeType=INSERT),
+        kept[updated].assign(ChangeType=UPDATE, ChangedFields=changed_fields),
+        previous[~in_current].assign(ChangeType=DELETE),
+    ])
+    if 'ChangedFields' not in changes.columns:
+        changes['ChangedFields'] = None
+
+    logger.info(
+        'Changes: %d inserted, %d updated, %d deleted, %d unchanged',
+        (~in_previous).sum(), updated.sum(), (~in_current).sum(),
+        len(kept) - updated.sum()
+    )
+
+    return changes
+
+
+def changed_keys(changes: pandas.DataFrame) -> pandas.Index:
+    '''Return the keys of the pubs inserted or updated in a set of changes.'''
+    return pandas.Index(
+        changes.loc[changes['ChangeType'] != DELETE, 'PubKey'].unique()
+    )
+
+
+def _unique_keys(data: pandas.DataFrame, name: str) -> pandas.DataFrame:
+    duplicated = data['PubKey'].duplicated()
+    if duplicated.any():
+        logger.warning(
+            'Ignoring %d pubs with duplicated keys in the %s snapshot, '
+            'e.g. %s',
+            duplicated.sum(), name, data.loc[duplicated, 'PubKey'].iloc[0]
+        )
+
+    return data[~duplicated]
+
+
+def _equal(left: pandas.Series, right: pandas.Series) -> numpy.ndarray:
+    # Missing values (None, NaN, NA) are equal to each other only
+    left = left.astype(object).where(left.notna(), _MISSING)
+    right = right.astype(object).where(right.notna(), _MISSING)
+
+    return numpy.asarray(left == right, dtype=bool)
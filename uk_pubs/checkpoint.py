@@ -0,0 +1,112 @@
+from typing import Callable, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+
+import pandas
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageCheckpoint:
+    '''Durable record of the pages of a crawl fetched so far, so an
+    interrupted crawl can be resumed without downloading them again.
+
+    Each page is appended to a partial file (``<prefix>.partial.jsonl``, one
+    JSON line per page) and only then listed in a manifest
+    (``<prefix>.manifest.json``), which is replaced atomically. Pages missing
+    from the manifest, such as a line torn by a crash, are ignored.
+
+    :param prefix: Path of the checkpoint files, without extension
+    :type prefix: str
+    '''
+
+    def __init__(self, prefix: str):
+        self.partial_path = prefix + '.partial.jsonl'
+        self.manifest_path = prefix + '.manifest.json'
+        self._lock = threading.Lock()
+        self._pages: Dict[int, List[dict]] = {}
+
+        if os.path.exists(self.manifest_path) \
+                and os.path.exists(self.partial_path):
+            self._load()
+
+    def _load(self):
+        with open(self.manifest_path) as manifest_file:
+            completed = set(json.load(manifest_file)['pages'])
+
+        with open(self.partial_path) as partial_file:
+            for line in partial_file:
+                try:
+                    page = json.loads(line)
+                except ValueError:
+                    continue
+                if page['page'] in completed:
+                    self._pages[page['page']] = page['records']
+
+        logger.info(
+            'Resuming crawl from %s: %d pages already fetched',
+            self.partial_path, len(self._pages)
+        )
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __contains__(self, page_number: int) -> bool:
+        return page_number in self._pages
+
+    def load(self, page_number: int) -> Optional[pandas.DataFrame]:
+        '''Return a fetched page, or None if it was not fetched yet.'''
+        records = self._pages.get(page_number)
+
+        return None if records is None else pandas.DataFrame(records)
+
+    def save(self, page_number: int, data: pandas.DataFrame):
+        '''Record a fetched page durably.'''
+        records = json.loads(data.to_json(orient='records'))
+        line = json.dumps({'page': page_number, 'records': records})
+
+        with self._lock:
+            with open(self.partial_path, 'a') as partial_file:
+                partial_file.write(line + '\n')
+                partial_file.flush()
+                os.fsync(partial_file.fileno())
+
+            self._pages[page_number] = records
+
+            temporary_path = self.manifest_path + '.tmp'
+            with open(temporary_path, 'w') as manifest_file:
+                json.dump({'pages': sorted(self._pages)}, manifest_file)
+                manifest_file.flush()
+                os.fsync(manifest_file.fileno())
+            os.replace(temporary_path, self.manifest_path)
+
+    def fetch(
+        self,
+        page_number: int,
+        get_page: Callable[[int], pandas.DataFrame]
+    ) -> pandas.DataFrame:
+        '''Return a page from the checkpoint, or get and record it.'''
+        data = self.load(page_number)
+        if data is None:
+            data = get_page(page_number)
+            self.save(page_number, data)
+
+        return data
+
+    def wrap(
+        self,
+        get_page: Callable[[int], pandas.DataFrame]
+    ) -> Callable[[int], pandas.DataFrame]:
+        '''Wrap a function getting pages so it goes through the checkpoint.'''
+        return lambda page_number: self.fetch(page_number, get_page)
+
+    def clear(self):
+        '''Remove the checkpoint files, once the crawl is complete.'''
+        with self._lock:
+            for path in (self.manifest_path, self.partial_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._pages.clear()
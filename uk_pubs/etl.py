@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Tuple
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+import pandas
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.pipeline import (
+    add_arguments,
+    append_history,
+    capture_changes,
+    extract,
+    geocode,
+    make_storage,
+    make_transport,
+    match_pubs,
+    push_to_sql,
+    setup,
+    write_metrics,
+)
+from uk_pubs.registry import SOURCES
+
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    '''Run the ETL of several sources at once.
+
+    The raw and clean data of each source, and their changes since the
+    previous run, are saved under ``<dir>/<source>``, and their extraction
+    runs concurrently. The clean data of every source that succeeded is then
+    geocoded as a single dataset and its pubs are matched across sources,
+    both saved under ``<dir>``, its changes are pushed to SQL and its pubs
+    are appended to the ``history``, if given. A failing source is logged
+    and left out of the output, and the process exits with status 1 once the
+    other sources are done.
+    '''
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='UK Pubs ETL')
+    add_arguments(parser, 'logs\\uk_pubs')
+    parser.add_argument(
+        '-s', '--sources',
+        help='Sources to be extracted. Defaults to all of them',
+        nargs='+',
+        choices=sorted(SOURCES),
+        default=sorted(SOURCES)
+    )
+
+    args = parser.parse_args()
+
+    today = date.today()
+    setup(args, today)
+
+    try:
+        run(args, today)
+    finally:
+        write_metrics(args, today)
+
+
+def run(args: argparse.Namespace, today: date):
+    '''Run the ETL of the ``sources`` (see ``main``).'''
+    def run_source(key: str) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+        source = SOURCES[key]
+        storage = make_storage(args, os.path.join(args.dir, key), source)
+        data = extract(source, storage, today, transport, args)
+        data, changes = capture_changes(data, storage, today, args)
+        data['SearchString'] = source.search_strings(data)
+
+        return data, changes
+
+    results = {}
+    failed = []
+
+    with make_transport(args) as transport, \
+            ThreadPoolExecutor(len(args.sources)) as executor:
+        futures = {
+            executor.submit(run_source, key): key for key in args.sources
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception:
+                logger.exception('Failed to extract data from %s', key)
+                failed.append(key)
+            else:
+                logger.info(
+                    'Got %d pubs from %s', len(results[key][0]), key
+                )
+
+        transport.cache.log_stats()
+
+    if not results:
+        logger.error('No source could be extracted')
+        sys.exit(1)
+
+    keys = [key for key in args.sources if key in results]
+    data = concat_batches(results[key][0] for key in keys)
+    changes = concat_batches(results[key][1] for key in keys)
+    storage = make_storage(args, args.dir)
+    data = geocode(data, storage, today, args, changes)
+    data, changes = match_pubs(data, changes, storage, today)
+    push_to_sql(data, changes, args)
+    append_history(data, args, today)
+
+    if failed:
+        logger.error('Failed sources: %s', ', '.join(sorted(failed)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content: bytes) -> Any:
+    '''Decode a JSON document, with orjson if it is installed.'''
+    if orjson is not None:
+        return orjson.loads(content)
+
+    return json.loads(content)
+
+
+def _getter(path: Tuple[str, ...]) -> Callable[[dict], Any]:
+    if len(path) == 1:
+        key, = path
+        return lambda record: record.get(key)
+
+    def get(record: dict) -> Any:
+        for key in path:
+            if not isinstance(record, dict):
+                return None
+            record = record.get(key)
+        return record
+
+    return get
+
+
+def project(
+    records: Sequence[dict],
+    fields: Dict[str, Tuple[str, ...]]
+) -> Dict[str, List[Any]]:
+    '''Build columns from the declared fields of JSON records, ignoring every
+    other field.
+
+    :param records: Decoded JSON objects
+    :type records: Sequence[dict]
+    :param fields: Path of each column's field in the records, e.g.
+        ``{'latlng.lat': ('latlng', 'lat')}``. Missing fields are None
+    :type fields: dict
+    :return: Values of each column
+    :rtype: dict
+    '''
+    return {
+        column: list(map(_getter(path), records))
+        for column, path in fields.items()
+    }
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalise_search_string(search_string: str) -> str:
+    '''Normalise a geocoding search string so that equivalent queries share the
+    same cache key (case, surrounding spaces and repeated spaces/commas are
+    ignored).
+
+    :param search_string: Search string sent to the geocoder
+    :type search_string: str
+    :return: Normalised search string
+    :rtype: str
+    '''
+    key = str(search_string).strip().lower()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+
+    return key.strip(', ')
+
+
+class GeocodeCache:
+    '''Persistent SQLite cache of geocoder responses, keyed by the normalised
+    search string.
+
+    Entries older than ``ttl`` seconds are treated as expired and refreshed on
+    the next lookup, and so are empty responses (no results) older than
+    ``negative_ttl`` seconds, as they may be transient. When the cache grows
+    beyond ``max_entries`` the least recently used entries are evicted.
+
+    Writes are committed every ``commit_every`` responses stored, so a run
+    that is interrupted loses at most that many paid requests.
+    '''
+    DEFAULT_TTL = 90 * 24 * 60 * 60
+    DEFAULT_NEGATIVE_TTL = 24 * 60 * 60
+    DEFAULT_MAX_ENTRIES = 500_000
+    DEFAULT_COMMIT_EVERY = 100
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        commit_every: int = DEFAULT_COMMIT_EVERY
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._uncommitted = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS geocode ('
+            'search_key TEXT PRIMARY KEY, '
+            'response TEXT NOT NULL, '
+            'created_at REAL NOT NULL, '
+            'accessed_at REAL NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS geocode_accessed_at '
+            'ON geocode (accessed_at)'
+        )
+        self._connection.commit()
+
+    def get(self, search_string: str) -> Optional[Any]:
+        '''Return the cached geocoder response for a search string, or
+        ``None`` if it is missing or expired.
+        '''
+        key = normalise_search_string(search_string)
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT response, created_at FROM geocode '
+                'WHERE search_key = ?',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at = json.loads(row[0]), row[1]
+            ttl = self.ttl if response else min(self.ttl, self.negative_ttl)
+            if now - created_at > ttl:
+                self.expired += 1
+                return None
+
+            self._connection.execute(
+                'UPDATE geocode SET accessed_at = ? WHERE search_key = ?',
+                (now, key)
+            )
+            self.hits += 1
+
+        return response
+
+    def set(self, search_string: str, response: Any):
+        '''Store the geocoder response for a search string.'''
+        key = normalise_search_string(search_string)
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO geocode '
+                '(search_key, response, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(response), now, now)
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._connection.commit()
+                self._uncommitted = 0
+
+    def evict(self) -> int:
+        '''Drop the least recently used entries above ``max_entries``.
+
+        :return: Number of evicted entries
+        :rtype: int
+        '''
+        with self._lock:
+            cursor = self._connection.execute(
+                'DELETE FROM geocode WHERE search_key IN ('
+                'SELECT search_key FROM geocode ORDER BY accessed_at DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self._connection.commit()
+            self._uncommitted = 0
+
+        if cursor.rowcount > 0:
+            logger.info('Evicted %d geocode cache entries', cursor.rowcount)
+
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM geocode'
+            ).fetchone()[0]
+
+    def log_stats(self):
+        '''Log hit/miss/expired counts since the cache was opened.'''
+        lookups = self.hits + self.misses + self.expired
+        logger.info(
+            'Geocode cache: %d hits, %d misses, %d expired (%.1f%% hit rate '
+            'over %d lookups)',
+            self.hits, self.misses, self.expired,
+            100 * self.hits / lookups if lookups else 0.0, lookups
+        )
+
+    def close(self):
+        '''Commit pending writes, apply size-based eviction and close the
+        database.
+        '''
+        with self._lock:
+            self._connection.commit()
+            self._uncommitted = 0
+        self.evict()
+        self._connection.close()
+
+    def __enter__(self) -> 'GeocodeCache':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
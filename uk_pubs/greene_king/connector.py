@@ -1,14 +1,24 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date
+from typing import Any, Callable, Dict, Iterator, Optional
+import asyncio
 import logging
+import math
 import re
+import threading
 
 import pandas
-import requests
 
 import lxml.html
 import html
 
-from uk_pubs.utils import mount_html_elements
+from uk_pubs.batches import concat_batches
+from uk_pubs.checkpoint import PageCheckpoint
+from uk_pubs.ratelimit import TokenBucket
+from uk_pubs.schema import apply_schema
+from uk_pubs.transport import HttpTransport, get_default_transport
+from uk_pubs.utils import compile_structure
 from uk_pubs.greene_king.constants import BASE_URL, NAME
 
 
@@ -23,13 +33,39 @@ class GreeneKingAjaxConnector:
         'page': 0,
         'view_display_id': 'search_results',
     }
+    RAW_SCHEMA = {
+        'Name': 'string',
+        'URL': 'string',
+        'StreetAddress': 'string',
+        'AnnualRent': 'float64',
+        'Lat': 'float64',
+        'Long': 'float64',
+        'ScrapeDate': 'string',
+        'Source': 'string',
+    }
+
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        '''Create the connector.
+
+        :param transport: HTTP transport used to reach the source. Defaults
+            to the transport shared by all connectors
+        :type transport: HttpTransport, optional
+        '''
+        self.transport = transport or get_default_transport()
 
     def get_page(self, page_number: int = 0) -> pandas.DataFrame:
-        '''TODO: Doc'''
+        '''Get a page of the pub search results from the Ajax view.
+
+        :param page_number: Number of the page, starting from 0
+        :type page_number: int
+        :return: Pubs of the page, with the ``RAW_SCHEMA`` columns but the
+            ``ScrapeDate`` and ``Source``. Empty past the last page
+        :rtype: pandas.DataFrame
+        '''
         payload = self.PAYLOAD_TEMPLATE.copy()
         payload.update({'page': page_number})
 
-        response = requests.post(self.URL, data=payload).json()
+        response = self.transport.post(self.URL, data=payload).json()
 
         json_data = response[0]['settings'].get('geofield_google_map', {})
 
@@ -61,21 +97,246 @@ class GreeneKingAjaxConnector:
 
         return page_data
 
-    def get(self) -> pandas.DataFrame:
-        '''TODO: Doc'''
-        data = []
-        page_number = 0
+    def iter_batches(
+        self,
+        max_in_flight: Optional[int] = None,
+        checkpoint: Optional[PageCheckpoint] = None
+    ) -> Iterator[pandas.DataFrame]:
+        '''Get the pages of the pub search results as they arrive, until the
+        first empty page, typed as the ``RAW_SCHEMA``.
 
-        while len(page_data := self.get_page(page_number)) != 0:
-            data.append(page_data)
+        :param max_in_flight: Maximum number of page requests sent
+            concurrently, ahead of the page being yielded. If not given, pages
+            are requested one at a time
+        :type max_in_flight: int, optional
+        :param checkpoint: Checkpoint where each page is recorded as soon as
+            it is fetched. Pages already in it are not requested again, and
+            it is cleared once every page was fetched
+        :type checkpoint: PageCheckpoint, optional
+        :return: Iterator over the non-empty pages
+        :rtype: Iterator[pandas.DataFrame]
+        '''
+        get_page = self.get_page if checkpoint is None \
+            else checkpoint.wrap(self.get_page)
+        scrape_date = str(date.today())
 
-            page_number += 1
+        if max_in_flight:
+            pages = iter_pages_probing(get_page, max_in_flight)
+        else:
+            pages = iter_pages(get_page)
 
-        data = pandas.concat(data, ignore_index=True)
-        data['ScrapeDate'] = str(date.today())
-        data['Source'] = NAME
+        for page_data in pages:
+            page_data['ScrapeDate'] = scrape_date
+            page_data['Source'] = NAME
 
-        return data
+            yield apply_schema(page_data, self.RAW_SCHEMA)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+    def get(
+        self,
+        max_in_flight: Optional[int] = None,
+        checkpoint: Optional[PageCheckpoint] = None
+    ) -> pandas.DataFrame:
+        '''Get all the pages of the pub search results (see
+        ``iter_batches``).
+        '''
+        return concat_batches(self.iter_batches(max_in_flight, checkpoint))
+
+
+def iter_pages(
+    get_page: Callable[[int], pandas.DataFrame]
+) -> Iterator[pandas.DataFrame]:
+    '''Get pages 0, 1, 2, ... one at a time, until the first empty one.'''
+    page_number = 0
+
+    while len(page_data := get_page(page_number)) != 0:
+        yield page_data
+
+        page_number += 1
+
+
+def iter_pages_probing(
+    get_page: Callable[[int], pandas.DataFrame],
+    max_in_flight: int,
+    prefetch: Optional[int] = None
+) -> Iterator[pandas.DataFrame]:
+    '''Get pages 0, 1, 2, ... in order, until the first empty one, with up
+    to ``max_in_flight`` requests in flight.
+
+    An asyncio task finds the last page by probing pages 1, 2, 4, 8, ...
+    until an empty one, then binary searching for the first empty page.
+    Pages below a page known to be non-empty are requested as soon as they
+    are known to exist, up to ``prefetch`` pages ahead of the page being
+    yielded, so the probes overlap with the download and the crawl takes
+    about as long as its slowest requests rather than the sum of them.
+
+    :param get_page: Function getting a page
+    :type get_page: Callable[[int], pandas.DataFrame]
+    :param max_in_flight: Maximum number of pages requested concurrently
+    :type max_in_flight: int
+    :param prefetch: Maximum number of pages downloaded ahead of the page
+        being yielded (the probes excepted), to bound memory. Defaults to
+        ``4 * max_in_flight``
+    :type prefetch: int, optional
+    :return: Iterator over the non-empty pages
+    :rtype: Iterator[pandas.DataFrame]
+    '''
+    prefetch = prefetch or 4 * max_in_flight
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_in_flight)
+    pages: Dict[int, asyncio.Future] = {}
+    # Every page up to last_full is known to be non-empty
+    last_full = 0
+    next_page = 0
+
+    def fetch(page_number: int) -> asyncio.Future:
+        if page_number not in pages:
+            pages[page_number] = loop.run_in_executor(
+                executor, get_page, page_number
+            )
+        return pages[page_number]
+
+    def schedule():
+        for page_number in range(
+            next_page, min(last_full + 1, next_page + prefetch)
+        ):
+            fetch(page_number)
+
+    async def is_empty(page_number: int) -> bool:
+        nonlocal last_full
+
+        if page_number < next_page:
+            # Already yielded
+            return False
+
+        empty = len(await fetch(page_number)) == 0
+        if not empty and page_number > last_full:
+            last_full = page_number
+            schedule()
+
+        return empty
+
+    async def find_last_page() -> int:
+        if await is_empty(0):
+            return 0
+
+        # Exponential probing: not_empty < first_empty
+        not_empty, first_empty = 0, 1
+        while not await is_empty(first_empty):
+            not_empty, first_empty = first_empty, first_empty * 2
+
+        # Binary search for the first empty page
+        while first_empty - not_empty > 1:
+            middle = (not_empty + first_empty) // 2
+            if await is_empty(middle):
+                first_empty = middle
+            else:
+                not_empty = middle
+
+        logger.info('Found %d pages', first_empty)
+
+        return first_empty
+
+    probe = loop.create_task(find_last_page())
+    try:
+        while True:
+            page_data = loop.run_until_complete(fetch(next_page))
+            if len(page_data) == 0:
+                break
+
+            # Yielded pages are not kept
+            del pages[next_page]
+            next_page += 1
+            last_full = max(last_full, next_page - 1)
+            schedule()
+
+            yield page_data
+    finally:
+        probe.cancel()
+        for future in pages.values():
+            future.cancel()
+        loop.run_until_complete(asyncio.gather(
+            probe, *pages.values(), return_exceptions=True
+        ))
+        executor.shutdown(wait=True)
+        loop.close()
+
+
+def iter_pages_pipelined(
+    fetch_page: Callable[[int], Any],
+    parse_page: Callable[[int, Any], pandas.DataFrame],
+    max_in_flight: int,
+    parse_workers: int = 1
+) -> Iterator[pandas.DataFrame]:
+    '''Get pages 0, 1, 2, ... in order, until the first empty one, fetching
+    ``max_in_flight`` pages ahead of the page being yielded while
+    ``parse_workers`` other threads parse the pages already fetched.
+
+    Pages are fetched and parsed in any order, but yielded in order, and the
+    crawl stops at the first empty page in page order, wherever it was
+    parsed. Once a page is known to be empty, the pages after it are not
+    fetched anymore.
+
+    :param fetch_page: Function getting the content of a page
+    :type fetch_page: Callable[[int], Any]
+    :param parse_page: Function parsing the content of a page, given its
+        number and content
+    :type parse_page: Callable[[int, Any], pandas.DataFrame]
+    :param max_in_flight: Maximum number of pages fetched concurrently
+    :type max_in_flight: int
+    :param parse_workers: Number of threads parsing the pages
+    :type parse_workers: int
+    :return: Iterator over the non-empty pages
+    :rtype: Iterator[pandas.DataFrame]
+    '''
+    # Smallest page found empty so far
+    last_page = math.inf
+    lock = threading.Lock()
+
+    def parse(page_number: int, content: Any) -> pandas.DataFrame:
+        nonlocal last_page
+
+        page_data = parse_page(page_number, content)
+        if len(page_data) == 0:
+            with lock:
+                last_page = min(last_page, page_number)
+
+        return page_data
+
+    def fetch(page_number: int) -> Future:
+        # Fetches the page and hands it over to the parsers, so the fetcher
+        # moves on to another page while it is parsed
+        if page_number > last_page:
+            skipped = Future()
+            skipped.set_result(pandas.DataFrame())
+            return skipped
+
+        return parsers.submit(parse, page_number, fetch_page(page_number))
+
+    # The fetchers are shut down first, as they submit to the parsers
+    with ThreadPoolExecutor(parse_workers) as parsers, \
+            ThreadPoolExecutor(max_in_flight) as fetchers:
+        window = deque(
+            fetchers.submit(fetch, page_number)
+            for page_number in range(max_in_flight)
+        )
+        next_page = max_in_flight
+
+        try:
+            while window:
+                page_data = window.popleft().result().result()
+                if len(page_data) == 0:
+                    break
+
+                window.append(fetchers.submit(fetch, next_page))
+                next_page += 1
+
+                yield page_data
+        finally:
+            for future in window:
+                future.cancel()
 
 
 class GreeneKingWebsiteConnector:
@@ -93,34 +354,147 @@ class GreeneKingWebsiteConnector:
             }
         ]
     }
+    RAW_SCHEMA = {
+        'Name': 'string',
+        'URL': 'string',
+        'StreetAddress': 'string',
+        'Description': 'string',
+        'ScrapeDate': 'string',
+        'Source': 'string',
+    }
+
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        '''Create the connector.
+
+        :param transport: HTTP transport used to reach the source. Defaults
+            to the transport shared by all connectors
+        :type transport: HttpTransport, optional
+        '''
+        self.transport = transport or get_default_transport()
+
+    def fetch_page(self, page_number: int = 0) -> str:
+        '''Download specific page of the pubs search results.
+
+        :param page_number: Number of the page to get (defaults to 0)
+        :type page_number: int, optional
+        :return: HTML of the page
+        :rtype: str
+        '''
+        response = self.transport.get(
+            self.URL.format(page_number=page_number)
+        )
+
+        return response.text
+
+    def parse_page(self, text: str) -> pandas.DataFrame:
+        '''Extract the pubs of a page of the pubs search results.
+
+        :param text: HTML of the page
+        :type text: str
+        :return: DataFrame with the fields of the ``STRUCTURE``'s pubs
+        :rtype: pandas.DataFrame
+        '''
+        dom = lxml.html.fromstring(text)
+        page_elements = compile_structure(self.STRUCTURE).columns(dom)
+        data = pandas.DataFrame(page_elements['Pubs'])
+
+        return data
 
     def get_page(self, page_number: int = 0) -> pandas.DataFrame:
         '''Get specific page of the pubs search results.
 
         :param page_number: Number of the page to get (defaults to 0)
         :type page_number: int, optional
-        :return: DataFrame with the fields
-            - TODO
+        :return: DataFrame with the fields of the ``STRUCTURE``'s pubs
         :rtype: pandas.DataFrame
         '''
-        response = requests.get(self.URL.format(page_number=page_number))
-        dom = lxml.html.fromstring(response.text)
-        page_elements = mount_html_elements(dom, self.STRUCTURE)
-        data = pandas.DataFrame(page_elements['Pubs']).applymap(', '.join)
+        return self.parse_page(self.fetch_page(page_number))
 
-        return data
+    def iter_batches(
+        self,
+        max_in_flight: Optional[int] = None,
+        parse_workers: int = 1,
+        politeness_delay: float = 0,
+        checkpoint: Optional[PageCheckpoint] = None
+    ) -> Iterator[pandas.DataFrame]:
+        '''Get the pages of the pub search results as they arrive, until the
+        first empty page, typed as the ``RAW_SCHEMA``.
+
+        :param max_in_flight: Maximum number of pages downloaded
+            concurrently, while other pages are parsed (see
+            ``iter_pages_pipelined``). If not given, pages are downloaded and
+            parsed one at a time
+        :type max_in_flight: int, optional
+        :param parse_workers: Number of threads parsing the pages, when
+            pages are downloaded concurrently
+        :type parse_workers: int
+        :param politeness_delay: Minimum time between two requests to the
+            website, in seconds
+        :type politeness_delay: float
+        :param checkpoint: Checkpoint where each page is recorded as soon as
+            it is fetched (see ``GreeneKingAjaxConnector.iter_batches``)
+        :type checkpoint: PageCheckpoint, optional
+        :return: Iterator over the non-empty pages
+        :rtype: Iterator[pandas.DataFrame]
+        '''
+        bucket = None
+        if politeness_delay > 0:
+            bucket = TokenBucket(1 / politeness_delay, burst=1)
 
-    def get(self) -> pandas.DataFrame:
-        data = []
-        page_number = 0
+        def fetch_page(page_number: int) -> Optional[str]:
+            if checkpoint is not None and page_number in checkpoint:
+                return None
+            if bucket is not None:
+                bucket.acquire()
 
-        while not (page_data := self.get_page(page_number)).empty:
+            return self.fetch_page(page_number)
+
+        def parse_page(
+            page_number: int,
+            text: Optional[str]
+        ) -> pandas.DataFrame:
+            if text is None:
+                return checkpoint.load(page_number)
+
+            page_data = self.parse_page(text)
+            if checkpoint is not None:
+                checkpoint.save(page_number, page_data)
+
+            return page_data
+
+        if max_in_flight:
+            pages = iter_pages_pipelined(
+                fetch_page, parse_page, max_in_flight, parse_workers
+            )
+        else:
+            pages = iter_pages(
+                lambda page_number: parse_page(
+                    page_number, fetch_page(page_number)
+                )
+            )
+        scrape_date = str(date.today())
+
+        for page_number, page_data in enumerate(pages):
             logger.info('Got %d pubs on page %d', len(page_data), page_number)
-            data.append(page_data)
-            page_number += 1
 
-        data = pandas.concat(data, ignore_index=True)
-        data['ScrapeDate'] = str(date.today())
-        data['Source'] = NAME
+            page_data['ScrapeDate'] = scrape_date
+            page_data['Source'] = NAME
 
-        return data
+            yield apply_schema(page_data, self.RAW_SCHEMA)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+    def get(
+        self,
+        max_in_flight: Optional[int] = None,
+        parse_workers: int = 1,
+        politeness_delay: float = 0,
+        checkpoint: Optional[PageCheckpoint] = None
+    ) -> pandas.DataFrame:
+        '''Get all the pages of the pub search results (see
+        ``iter_batches``).
+        '''
+        return concat_batches(self.iter_batches(
+            max_in_flight, parse_workers, politeness_delay, checkpoint
+        ))
@@ -1,6 +1,7 @@
 import pandas
 
 from uk_pubs.greene_king.constants import BASE_URL
+from uk_pubs.schema import conform
 
 
 class GreeneKingDataProcessor:
@@ -17,4 +18,4 @@ class GreeneKingDataProcessor:
         output = input.copy()
         output['URL'] = BASE_URL + output['URL']
 
-        return output
+        return conform(output)
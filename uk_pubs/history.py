@@ -0,0 +1,218 @@
+from datetime import date
+from typing import Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+import functools
+import logging
+import operator
+import os
+
+import pandas
+import pyarrow
+import pyarrow.dataset
+import pyarrow.parquet
+
+from uk_pubs.schema import PUB_SCHEMA, conform
+from uk_pubs.storage import StageStorage
+
+
+logger = logging.getLogger(__name__)
+
+# Arrow types of the ``PUB_SCHEMA`` types. Categories are saved as text,
+# which Parquet dictionary-encodes anyway
+ARROW_TYPES = {
+    'string': pyarrow.string(),
+    'category': pyarrow.string(),
+    'float64': pyarrow.float64(),
+    'float32': pyarrow.float32(),
+    'datetime64[ns]': pyarrow.date32(),
+}
+
+
+class HistoryStore:
+    '''History of the pubs of every run, as a Parquet dataset partitioned by
+    source and day (e.g. ``<directory>/Source=Stonegate/ScrapeDate=
+    2021-09-01/part-0.parquet``).
+
+    Queries only read the partitions of the requested sources and days, and
+    the row groups and columns they need: the pubs of each partition are
+    sorted by latitude, so bounding box queries skip the row groups out of
+    range.
+
+    :param directory: Directory of the dataset
+    :type directory: str
+    '''
+    PARTITIONS = ['Source', 'ScrapeDate']
+    FILENAME = 'part-0.parquet'
+    COMPRESSION = 'zstd'
+    ROW_GROUP_SIZE = 1024
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.schema = pyarrow.schema([
+            (column, ARROW_TYPES[dtype])
+            for column, dtype in PUB_SCHEMA.items()
+            if column not in self.PARTITIONS
+        ])
+        self.partitioning = pyarrow.dataset.partitioning(
+            pyarrow.schema([
+                ('Source', pyarrow.string()),
+                ('ScrapeDate', pyarrow.date32()),
+            ]),
+            flavor='hive'
+        )
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _source_directory(self, source: str) -> str:
+        return os.path.join(
+            self.directory, 'Source=%s' % quote(source, safe='')
+        )
+
+    def path(self, source: str, day: Union[date, str]) -> str:
+        '''Return the path of the partition of a source and day.'''
+        return os.path.join(
+            self._source_directory(source),
+            'ScrapeDate=%s' % day,
+            self.FILENAME
+        )
+
+    def append(self, data: pandas.DataFrame, day: Union[date, str]) -> int:
+        '''Save the pubs of a run, replacing the partitions of their sources
+        for that day if they were already saved.
+
+        :param data: Pubs with a ``Source`` column, such as the output of the
+            geo stage. Columns missing from ``PUB_SCHEMA`` are not saved
+        :type data: pandas.DataFrame
+        :param day: Day of the run
+        :type day: date or str
+        :return: Number of pubs saved
+        :rtype: int
+        '''
+        data = data.reindex(columns=[*self.schema.names, 'Source'])\
+            .astype({'Source': 'string'})
+
+        for source, pubs in data.groupby('Source', sort=False):
+            pubs = pubs.drop(columns='Source').sort_values('Lat')
+            filepath = self.path(source, day)
+            directory = os.path.dirname(filepath)
+            # Hidden until complete, as the dataset skips hidden files
+            partial_path = os.path.join(directory, '.' + self.FILENAME)
+            os.makedirs(directory, exist_ok=True)
+
+            pyarrow.parquet.write_table(
+                pyarrow.Table.from_pandas(
+                    pubs, schema=self.schema, preserve_index=False
+                ),
+                partial_path,
+                compression=self.COMPRESSION,
+                row_group_size=self.ROW_GROUP_SIZE
+            )
+            os.replace(partial_path, filepath)
+
+            logger.info(
+                'Saved %d pubs of %s to the history of %s',
+                len(pubs), source, day
+            )
+
+        return int(data['Source'].notna().sum())
+
+    def backfill(self, storage: StageStorage, stage: str = 'geo') -> int:
+        '''Append every day saved by a stage to the history.
+
+        :param storage: Storage of the stage
+        :type storage: StageStorage
+        :param stage: Stage with the pubs, such as ``geo`` or ``matched``
+        :type stage: str
+        :return: Number of pubs saved
+        :rtype: int
+        '''
+        return sum(
+            self.append(storage.load(day, stage), day)
+            for day in storage.days(stage)
+        )
+
+    def days(self, source: str) -> List[str]:
+        '''Return the days saved for a source, oldest first.'''
+        directory = self._source_directory(source)
+        if not os.path.isdir(directory):
+            return []
+
+        return sorted(
+            name.split('=', 1)[1] for name in os.listdir(directory)
+            if name.startswith('ScrapeDate=')
+        )
+
+    def dataset(self) -> pyarrow.dataset.Dataset:
+        '''Return the dataset of the whole history.'''
+        return pyarrow.dataset.dataset(
+            self.directory,
+            schema=pyarrow.unify_schemas([
+                self.schema, self.partitioning.schema
+            ]),
+            format='parquet',
+            partitioning=self.partitioning
+        )
+
+    def query(
+        self,
+        pubs: Optional[Iterable[str]] = None,
+        sources: Optional[Iterable[str]] = None,
+        start: Optional[Union[date, str]] = None,
+        end: Optional[Union[date, str]] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        columns: Optional[List[str]] = None
+    ) -> pandas.DataFrame:
+        '''Read the pubs matching every given filter.
+
+        :param pubs: Keys of the pubs (see ``uk_pubs.cdc.pub_keys``)
+        :type pubs: Iterable[str], optional
+        :param sources: Names of the sources
+        :type sources: Iterable[str], optional
+        :param start: First day, included
+        :type start: date or str, optional
+        :param end: Last day, included
+        :type end: date or str, optional
+        :param bbox: Bounding box of the pubs, as ``(min_lat, min_long,
+            max_lat, max_long)``
+        :type bbox: Tuple[float, float, float, float], optional
+        :param columns: Columns read. Defaults to all of them
+        :type columns: List[str], optional
+        :return: The pubs, with the ``PUB_SCHEMA`` types, ordered by day
+        :rtype: pandas.DataFrame
+        '''
+        field = pyarrow.dataset.field
+        filters = []
+
+        if pubs is not None:
+            filters.append(field('PubKey').isin(list(pubs)))
+        if sources is not None:
+            filters.append(field('Source').isin(list(sources)))
+        if start is not None:
+            filters.append(field('ScrapeDate') >= _date_scalar(start))
+        if end is not None:
+            filters.append(field('ScrapeDate') <= _date_scalar(end))
+        if bbox is not None:
+            min_lat, min_long, max_lat, max_long = bbox
+            filters += [
+                field('Lat') >= min_lat,
+                field('Lat') <= max_lat,
+                field('Long') >= min_long,
+                field('Long') <= max_long,
+            ]
+
+        table = self.dataset().to_table(
+            columns=columns,
+            filter=functools.reduce(operator.and_, filters) if filters
+            else None
+        )
+
+        data = table.to_pandas(date_as_object=False)
+        if 'ScrapeDate' in data.columns:
+            data = data.sort_values('ScrapeDate', kind='stable')\
+                .reset_index(drop=True)
+
+        return conform(data)
+
+
+def _date_scalar(day: Union[date, str]) -> pyarrow.Scalar:
+    return pyarrow.scalar(date.fromisoformat(str(day)), pyarrow.date32())
@@ -0,0 +1,215 @@
+from typing import Dict, Optional, Union
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from requests.structures import CaseInsensitiveDict
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    '''On-disk cache of HTTP response bodies and their validators.
+
+    Each response is stored as a gzip-compressed body plus a small JSON file
+    with its ``ETag``/``Last-Modified`` headers. Later requests for the same
+    method, URL and body are sent as conditional requests, and a
+    ``304 Not Modified`` answer is served from the stored body.
+
+    Responses not used for ``max_age`` seconds, and the least recently used
+    ones above ``max_entries``, are dropped when the cache is opened.
+
+    :param directory: Directory where the cached responses are kept
+    :type directory: str
+    :param max_age: Seconds after which an unused response is dropped
+    :type max_age: float
+    :param max_entries: Maximum number of responses kept
+    :type max_entries: int
+    '''
+    STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+    DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+    DEFAULT_MAX_ENTRIES = 1000
+
+    def __init__(
+        self,
+        directory: str,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.bytes_transferred = 0
+        self.bytes_from_cache = 0
+        self.revalidated = 0
+        self.downloaded = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    @staticmethod
+    def key(
+        method: str,
+        url: str,
+        body: Optional[Union[bytes, str]] = None
+    ) -> str:
+        '''Return the cache key of a request.'''
+        if isinstance(body, str):
+            body = body.encode()
+
+        digest = hashlib.sha1(method.upper().encode() + b' ' + url.encode())
+        digest.update(body or b'')
+
+        return digest.hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body.gz'
+
+    def _load_metadata(self, key: str) -> Optional[dict]:
+        metadata_path, body_path = self._paths(key)
+        if not (os.path.exists(metadata_path) and os.path.exists(body_path)):
+            return None
+
+        with open(metadata_path) as file:
+            return json.load(file)
+
+    def prune(self) -> int:
+        '''Drop the responses not used for ``max_age`` seconds, and the least
+        recently used ones above ``max_entries``.
+
+        :return: Number of dropped responses
+        :rtype: int
+        '''
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                used_at = os.path.getmtime(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((used_at, name[:-len('.json')]))
+
+        entries.sort(reverse=True)
+        dropped = [
+            key for index, (used_at, key) in enumerate(entries)
+            if index >= self.max_entries or now - used_at > self.max_age
+        ]
+        for key in dropped:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        if dropped:
+            logger.info('Dropped %d cached responses', len(dropped))
+
+        return len(dropped)
+
+    def validators(self, key: str) -> Dict[str, str]:
+        '''Return the conditional request headers for a cached response.'''
+        metadata = self._load_metadata(key)
+        if metadata is None:
+            return {}
+
+        headers = {}
+        if 'ETag' in metadata['headers']:
+            headers['If-None-Match'] = metadata['headers']['ETag']
+        if 'Last-Modified' in metadata['headers']:
+            headers['If-Modified-Since'] = metadata['headers']['Last-Modified']
+
+        return headers
+
+    def store(self, key: str, response: requests.Response):
+        '''Store a successful response if it carries any validator.'''
+        headers = {
+            name: response.headers[name]
+            for name in self.STORED_HEADERS if name in response.headers
+        }
+        self._count_download(response)
+
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return
+
+        metadata_path, body_path = self._paths(key)
+        with gzip.open(body_path + '.tmp', 'wb') as file:
+            file.write(response.content)
+        with open(metadata_path + '.tmp', 'w') as file:
+            json.dump({
+                'url': response.url,
+                'encoding': response.encoding,
+                'headers': headers,
+            }, file)
+
+        os.replace(body_path + '.tmp', body_path)
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+    def replay(
+        self,
+        key: str,
+        response: requests.Response
+    ) -> requests.Response:
+        '''Turn a ``304 Not Modified`` response into a ``200`` response with
+        the cached body.
+        '''
+        metadata = self._load_metadata(key)
+        metadata_path, body_path = self._paths(key)
+        with gzip.open(body_path, 'rb') as file:
+            content = file.read()
+        # Last use, for pruning
+        os.utime(metadata_path)
+
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.reason = 'OK'
+        cached._content = content
+        cached.headers = CaseInsensitiveDict(metadata['headers'])
+        cached.encoding = metadata['encoding']
+        cached.url = response.url
+        cached.request = response.request
+        cached.from_cache = True
+
+        with self._lock:
+            self.revalidated += 1
+            self.bytes_transferred += self._wire_size(response)
+            self.bytes_from_cache += len(content)
+
+        logger.info('%s not modified, served from cache', response.url)
+
+        return cached
+
+    def _count_download(self, response: requests.Response):
+        with self._lock:
+            self.downloaded += 1
+            self.bytes_transferred += self._wire_size(response)
+
+    @staticmethod
+    def _wire_size(response: requests.Response) -> int:
+        '''Bytes read from the socket for a response body (before content
+        decoding, when urllib3 exposes it).
+        '''
+        try:
+            size = response.raw.tell()
+        except AttributeError:
+            size = 0
+
+        return size or len(response.content)
+
+    def log_stats(self):
+        '''Log bytes transferred versus bytes served from cache.'''
+        logger.info(
+            'HTTP cache: %d responses downloaded, %d revalidated (304); '
+            '%d bytes transferred, %d bytes served from cache',
+            self.downloaded, self.revalidated,
+            self.bytes_transferred, self.bytes_from_cache
+        )
@@ -0,0 +1,245 @@
+from typing import Tuple
+import hashlib
+import logging
+import re
+import zlib
+
+import numpy
+import pandas
+
+from uk_pubs.cdc import pub_keys
+from uk_pubs.spatial import GridIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+# Words left out of the names compared, as sources add or drop them at will
+NAME_STOPWORDS = {'the', 'and', 'pub', 'inn', 'hotel', 'bar'}
+# 64-bit words of the trigram signature of each name
+SIGNATURE_WORDS = 2
+
+POSTCODE_PATTERN = re.compile(r'^([A-Z]{1,2}\d[A-Z\d]?)(\d)[A-Z]{2}$')
+
+
+def normalise_names(names: pandas.Series) -> pandas.Series:
+    '''Lowercase names, without punctuation nor ``NAME_STOPWORDS``.'''
+    words = names.astype('string').fillna('').str.lower()\
+        .str.replace('&', ' and ', regex=False)\
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)\
+        .str.split()
+
+    return words.map(
+        lambda name: ' '.join(
+            word for word in name if word not in NAME_STOPWORDS
+        )
+    )
+
+
+def postcode_sectors(postcodes: pandas.Series) -> pandas.Series:
+    '''Postcode sector (e.g. ``"SW1A 1"``) of each UK postcode.'''
+    parts = postcodes.astype('string').str.upper()\
+        .str.replace(r'\s+', '', regex=True)\
+        .str.extract(POSTCODE_PATTERN)
+
+    return parts[0] + ' ' + parts[1]
+
+
+def name_signatures(names: pandas.Series) -> numpy.ndarray:
+    '''Hash the character trigrams of each name into a bit set.
+
+    The Jaccard similarity of two names' trigrams is then estimated from the
+    population counts of the intersection and union of their bit sets.
+
+    :param names: Normalised names (see ``normalise_names``)
+    :type names: pandas.Series
+    :return: Array of shape ``(len(names), SIGNATURE_WORDS)``
+    :rtype: numpy.ndarray
+    '''
+    size = 64 * SIGNATURE_WORDS
+    codes, uniques = pandas.factorize(names)
+    signatures = numpy.zeros((len(uniques) + 1, SIGNATURE_WORDS), 'uint64')
+
+    for row, name in enumerate(uniques):
+        padded = ' %s ' % name
+        bits = {
+            zlib.crc32(padded[start:start + 3].encode()) % size
+            for start in range(len(padded) - 2)
+        }
+        for bit in bits:
+            signatures[row, bit // 64] |= numpy.uint64(1) << numpy.uint64(
+                bit % 64
+            )
+
+    # Missing names (code -1) take the last, empty, signature
+    return signatures[codes]
+
+
+def _popcount(values: numpy.ndarray) -> numpy.ndarray:
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(values).sum(axis=-1)
+
+    # numpy < 2.0
+    bytes_ = values.view('uint8').reshape(values.shape[:-1] + (-1,))
+    return numpy.unpackbits(bytes_, axis=-1).sum(axis=-1)
+
+
+def similarity(
+    signatures: numpy.ndarray,
+    left: numpy.ndarray,
+    right: numpy.ndarray
+) -> numpy.ndarray:
+    '''Estimated Jaccard similarity of the names of pairs of pubs.'''
+    left, right = signatures[left], signatures[right]
+    union = _popcount(left | right)
+
+    return numpy.where(
+        union > 0, _popcount(left & right) / numpy.maximum(union, 1), 0
+    )
+
+
+def _pairs_within_groups(
+    groups: pandas.Series
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # Every pair of positions sharing a (non missing) group
+    codes, _ = pandas.factorize(groups)
+    positions = numpy.flatnonzero(codes >= 0)
+    positions = positions[numpy.argsort(codes[positions], kind='stable')]
+    codes = codes[positions]
+
+    starts = numpy.flatnonzero(numpy.diff(codes, prepend=-1))
+    sizes = numpy.diff(starts, append=len(codes))
+    # Number of pairs of each position with the next ones of its group
+    ranks = numpy.arange(len(codes)) - numpy.repeat(starts, sizes)
+    following = numpy.repeat(sizes, sizes) - ranks - 1
+
+    left = numpy.repeat(numpy.arange(len(codes)), following)
+    offsets = numpy.arange(following.sum()) \
+        - numpy.repeat(numpy.cumsum(following) - following, following)
+    right = left + 1 + offsets
+
+    return positions[left], positions[right]
+
+
+def _pairs_within_distance(
+    lat: numpy.ndarray,
+    lng: numpy.ndarray,
+    max_distance: float
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    positions = numpy.flatnonzero(~(numpy.isnan(lat) | numpy.isnan(lng)))
+    if len(positions) == 0:
+        return positions, positions
+
+    index = GridIndex(lat[positions], lng[positions], max_distance)
+
+    x, y = index.project(lat[positions], lng[positions])
+    queries, points = index.candidates(x, y, 1)
+    near = (x[queries] - index.x[points]) ** 2 \
+        + (y[queries] - index.y[points]) ** 2 <= max_distance ** 2
+    points = index.order[points]
+    keep = near & (queries < points)
+
+    return positions[queries[keep]], positions[points[keep]]
+
+
+def cluster(
+    size: int,
+    left: numpy.ndarray,
+    right: numpy.ndarray
+) -> numpy.ndarray:
+    '''Connected components of a graph, by label propagation.
+
+    :return: Label of each node: the smallest node of its component
+    :rtype: numpy.ndarray
+    '''
+    labels = numpy.arange(size)
+
+    while True:
+        updated = labels.copy()
+        numpy.minimum.at(updated, left, labels[right])
+        numpy.minimum.at(updated, right, labels[left])
+        # Pointer jumping: follow the labels of the labels
+        updated = updated[updated]
+
+        if numpy.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def resolve_pubs(
+    data: pandas.DataFrame,
+    max_distance: float = 0.2,
+    threshold: float = 0.5,
+    cross_source_only: bool = True
+) -> pandas.DataFrame:
+    '''Find the records of the same pub across sources.
+
+    Candidate pairs are the pubs in the same postcode sector and the pubs
+    less than ``max_distance`` apart (blocking), so the number of comparisons
+    grows about linearly with the number of pubs. Candidates whose names are
+    similar enough are matched, and matches are clustered transitively.
+
+    :param data: Pubs with ``Name``, ``Source``, ``PostalCode``, ``Lat`` and
+        ``Long`` columns, and optionally a ``PubKey`` column
+    :type data: pandas.DataFrame
+    :param max_distance: Maximum distance between the coordinates of two
+        candidates, in km
+    :type max_distance: float
+    :param threshold: Minimum similarity of the names of matched pubs
+    :type threshold: float
+    :param cross_source_only: Match only pubs of different sources
+    :type cross_source_only: bool
+    :return: Data with a ``PubId`` column, the same for all the records of a
+        pub
+    :rtype: pandas.DataFrame
+    '''
+    data = data.copy()
+    keys = data['PubKey'] if 'PubKey' in data.columns else pub_keys(data)
+    keys = keys.fillna('').to_numpy(dtype=object)
+
+    pairs = [
+        _pairs_within_groups(postcode_sectors(data['PostalCode'])),
+        _pairs_within_distance(
+            data['Lat'].to_numpy(dtype='float64', na_value=numpy.nan),
+            data['Long'].to_numpy(dtype='float64', na_value=numpy.nan),
+            max_distance
+        ),
+    ]
+    left = numpy.concatenate([pair[0] for pair in pairs])
+    right = numpy.concatenate([pair[1] for pair in pairs])
+    # The same pair may come from both blocks
+    unique = numpy.unique(
+        numpy.minimum(left, right) * len(data) + numpy.maximum(left, right)
+    )
+    left, right = unique // max(len(data), 1), unique % max(len(data), 1)
+
+    if cross_source_only:
+        sources = data['Source'].to_numpy(dtype=object)
+        different = sources[left] != sources[right]
+        left, right = left[different], right[different]
+
+    signatures = name_signatures(normalise_names(data['Name']))
+    matched = similarity(signatures, left, right) >= threshold
+    labels = cluster(len(data), left[matched], right[matched])
+
+    # The id of a cluster is derived from its smallest key, so it stays the
+    # same as long as that record does
+    key_ranks, sorted_keys = pandas.factorize(keys, sort=True)
+    smallest = numpy.full(len(data), len(sorted_keys))
+    numpy.minimum.at(smallest, labels, key_ranks)
+    cluster_ranks = smallest[labels]
+
+    ids = numpy.array([
+        hashlib.sha1(str(key).encode()).hexdigest()[:16]
+        for key in sorted_keys
+    ], dtype=object)
+    data['PubId'] = ids[cluster_ranks] if len(ids) else []
+
+    logger.info(
+        'Compared %d candidate pairs out of %d pubs: %d matches, %d pubs '
+        'with records in several sources',
+        len(matched), len(data), matched.sum(),
+        (pandas.Series(labels).value_counts() > 1).sum()
+    )
+
+    return data
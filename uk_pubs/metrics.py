@@ -0,0 +1,321 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from uk_pubs.http_cache import ResponseCache
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Stages being measured by each thread, innermost last, with the time spent
+# in their nested stages
+_active = threading.local()
+
+
+def peak_rss() -> Optional[int]:
+    '''Return the peak resident set size of the process so far, in bytes, or
+    None where it is not available.
+    '''
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Kilobytes, except on macOS
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class Stage:
+    '''Measurements of an ETL stage: wall time, rows, bytes read and written,
+    bytes read from the HTTP cache and the peak RSS of the process when it
+    last ran.
+
+    The stage is timed while it is used as a context manager and while the
+    iterators returned by ``iter`` produce items, possibly several times and
+    from several threads. Time spent in another stage measured within it is
+    left out, so the time of streamed stages (e.g. fetching, saving and
+    cleaning the batches of a source) is not counted twice.
+
+    :param name: Name of the stage
+    :type name: str
+    :param labels: Labels telling runs of the stage apart (e.g. ``source``)
+    :type labels: dict
+    '''
+
+    def __init__(self, name: str, **labels: str):
+        self.name = name
+        self.labels = labels
+        self.wall_time = 0.0
+        self.rows = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.bytes_cached = 0
+        self.peak_rss = None
+        self.failed = False
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'Stage':
+        stack = _active.__dict__.setdefault('stack', [])
+        # [stage, start, time spent in nested stages]
+        stack.append([self, time.perf_counter(), 0.0])
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _, start, nested_time = _active.stack.pop()
+        elapsed = time.perf_counter() - start
+
+        if _active.stack:
+            _active.stack[-1][2] += elapsed
+
+        with self._lock:
+            self.wall_time += elapsed - nested_time
+            self.peak_rss = peak_rss()
+            if exc_type is not None:
+                self.failed = True
+
+    def iter(self, items: Iterable[T]) -> Iterator[T]:
+        '''Yield the items of an iterable, timing their production as part of
+        the stage and counting their rows (the length of each item).
+        '''
+        items = iter(items)
+
+        while True:
+            with self:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            with self._lock:
+                self.rows += len(item)
+
+            yield item
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.name,
+            **self.labels,
+            'wall_time': round(self.wall_time, 6),
+            'rows': self.rows,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_cached': self.bytes_cached,
+            'peak_rss': self.peak_rss,
+            'failed': self.failed,
+        }
+
+
+class RunMetrics:
+    '''Metrics of the stages of an ETL run, written as a JSON summary and
+    optionally as a Prometheus textfile (for the node exporter's textfile
+    collector).
+    '''
+    PROMETHEUS_PREFIX = 'uk_pubs_'
+    # Prometheus metric of each stage measurement, and its help text
+    PROMETHEUS_METRICS = {
+        'wall_time': ('stage_seconds', 'Wall time of the ETL stage'),
+        'rows': ('stage_rows', 'Rows produced by the ETL stage'),
+        'bytes_in': ('stage_bytes_in', 'Bytes read by the ETL stage'),
+        'bytes_out': ('stage_bytes_out', 'Bytes written by the ETL stage'),
+        'bytes_cached': (
+            'stage_bytes_cached',
+            'Bytes the ETL stage read from the HTTP cache instead of the '
+            'network'
+        ),
+        'peak_rss': (
+            'stage_peak_rss_bytes',
+            'Peak resident set size of the process after the ETL stage'
+        ),
+        'failed': ('stage_failed', 'Whether the ETL stage failed'),
+    }
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages: List[Stage] = []
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, **labels: str) -> Stage:
+        '''Add a stage to the run.
+
+        :param name: Name of the stage
+        :type name: str
+        :param labels: Labels telling runs of the stage apart
+        :return: The stage, to be measured with ``with`` or ``Stage.iter``
+        :rtype: Stage
+        '''
+        stage = Stage(name, **labels)
+        with self._lock:
+            self.stages.append(stage)
+
+        return stage
+
+    def summary(self) -> dict:
+        '''Return the run's metrics, one entry per stage.'''
+        return {
+            'started_at': datetime.fromtimestamp(
+                self.started_at, timezone.utc
+            ).isoformat(),
+            'wall_time': round(time.time() - self.started_at, 6),
+            'peak_rss': peak_rss(),
+            'stages': [stage.to_dict() for stage in self.stages],
+        }
+
+    def log_summary(self):
+        '''Log the time, rows and bytes of every stage.'''
+        for stage in self.stages:
+            logger.info(
+                'Stage %s %s: %.2fs, %d rows, %d bytes in (and %d from '
+                'cache), %d bytes out%s',
+                stage.name, stage.labels, stage.wall_time, stage.rows,
+                stage.bytes_in, stage.bytes_cached, stage.bytes_out,
+                ' (failed)' if stage.failed else ''
+            )
+
+    def write_json(self, path: str):
+        '''Write the run summary to a JSON file.'''
+        _write_atomically(path, json.dumps(self.summary(), indent=2))
+
+        logger.info('Run metrics saved to %s', path)
+
+    def write_prometheus(self, path: str):
+        '''Write the run's metrics in the Prometheus text format. Runs of the
+        same stage with the same labels are added up.
+        '''
+        totals: Dict[tuple, dict] = {}
+        for stage in self.stages:
+            key = (stage.name,) + tuple(sorted(stage.labels.items()))
+            measures = stage.to_dict()
+            total = totals.setdefault(key, dict.fromkeys(
+                self.PROMETHEUS_METRICS, 0
+            ))
+            for measure in self.PROMETHEUS_METRICS:
+                value = measures[measure] or 0
+                if measure == 'peak_rss':
+                    total[measure] = max(total[measure], value)
+                else:
+                    total[measure] += value
+
+        lines = []
+        for measure, (metric, help_text) in self.PROMETHEUS_METRICS.items():
+            metric = self.PROMETHEUS_PREFIX + metric
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s gauge' % metric)
+            for key, total in totals.items():
+                labels = [('stage', key[0])] + list(key[1:])
+                lines.append('%s{%s} %s' % (
+                    metric,
+                    ','.join(
+                        '%s="%s"' % (name, _escape_label(value))
+                        for name, value in labels
+                    ),
+                    float(total[measure])
+                ))
+
+        metric = self.PROMETHEUS_PREFIX + 'run_timestamp_seconds'
+        lines.append('# HELP %s Start time of the ETL run' % metric)
+        lines.append('# TYPE %s gauge' % metric)
+        lines.append('%s %s' % (metric, self.started_at))
+
+        _write_atomically(path, '\n'.join(lines) + '\n')
+
+        logger.info('Prometheus metrics saved to %s', path)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')\
+        .replace('\n', '\\n')
+
+
+def _write_atomically(path: str, content: str):
+    # Readers (e.g. the node exporter) never see a partial file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path + '.tmp', 'w') as file:
+        file.write(content)
+    os.replace(path + '.tmp', path)
+
+
+class MeteredTransport:
+    '''HTTP transport counting the bytes received through another one.
+    Bodies replayed from the HTTP cache (after a ``304 Not Modified``) are
+    counted apart, in ``bytes_from_cache``.
+
+    :param transport: Transport sending the requests
+    :type transport: HttpTransport
+    '''
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._bytes_received = 0
+        self._bytes_from_cache = 0
+        # Streamed responses are only read after being returned
+        self._streamed = []
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_received(self) -> int:
+        '''Bytes of the response bodies received so far (before content
+        decoding, when urllib3 exposes it).
+        '''
+        with self._lock:
+            return self._bytes_received + sum(
+                _streamed_size(response) for response in self._streamed
+            )
+
+    @property
+    def bytes_from_cache(self) -> int:
+        '''Bytes of the response bodies replayed from the HTTP cache.'''
+        with self._lock:
+            return self._bytes_from_cache
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = self.transport.request(method, url, **kwargs)
+
+        with self._lock:
+            if getattr(response, 'from_cache', False):
+                # Only the 304 went through the network
+                self._bytes_from_cache += len(response.content)
+            elif kwargs.get('stream'):
+                self._streamed.append(response)
+            else:
+                self._bytes_received += ResponseCache._wire_size(response)
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+def _streamed_size(response: requests.Response) -> int:
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return 0
+
+
+_run_metrics = RunMetrics()
+
+
+def get_run_metrics() -> RunMetrics:
+    '''Return the metrics of the process' ETL run.'''
+    return _run_metrics
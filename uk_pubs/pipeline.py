@@ -0,0 +1,545 @@
+from datetime import date
+from typing import Optional, Tuple
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+import googlemaps
+import pandas
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.cdc import (
+    DELETE,
+    UPDATE,
+    changed_keys,
+    diff_snapshots,
+    pub_keys,
+)
+from uk_pubs.checkpoint import PageCheckpoint
+from uk_pubs.geocache import GeocodeCache
+from uk_pubs.history import HistoryStore
+from uk_pubs.http_cache import ResponseCache
+from uk_pubs.matching import resolve_pubs
+from uk_pubs.metrics import MeteredTransport, get_run_metrics
+from uk_pubs.registry import SOURCES, Source
+from uk_pubs.reverse_geocoder import ReverseGeocoder, is_coordinates
+from uk_pubs.schema import (
+    GEOINFO_COLUMNS,
+    PUB_SCHEMA,
+    apply_schema,
+    conform,
+)
+from uk_pubs.sql import get_loader
+from uk_pubs.storage import STORAGE_FORMATS, StageStorage, get_storage
+from uk_pubs.transport import HttpTransport
+from uk_pubs.utils import get_geoinfo, merge_geoinfo
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_arguments(parser: argparse.ArgumentParser, logs_dir: str):
+    '''Add the command line arguments shared by all the ETLs.'''
+    parser.add_argument(
+        'dir',
+        help='Path to the directory where the data of each step will be saved '
+        '(as YYYY-MM-DD-raw.parquet, YYYY-MM-DD-clean.parquet, '
+        'YYYY-MM-DD-changes.parquet and YYYY-MM-DD-geo.parquet)'
+    )
+    parser.add_argument(
+        'sql_table',
+        help='Full description of the SQL table to which data will be pushed. '
+        'Format: SERVER/DATABASE.SCHEMA.TABLE. Use the server "sqlite" to '
+        'push to a local SQLite file, e.g. sqlite/pubs.db.main.pubs'
+    )
+    parser.add_argument(
+        '-l', '--logs-dir',
+        help='Path to the logs directory. Defaults to the '
+        '<current_directory>\\' + logs_dir,
+        default=logs_dir
+    )
+    parser.add_argument(
+        '-f', '--format',
+        help='File format of the data saved at each step. Defaults to parquet',
+        choices=sorted(STORAGE_FORMATS),
+        default='parquet'
+    )
+    parser.add_argument(
+        '--export-csv',
+        help='Also save a CSV copy of the data of each step',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        help='Maximum number of concurrent page requests to paginated '
+        'sources. Use 0 to request one page at a time. Defaults to 8',
+        type=int,
+        default=8
+    )
+    parser.add_argument(
+        '--fast-json',
+        help='Decode JSON sources with orjson (if installed) and keep only '
+        'the fields used by their data processors',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--geocode-cache',
+        help='Path to the persistent GoogleMaps cache. Defaults to '
+        '<dir>/geocode-cache.sqlite'
+    )
+    parser.add_argument(
+        '--geocode-cache-ttl',
+        help='Number of days after which cached GoogleMaps results are '
+        'refreshed. Defaults to 90',
+        type=int,
+        default=90
+    )
+    parser.add_argument(
+        '--reverse-geocoder',
+        help='Path to a postcode reference CSV file (e.g. an ONS Postcode '
+        'Directory extract). If given, pubs with known coordinates are '
+        'geocoded offline from it instead of GoogleMaps'
+    )
+    parser.add_argument(
+        '--geocode-qps',
+        help='Maximum number of GoogleMaps requests per second. Defaults to '
+        '40',
+        type=float,
+        default=40
+    )
+    parser.add_argument(
+        '--geocode-burst',
+        help='Maximum number of GoogleMaps requests sent at once. Defaults to '
+        'the value of --geocode-qps',
+        type=float
+    )
+    parser.add_argument(
+        '--sql-chunk-size',
+        help='Number of rows sent to the SQL staging table at once. Defaults '
+        'to 10000',
+        type=int,
+        default=10_000
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help='Path to the JSON summary of the time, rows, bytes and memory '
+        'of each stage. Defaults to <logs_dir>\\YYYY-MM-DD-metrics.json'
+    )
+    parser.add_argument(
+        '--prometheus-textfile',
+        help='Path to a Prometheus textfile (e.g. in the node exporter\'s '
+        'textfile directory) where the stage metrics are also written'
+    )
+    parser.add_argument(
+        '--history',
+        help='Path to the history of the pubs: the geocoded pubs of every run '
+        'are appended to a Parquet dataset partitioned by source and day, '
+        'see uk_pubs.history.HistoryStore'
+    )
+    parser.add_argument(
+        '--full-refresh',
+        help='Ignore the previous snapshots: every pub is considered new, '
+        'geocoded and loaded again',
+        action='store_true'
+    )
+
+
+def setup(args: argparse.Namespace, today: date):
+    '''Create the output directories and start logging to the day's log.'''
+    os.makedirs(args.dir, exist_ok=True)
+    os.makedirs(args.logs_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.logs_dir, str(today) + '.log'),
+        level=logging.INFO
+    )
+
+
+def make_storage(
+    args: argparse.Namespace,
+    directory: str,
+    source: Optional[Source] = None
+) -> StageStorage:
+    '''Create the storage of the ETL stages saved under a directory.'''
+    schemas = {
+        'clean': PUB_SCHEMA,
+        'changes': {
+            **PUB_SCHEMA, 'ChangeType': 'string', 'ChangedFields': 'string'
+        },
+        'geo': PUB_SCHEMA,
+        'matched': PUB_SCHEMA,
+    }
+    if source is not None:
+        schemas['raw'] = source.connector_class.RAW_SCHEMA
+
+    return get_storage(
+        args.format,
+        directory,
+        schemas,
+        export_csv=args.export_csv,
+        metrics=get_run_metrics(),
+        labels={'source': source.name if source is not None else 'all'}
+    )
+
+
+def make_transport(args: argparse.Namespace) -> HttpTransport:
+    '''Create the HTTP transport shared by the connectors of a run.'''
+    return HttpTransport(
+        pool_size=max(args.max_in_flight, 10),
+        cache=ResponseCache(os.path.join(args.dir, 'http-cache'))
+    )
+
+
+def extract(
+    source: Source,
+    storage: StageStorage,
+    today: date,
+    transport: HttpTransport,
+    args: argparse.Namespace
+) -> pandas.DataFrame:
+    '''Run steps 1 (get raw data) and 2 (clean raw data) of a source, reusing
+    the data already saved today.
+
+    The raw data is saved and cleaned batch by batch, as the connector
+    yields it.
+    '''
+    raw_path = storage.path(today, 'raw')
+    clean_path = storage.path(today, 'clean')
+    if os.path.exists(clean_path):
+        logger.info('Data already available at %s, loading it', clean_path)
+
+        return storage.load(today, 'clean')
+
+    metrics = get_run_metrics()
+    fetch = metrics.stage('fetch', source=source.name)
+    clean = metrics.stage('clean', source=source.name)
+
+    # 1. Save raw data
+    logger.info('Step 1: Get raw data from %s', source.name)
+    if not os.path.exists(raw_path):
+        transport = MeteredTransport(transport)
+        connector = source.connector_class(transport)
+        kwargs = {name: getattr(args, name) for name in source.get_args}
+        if source.checkpointed:
+            # Pages fetched by an interrupted run are not downloaded again
+            kwargs['checkpoint'] = PageCheckpoint(
+                os.path.splitext(raw_path)[0]
+            )
+        batches = storage.write_batches(
+            fetch.iter(connector.iter_batches(**kwargs)), today, 'raw'
+        )
+    else:
+        logger.info('Data already available at %s, loading it', raw_path)
+
+        transport = None
+        batches = [storage.load(today, 'raw')]
+
+    # 2. Clean raw data
+    logger.info('Step 2: Clean raw data from %s', source.name)
+    data = concat_batches(
+        clean.iter(source.process(batch) for batch in batches)
+    )
+    if transport is not None:
+        fetch.bytes_in = transport.bytes_received
+        fetch.bytes_cached = transport.bytes_from_cache
+    storage.save(data, today, 'clean')
+
+    logger.info('Data saved to %s and %s', raw_path, clean_path)
+
+    return data
+
+
+def capture_changes(
+    data: pandas.DataFrame,
+    storage: StageStorage,
+    today: date,
+    args: argparse.Namespace
+) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    '''Run the change data capture stage: compare the clean data with the
+    last clean snapshot saved before today, reusing the changes already saved
+    today.
+
+    :return: The clean data with a ``PubKey`` column, and its changes (see
+        ``uk_pubs.cdc.diff_snapshots``)
+    :rtype: Tuple[pandas.DataFrame, pandas.DataFrame]
+    '''
+    data = apply_schema(data, PUB_SCHEMA)
+    data['PubKey'] = pub_keys(data)
+
+    logger.info('Step 2b: Capture changes')
+    filepath = storage.path(today, 'changes')
+    if not os.path.exists(filepath):
+        previous_day = None
+        if not args.full_refresh:
+            previous_day = storage.latest_day('clean', before=today)
+
+        if previous_day is None:
+            logger.info('No previous snapshot, every pub is new')
+            previous = data.iloc[:0]
+        else:
+            logger.info('Comparing with the snapshot of %s', previous_day)
+            previous = storage.load(previous_day, 'clean')
+            previous['PubKey'] = pub_keys(previous)
+
+        with get_run_metrics().stage('changes', **storage.labels) as stage:
+            changes = diff_snapshots(previous, data)
+            stage.rows = len(changes)
+        storage.save(changes, today, 'changes')
+
+        logger.info('Data saved to %s', filepath)
+    else:
+        logger.info('Data already available at %s, loading it', filepath)
+
+        changes = storage.load(today, 'changes')
+
+    return data, changes
+
+
+def previous_geoinfo(
+    data: pandas.DataFrame,
+    storage: StageStorage,
+    today: date,
+    changes: pandas.DataFrame
+) -> pandas.DataFrame:
+    '''Take the geo information of the pubs that did not change from the
+    last geo snapshot saved before today.
+
+    :return: Geo information of the unchanged pubs, indexed by search string
+        as the output of ``get_geoinfo``
+    :rtype: pandas.DataFrame
+    '''
+    previous_day = storage.latest_day('geo', before=today)
+    if previous_day is None:
+        return pandas.DataFrame(columns=GEOINFO_COLUMNS)
+
+    previous = storage.load(previous_day, 'geo')
+    if 'PubKey' not in previous.columns:
+        previous['PubKey'] = pub_keys(previous)
+    previous = previous.drop_duplicates('PubKey').set_index('PubKey')
+
+    unchanged = data[
+        ~data['PubKey'].isin(changed_keys(changes))
+        & data['PubKey'].isin(previous.index)
+        & data['SearchString'].notna()
+    ]
+    geo_info = previous.loc[unchanged['PubKey'], GEOINFO_COLUMNS]
+    geo_info.index = pandas.Index(
+        unchanged['SearchString'], name='SearchString'
+    )
+
+    logger.info(
+        'Reusing the geo information of %d unchanged pubs from %s',
+        len(geo_info), previous_day
+    )
+
+    return geo_info
+
+
+def geocode(
+    data: pandas.DataFrame,
+    storage: StageStorage,
+    today: date,
+    args: argparse.Namespace,
+    changes: Optional[pandas.DataFrame] = None
+) -> pandas.DataFrame:
+    '''Run step 3 (get geo information) over data with a ``SearchString``
+    column, reusing the data already saved today.
+
+    With the ``changes`` of the data (and a ``PubKey`` column), only the
+    inserted and updated pubs are geocoded, the others keeping their previous
+    geo information.
+    '''
+    logger.info('Step 3: Get geo information')
+    filepath = storage.path(today, 'geo')
+    if not os.path.exists(filepath):
+        metrics = get_run_metrics()
+        geo_info = []
+        search_strings = pandas.Series(data['SearchString'].dropna().unique())
+
+        if changes is not None:
+            reused = previous_geoinfo(data, storage, today, changes)
+            if len(reused) > 0:
+                geo_info.append(reused)
+                search_strings = search_strings[
+                    ~search_strings.isin(reused.index)
+                ].reset_index(drop=True)
+
+        if args.reverse_geocoder:
+            offline = is_coordinates(search_strings)
+            with metrics.stage('geocode', geocoder='reverse') as stage:
+                reverse_geocoder = ReverseGeocoder.from_csv(
+                    args.reverse_geocoder
+                )
+                geo_info.append(
+                    get_geoinfo(reverse_geocoder, search_strings[offline])
+                )
+                stage.rows = offline.sum()
+            search_strings = search_strings[~offline]
+
+        if len(search_strings) > 0:
+            gm_client = googlemaps.Client(os.environ['GOOGLEMAPS_KEY'])
+            cache = GeocodeCache(
+                args.geocode_cache
+                or os.path.join(args.dir, 'geocode-cache.sqlite'),
+                ttl=args.geocode_cache_ttl * 24 * 60 * 60
+            )
+            with cache, \
+                    metrics.stage('geocode', geocoder='googlemaps') as stage:
+                geo_info.append(get_geoinfo(
+                    gm_client,
+                    search_strings,
+                    cache=cache,
+                    qps=args.geocode_qps,
+                    burst=args.geocode_burst
+                ))
+                stage.rows = len(search_strings)
+
+        data = conform(merge_geoinfo(
+            data,
+            pandas.concat(geo_info) if geo_info
+            else pandas.DataFrame(columns=GEOINFO_COLUMNS)
+        ))
+        storage.save(data, today, 'geo')
+
+        logger.info('Data saved to %s', filepath)
+    else:
+        logger.info('Data already available at %s, loading it', filepath)
+
+        data = storage.load(today, 'geo')
+
+    return data
+
+
+def match_pubs(
+    data: pandas.DataFrame,
+    changes: pandas.DataFrame,
+    storage: StageStorage,
+    today: date
+) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    '''Run step 3b (match pubs across sources) over geocoded data, reusing
+    the data already saved today.
+
+    :return: The data with a ``PubId`` column (see
+        ``uk_pubs.matching.resolve_pubs``), and its changes, plus an update of
+        every pub whose ``PubId`` changed since the last match
+    :rtype: Tuple[pandas.DataFrame, pandas.DataFrame]
+    '''
+    logger.info('Step 3b: Match pubs across sources')
+    filepath = storage.path(today, 'matched')
+    if not os.path.exists(filepath):
+        with get_run_metrics().stage('match') as stage:
+            data = resolve_pubs(data)
+            stage.rows = len(data)
+        storage.save(data, today, 'matched')
+
+        logger.info('Data saved to %s', filepath)
+    else:
+        logger.info('Data already available at %s, loading it', filepath)
+
+        data = storage.load(today, 'matched')
+
+    previous_day = storage.latest_day('matched', before=today)
+    if previous_day is not None:
+        previous = storage.load(previous_day, 'matched')\
+            .drop_duplicates('PubKey')\
+            .set_index('PubKey')['PubId']
+        relinked = data[
+            data['PubKey'].isin(previous.index)
+            & ~data['PubKey'].isin(changes['PubKey'])
+        ]
+        relinked = relinked[
+            relinked['PubId'].to_numpy()
+            != previous.reindex(relinked['PubKey']).to_numpy()
+        ]
+
+        logger.info('%d unchanged pubs were matched anew', len(relinked))
+
+        changes = pandas.concat(
+            [
+                changes,
+                relinked.assign(ChangeType=UPDATE, ChangedFields='PubId'),
+            ],
+            ignore_index=True
+        )
+
+    return data, changes
+
+
+def push_to_sql(
+    data: pandas.DataFrame,
+    changes: pandas.DataFrame,
+    args: argparse.Namespace
+) -> int:
+    '''Run step 4 (push to SQL): upsert the inserted and updated pubs into
+    the ``sql_table`` and delete the pubs removed from their source.
+
+    :return: Number of rows sent to the database
+    :rtype: int
+    '''
+    logger.info('Step 4: Push to SQL table %s', args.sql_table)
+
+    upserted = data[data['PubKey'].isin(changed_keys(changes))]
+    deleted = changes.loc[changes['ChangeType'] == DELETE, 'PubKey']
+
+    loader = get_loader(args.sql_table, args.sql_chunk_size)
+    with loader.pool, get_run_metrics().stage('push') as stage:
+        stage.rows = loader.load(upserted, deleted, PUB_SCHEMA)
+
+    return stage.rows
+
+
+def append_history(
+    data: pandas.DataFrame,
+    args: argparse.Namespace,
+    today: date
+):
+    '''Append the pubs of the run to the ``history`` dataset, if given.'''
+    if not args.history:
+        return
+
+    logger.info('Step 5: Append to the history at %s', args.history)
+
+    with get_run_metrics().stage('history') as stage:
+        stage.rows = HistoryStore(args.history).append(data, today)
+
+
+def write_metrics(args: argparse.Namespace, today: date):
+    '''Log the run metrics and save them to the ``metrics_file`` (and the
+    ``prometheus_textfile``, if given).
+    '''
+    metrics = get_run_metrics()
+    metrics.log_summary()
+    metrics.write_json(
+        args.metrics_file
+        or os.path.join(args.logs_dir, str(today) + '-metrics.json')
+    )
+    if args.prometheus_textfile:
+        metrics.write_prometheus(args.prometheus_textfile)
+
+
+def run_source_etl(key: str, description: str):
+    '''Command line entry point of the ETL of a single source.'''
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=description)
+    add_arguments(parser, 'logs\\' + key)
+    args = parser.parse_args()
+
+    today = date.today()
+    setup(args, today)
+
+    source = SOURCES[key]
+    storage = make_storage(args, args.dir, source)
+
+    try:
+        with make_transport(args) as transport:
+            data = extract(source, storage, today, transport, args)
+            transport.cache.log_stats()
+
+        data, changes = capture_changes(data, storage, today, args)
+        data['SearchString'] = source.search_strings(data)
+        data = geocode(data, storage, today, args, changes)
+        push_to_sql(data, changes, args)
+        append_history(data, args, today)
+    finally:
+        write_metrics(args, today)
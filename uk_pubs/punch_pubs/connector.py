@@ -1,8 +1,19 @@
 from datetime import date
+from typing import Iterator, Optional
 import logging
 
 import pandas
-import requests
+
+from uk_pubs.batches import (
+    DEFAULT_BATCH_SIZE,
+    chunks,
+    concat_batches,
+    flat_keys,
+    make_batch,
+)
+from uk_pubs.fastjson import loads, project
+from uk_pubs.schema import apply_schema
+from uk_pubs.transport import HttpTransport, get_default_transport
 
 
 logger = logging.getLogger(__name__)
@@ -15,13 +26,74 @@ class PunchPubsConnector:
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:91.0) '
         'Gecko/20100101 Firefox/91.0',
     }
+    # Fields used by PunchPubsDataProcessor, read by the fast JSON path
+    FIELDS = {
+        'outgoing_value': ('outgoing_value',),
+        'name': ('name',),
+        'permalink': ('permalink',),
+        'latlng.lat': ('latlng', 'lat'),
+        'latlng.lng': ('latlng', 'lng'),
+        'address': ('address',),
+        'town': ('town',),
+    }
+    RAW_SCHEMA = {
+        'outgoing_value': 'string',
+        'name': 'string',
+        'permalink': 'string',
+        'latlng.lat': 'float64',
+        'latlng.lng': 'float64',
+        'address': 'string',
+        'town': 'string',
+        'ScrapeDate': 'string',
+    }
+
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        '''Create the connector.
 
-    def get(self) -> pandas.DataFrame:
-        '''TODO: Doc'''
+        :param transport: HTTP transport used to reach the source. Defaults
+            to the transport shared by all connectors
+        :type transport: HttpTransport, optional
+        '''
+        self.transport = transport or get_default_transport()
+
+    def iter_batches(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        fast_json: bool = False
+    ) -> Iterator[pandas.DataFrame]:
+        '''Get the pubs, in batches typed as the ``RAW_SCHEMA``.
+
+        :param batch_size: Number of pubs in each batch
+        :type batch_size: int
+        :param fast_json: Decode the response with orjson (if installed) and
+            keep only the ``FIELDS`` used by the data processor, instead of
+            flattening every field
+        :type fast_json: bool
+        :return: Iterator over the batches of pubs
+        :rtype: Iterator[pandas.DataFrame]
+        '''
         logger.info('Getting data from PunchPubs at %s', self.URL)
 
-        response = requests.get(self.URL, headers=self.HEADERS).json()
-        data = pandas.json_normalize(response, sep='.')
-        data['ScrapeDate'] = str(date.today())
+        response = self.transport.get(
+            self.URL, headers=self.HEADERS, use_cache=True
+        )
+        scrape_date = str(date.today())
+
+        if fast_json:
+            records = loads(response.content)
+            for chunk in chunks(records, batch_size):
+                batch = pandas.DataFrame(project(chunk, self.FIELDS))
+                batch['ScrapeDate'] = scrape_date
+
+                yield apply_schema(batch, self.RAW_SCHEMA)
+        else:
+            records = response.json()
+            columns = flat_keys(records)
+            for chunk in chunks(records, batch_size):
+                yield make_batch(
+                    chunk, self.RAW_SCHEMA, columns, ScrapeDate=scrape_date
+                )
 
-        return data
+    def get(self, fast_json: bool = False) -> pandas.DataFrame:
+        '''Get all the pubs (see ``iter_batches``).'''
+        return concat_batches(self.iter_batches(fast_json=fast_json))
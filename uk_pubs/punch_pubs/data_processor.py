@@ -3,6 +3,8 @@ import html
 import pandas
 
 from uk_pubs.punch_pubs.constants import NAME
+from uk_pubs.rent import annual_rent
+from uk_pubs.schema import conform
 
 
 class PunchPubsDataProcessor:
@@ -26,25 +28,7 @@ class PunchPubsDataProcessor:
             'address',
             'town',
         ]]
-        output['outgoing_value'] = output['outgoing_value']\
-            .str.replace(r'[ ,]', '', regex=True)\
-            .str.upper()
-
-        weekly_rent = output['outgoing_value']\
-            .str.extract(r'£([\d,]+)PW$')\
-            .astype(float)\
-            * 52
-        monthly_rent = output['outgoing_value']\
-            .str.extract(r'£([\d,]+)PCM$')\
-            .astype(float)\
-            * 12
-        annual_rent = output['outgoing_value']\
-            .str.extract(r'£([\d,]+)$')\
-            .astype(float)
-
-        output['outgoing_value'] = annual_rent\
-            .combine_first(monthly_rent)\
-            .combine_first(weekly_rent)
+        output['outgoing_value'] = annual_rent(output['outgoing_value'])
 
         output.rename(columns={
             'outgoing_value': 'AnnualRent',
@@ -60,4 +44,4 @@ class PunchPubsDataProcessor:
 
         output['Source'] = NAME
 
-        return output
+        return conform(output)
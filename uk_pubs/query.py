@@ -0,0 +1,293 @@
+from datetime import date
+from typing import Optional, Tuple, Union
+import hashlib
+import logging
+import math
+import os
+
+import numpy
+import pandas
+
+from uk_pubs.spatial import GridIndex, haversine
+from uk_pubs.storage import StageStorage
+
+
+logger = logging.getLogger(__name__)
+
+
+class PubIndex:
+    '''Spatial index of pubs answering radius and k-nearest queries, with
+    great-circle distances, for whole arrays of query points at once.
+
+    Pubs without coordinates are left out of the index.
+
+    :param pubs: Pubs with ``Lat`` and ``Long`` columns, such as the output
+        of the geo stage
+    :type pubs: pandas.DataFrame
+    :param cell_size: Side of the cells of the underlying ``GridIndex``, in km
+    :type cell_size: float
+    :param grid: Grid index of the pubs, if already built
+    :type grid: GridIndex, optional
+    '''
+    CELL_SIZE = 2.0
+    # Rings of cells searched for k-nearest queries before comparing the
+    # remaining queries with every pub
+    MAX_RINGS = 32
+
+    def __init__(
+        self,
+        pubs: pandas.DataFrame,
+        cell_size: float = CELL_SIZE,
+        grid: Optional[GridIndex] = None
+    ):
+        located = pubs['Lat'].notna() & pubs['Long'].notna()
+        self.pubs = pubs[located].reset_index(drop=True)
+        self.grid = grid or GridIndex(
+            self.pubs['Lat'].to_numpy(dtype='float64'),
+            self.pubs['Long'].to_numpy(dtype='float64'),
+            cell_size
+        )
+        self._max_abs_lat = numpy.abs(self.grid.lat).max() \
+            if len(self.grid) else 0
+
+    def __len__(self) -> int:
+        return len(self.pubs)
+
+    def save(self, path: str, fingerprint: str = ''):
+        '''Save the grid index to a ``.npz`` file (the pubs are not saved).
+
+        :param fingerprint: Fingerprint of the pubs' data, checked by
+            ``load_index``
+        :type fingerprint: str
+        '''
+        with open(path + '.tmp', 'wb') as file:
+            numpy.savez(file, fingerprint=fingerprint, **self.grid.state())
+        os.replace(path + '.tmp', path)
+
+    def _stretch(self, lat: numpy.ndarray) -> float:
+        # The grid's projection is exact along meridians, but stretches
+        # distances along parallels by up to cos(mean lat) / cos(lat): rings
+        # of cells are widened accordingly so no pub in range is missed
+        max_abs_lat = max(
+            self._max_abs_lat, numpy.abs(lat).max() if len(lat) else 0
+        )
+        stretch = self.grid.cos_lat / math.cos(math.radians(max_abs_lat))
+
+        return max(stretch, 1) * 1.01
+
+    def _results(
+        self,
+        queries: numpy.ndarray,
+        positions: numpy.ndarray,
+        distances: numpy.ndarray
+    ) -> pandas.DataFrame:
+        order = numpy.lexsort((distances, queries))
+        queries, positions = queries[order], positions[order]
+
+        results = self.pubs.iloc[self.grid.order[positions]]\
+            .reset_index(drop=True)
+        results.insert(0, 'Query', queries)
+        results.insert(1, 'Distance', distances[order])
+
+        return results
+
+    def within(
+        self,
+        lat: Union[float, numpy.ndarray],
+        lng: Union[float, numpy.ndarray],
+        radius: float
+    ) -> pandas.DataFrame:
+        '''Find the pubs within a distance of each query point.
+
+        :param lat: Latitude of the query points, in degrees
+        :type lat: float or numpy.ndarray
+        :param lng: Longitude of the query points, in degrees
+        :type lng: float or numpy.ndarray
+        :param radius: Maximum distance, in km
+        :type radius: float
+        :return: One row per pub found: the position of its query point
+            (``Query``), its ``Distance`` in km and its columns, sorted by
+            query and distance
+        :rtype: pandas.DataFrame
+        '''
+        lat = numpy.atleast_1d(numpy.asarray(lat, dtype='float64'))
+        lng = numpy.atleast_1d(numpy.asarray(lng, dtype='float64'))
+        if len(self) == 0:
+            empty = numpy.array([], dtype='int64')
+            return self._results(empty, empty, empty.astype('float64'))
+
+        rings = math.ceil(radius * self._stretch(lat) / self.grid.cell_size)
+        x, y = self.grid.project(lat, lng)
+        queries, points = self.grid.candidates(x, y, rings)
+
+        distances = haversine(
+            lat[queries], lng[queries], self.grid.lat[points],
+            self.grid.lng[points]
+        )
+        near = distances <= radius
+
+        return self._results(queries[near], points[near], distances[near])
+
+    def nearest(
+        self,
+        lat: Union[float, numpy.ndarray],
+        lng: Union[float, numpy.ndarray],
+        k: int = 1
+    ) -> pandas.DataFrame:
+        '''Find the ``k`` nearest pubs of each query point.
+
+        Query points are matched against the pubs of their own and
+        neighbouring cells, over wider rings of cells while fewer than ``k``
+        pubs are guaranteed to be the nearest, and finally against every pub.
+        To find the nearest competitors of indexed pubs, query ``k + 1`` pubs
+        and drop the pubs themselves.
+
+        :param lat: Latitude of the query points, in degrees
+        :type lat: float or numpy.ndarray
+        :param lng: Longitude of the query points, in degrees
+        :type lng: float or numpy.ndarray
+        :param k: Number of pubs found for each query point
+        :type k: int
+        :return: ``k`` rows per query point (fewer if the index has fewer
+            pubs), as the output of ``within``
+        :rtype: pandas.DataFrame
+        '''
+        lat = numpy.atleast_1d(numpy.asarray(lat, dtype='float64'))
+        lng = numpy.atleast_1d(numpy.asarray(lng, dtype='float64'))
+        k = min(k, len(self))
+        found = []
+
+        x, y = self.grid.project(lat, lng)
+        stretch = self._stretch(lat)
+        pending = numpy.arange(len(lat)) if k > 0 else numpy.arange(0)
+        rings = 1
+
+        while len(pending) and rings <= self.MAX_RINGS:
+            queries, points = self.grid.candidates(
+                x[pending], y[pending], rings
+            )
+            distances = haversine(
+                lat[pending][queries], lng[pending][queries],
+                self.grid.lat[points], self.grid.lng[points]
+            )
+            queries, points, distances = _k_smallest(
+                queries, points, distances, k
+            )
+
+            # Pubs outside the rings are farther than this from the query
+            guaranteed = rings * self.grid.cell_size / stretch
+            counts = numpy.bincount(queries, minlength=len(pending))
+            farthest = numpy.zeros(len(pending))
+            numpy.maximum.at(farthest, queries, distances)
+            resolved = (counts == k) & (farthest <= guaranteed)
+
+            keep = resolved[queries]
+            found.append((
+                pending[queries[keep]], points[keep], distances[keep]
+            ))
+            pending = pending[~resolved]
+            rings *= 2
+
+        if len(pending):
+            queries = numpy.repeat(numpy.arange(len(pending)), len(self))
+            points = numpy.tile(numpy.arange(len(self)), len(pending))
+            distances = haversine(
+                lat[pending][queries], lng[pending][queries],
+                self.grid.lat[points], self.grid.lng[points]
+            )
+            queries, points, distances = _k_smallest(
+                queries, points, distances, k
+            )
+            found.append((pending[queries], points, distances))
+
+        if not found:
+            empty = numpy.array([], dtype='int64')
+            return self._results(empty, empty, empty.astype('float64'))
+
+        return self._results(*(
+            numpy.concatenate([part[column] for part in found])
+            for column in range(3)
+        ))
+
+
+def _k_smallest(
+    queries: numpy.ndarray,
+    points: numpy.ndarray,
+    distances: numpy.ndarray,
+    k: int
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    # The k nearest candidates of each query
+    order = numpy.lexsort((distances, queries))
+    queries, points, distances = \
+        queries[order], points[order], distances[order]
+
+    starts = numpy.flatnonzero(numpy.diff(queries, prepend=-1))
+    ranks = numpy.arange(len(queries)) \
+        - numpy.repeat(starts, numpy.diff(starts, append=len(queries)))
+    top = ranks < k
+
+    return queries[top], points[top], distances[top]
+
+
+def file_fingerprint(path: str) -> str:
+    '''Return the SHA-1 of a file's content.'''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def load_index(
+    storage: StageStorage,
+    day: Optional[Union[date, str]] = None,
+    stage: str = 'geo',
+    cell_size: float = PubIndex.CELL_SIZE
+) -> PubIndex:
+    '''Load the spatial index of the pubs saved by a stage.
+
+    The index is saved next to the stage's file (as
+    ``YYYY-MM-DD-<stage>-index.npz``) and only rebuilt when that file
+    changed since, or with another ``cell_size``.
+
+    :param storage: Storage of the stage
+    :type storage: StageStorage
+    :param day: Day of the stage. Defaults to the last day it was saved
+    :type day: date or str, optional
+    :param stage: Stage with the pubs, such as ``geo`` or ``matched``
+    :type stage: str
+    :param cell_size: Side of the cells of the index, in km
+    :type cell_size: float
+    :return: Index of the pubs of the stage
+    :rtype: PubIndex
+    '''
+    if day is None:
+        days = storage.days(stage)
+        if not days:
+            raise FileNotFoundError(
+                'No %s stage saved in %s' % (stage, storage.directory)
+            )
+        day = days[-1]
+
+    data_path = storage.path(day, stage)
+    index_path = os.path.splitext(data_path)[0] + '-index.npz'
+    fingerprint = file_fingerprint(data_path)
+    pubs = storage.load(day, stage)
+
+    if os.path.exists(index_path):
+        with numpy.load(index_path) as state:
+            if str(state['fingerprint']) == fingerprint \
+                    and float(state['cell_size']) == cell_size:
+                logger.info('Loading the spatial index %s', index_path)
+
+                return PubIndex(
+                    pubs, cell_size, GridIndex.from_state(dict(state))
+                )
+
+    logger.info('Building the spatial index of %s', data_path)
+
+    index = PubIndex(pubs, cell_size)
+    index.save(index_path, fingerprint)
+
+    return index
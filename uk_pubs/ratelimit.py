@@ -0,0 +1,47 @@
+from typing import Optional
+import threading
+import time
+
+
+class TokenBucket:
+    '''Thread-safe token bucket rate limiter.
+
+    Tokens are added at ``rate`` per second, up to ``burst`` tokens. Each call
+    to ``acquire`` takes one token, waiting until it is available, so callers
+    never exceed ``rate`` calls per second on average nor ``burst`` calls at
+    once.
+
+    :param rate: Tokens added per second
+    :type rate: float
+    :param burst: Maximum number of tokens held. Defaults to ``rate``
+    :type burst: float, optional
+    '''
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+
+        self.rate = rate
+        self.burst = max(burst or rate, 1)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        '''Take tokens from the bucket, blocking until they are available.'''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait_time = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait_time)
@@ -0,0 +1,72 @@
+from typing import Callable, NamedTuple, Tuple, Type
+
+import pandas
+
+from uk_pubs.admiral_taverns.connector import AdmiralTavernsConnector
+from uk_pubs.greene_king import constants as greene_king
+from uk_pubs.greene_king.connector import GreeneKingAjaxConnector
+from uk_pubs.greene_king.data_processor import GreeneKingDataProcessor
+from uk_pubs.punch_pubs import constants as punch_pubs
+from uk_pubs.punch_pubs.connector import PunchPubsConnector
+from uk_pubs.punch_pubs.data_processor import PunchPubsDataProcessor
+from uk_pubs.stonegate import constants as stonegate
+from uk_pubs.stonegate.connector import StonegateConnector
+from uk_pubs.stonegate.data_processor import StonegateDataProcessor
+
+
+class Source(NamedTuple):
+    '''How to extract, clean and geocode the pubs of a data source.'''
+    name: str
+    connector_class: Type
+    process: Callable[[pandas.DataFrame], pandas.DataFrame]
+    search_strings: Callable[[pandas.DataFrame], pandas.Series]
+    # Command line arguments passed on to the connector's ``get``
+    get_args: Tuple[str, ...] = ()
+    # Whether the connector's ``get`` accepts a ``PageCheckpoint``
+    checkpointed: bool = False
+
+
+def address_search_strings(data: pandas.DataFrame) -> pandas.Series:
+    '''GoogleMaps search strings built from the pubs' street addresses.'''
+    return data['StreetAddress'] + ', UK'
+
+
+def coordinates_search_strings(data: pandas.DataFrame) -> pandas.Series:
+    '''GoogleMaps search strings built from the pubs' coordinates.'''
+    return data['Lat'].astype(str) + ', ' + data['Long'].astype(str)
+
+
+def _clean_admiral_taverns(data: pandas.DataFrame) -> pandas.DataFrame:
+    return AdmiralTavernsConnector().clean(data)
+
+
+SOURCES = {
+    'admiral_taverns': Source(
+        AdmiralTavernsConnector.NAME,
+        AdmiralTavernsConnector,
+        _clean_admiral_taverns,
+        address_search_strings,
+    ),
+    'greene_king': Source(
+        greene_king.NAME,
+        GreeneKingAjaxConnector,
+        GreeneKingDataProcessor().process,
+        coordinates_search_strings,
+        ('max_in_flight',),
+        checkpointed=True,
+    ),
+    'punch_pubs': Source(
+        punch_pubs.NAME,
+        PunchPubsConnector,
+        PunchPubsDataProcessor().process,
+        coordinates_search_strings,
+        ('fast_json',),
+    ),
+    'stonegate': Source(
+        stonegate.NAME,
+        StonegateConnector,
+        StonegateDataProcessor().process,
+        coordinates_search_strings,
+        ('fast_json', 'max_in_flight'),
+    ),
+}
@@ -0,0 +1,96 @@
+import re
+
+import numpy
+import pandas
+
+
+# Number of payments per year of each rent period
+PERIOD_MULTIPLIERS = {
+    'weekly': 52,
+    'monthly': 12,
+    'annual': 1,
+}
+
+# Amount in pounds, with commas or spaces as thousands separators
+_AMOUNT = r'(\d{1,3}(?:[, ]\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s*(k)?'
+
+
+def _rent_pattern(currency: str) -> re.Pattern:
+    return re.compile(
+        currency + _AMOUNT
+        + r'(?:\s*(?:-|–|to)\s*£?\s*' + _AMOUNT + r')?'
+        + r'\s*(?:'
+        r'(?P<weekly>p\.?w\.?|per\s+week|a\s+week|weekly)'
+        r'|(?P<monthly>p\.?c\.?m\.?|p\.?m\.?|per\s+(?:calendar\s+)?month'
+        r'|a\s+month|monthly)'
+        r'|(?P<annual>p\.?a\.?|per\s+(?:annum|year)|a\s+year|annually'
+        r'|yearly)'
+        r')?\b',
+        re.IGNORECASE
+    )
+
+
+# Amount (or range of amounts) in pounds followed by an optional period, e.g.
+# "£1,000 PW", "£20k - £25k per annum", "Approximate Ingoings £12,000"
+RENT_PATTERN = _rent_pattern(r'£\s*')
+# The same without the pound sign, only used for values without one (e.g.
+# "25000"), as other numbers (e.g. "3 bed flat, £20,000") come first
+BARE_RENT_PATTERN = _rent_pattern('')
+
+
+def annual_rent(
+    values: pandas.Series,
+    default_period: str = 'annual'
+) -> pandas.Series:
+    '''Parse rent descriptions into annual rents.
+
+    Each distinct value is parsed once, in a single regular expression pass:
+    its amount, in pounds, is multiplied by the ``PERIOD_MULTIPLIERS`` of its
+    period. Ranges of amounts (e.g. ``"£20,000 - £25,000"``) are taken at
+    their midpoint, and values without amount (e.g. ``"POA"``) are missing.
+
+    :param values: Rent descriptions, or numeric rents
+    :type values: pandas.Series
+    :param default_period: Period of the amounts without one
+    :type default_period: str
+    :return: Annual rents
+    :rtype: pandas.Series
+    '''
+    default_multiplier = PERIOD_MULTIPLIERS[default_period]
+
+    if pandas.api.types.is_numeric_dtype(values):
+        return values.astype('float64') * default_multiplier
+
+    # Listings repeat the same few rents: parse each of them once
+    codes, uniques = pandas.factorize(values)
+    rents = numpy.fromiter(
+        (parse_rent(str(value), default_multiplier) for value in uniques),
+        dtype='float64',
+        count=len(uniques)
+    )
+    # Missing values have code -1, i.e. the last rent: NaN
+    rents = numpy.append(rents, numpy.nan)
+
+    return pandas.Series(rents[codes], index=values.index, dtype='float64')
+
+
+def parse_rent(value: str, default_multiplier: int = 1) -> float:
+    '''Parse a single rent description into an annual rent (see
+    ``annual_rent``).
+    '''
+    pattern = RENT_PATTERN if '£' in value else BARE_RENT_PATTERN
+    match = pattern.search(value)
+    if match is None:
+        return numpy.nan
+
+    low, low_thousands, high, high_thousands = match.group(1, 2, 3, 4)
+    amount = _amount(low, low_thousands)
+    if high:
+        amount = (amount + _amount(high, high_thousands)) / 2
+
+    # The last matched group is the period, if any
+    return amount * PERIOD_MULTIPLIERS.get(match.lastgroup, default_multiplier)
+
+
+def _amount(digits: str, thousands: str) -> float:
+    return float(re.sub(r'[, ]', '', digits)) * (1000 if thousands else 1)
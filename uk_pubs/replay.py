@@ -0,0 +1,445 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import urlsplit
+import abc
+import argparse
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from requests.structures import CaseInsensitiveDict
+import googlemaps
+import requests
+
+from uk_pubs.batches import concat_batches
+from uk_pubs.geocache import normalise_search_string
+from uk_pubs.http_cache import ResponseCache
+from uk_pubs.registry import SOURCES
+from uk_pubs.transport import (
+    HttpTransport,
+    get_default_transport,
+    request_key,
+)
+from uk_pubs.utils import get_geoinfo
+
+
+logger = logging.getLogger(__name__)
+
+
+class MissingFixture(LookupError):
+    '''A request or a search string that was not recorded in the fixture.'''
+
+
+class Fixture:
+    '''HTTP responses of a data source and geocoder results, recorded to run
+    the source offline.
+
+    The fixture is saved as gzip-compressed JSON, with the responses keyed
+    by ``uk_pubs.transport.request_key`` and the geocoder results keyed by
+    normalised search string.
+
+    :param path: Path of the fixture file (``.json.gz``)
+    :type path: str
+    '''
+    STORED_HEADERS = ResponseCache.STORED_HEADERS
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses = {}
+        self.geocode_results = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'Fixture':
+        '''Load a fixture saved by ``save``.'''
+        fixture = cls(path)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            content = json.load(file)
+        fixture.responses = content['responses']
+        fixture.geocode_results = content['geocode']
+
+        return fixture
+
+    def save(self):
+        '''Write the fixture file (atomically).'''
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            with gzip.open(self.path + '.tmp', 'wt', encoding='utf-8') as file:
+                json.dump({
+                    'responses': self.responses,
+                    'geocode': self.geocode_results,
+                }, file, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+
+        logger.info(
+            'Saved %d responses and %d geocoder results to %s',
+            len(self.responses), len(self.geocode_results), self.path
+        )
+
+    def record_response(self, key: str, response: requests.Response):
+        '''Record the response to a request.'''
+        recorded = {
+            'url': response.url,
+            'status': response.status_code,
+            'encoding': response.encoding,
+            'headers': {
+                name: response.headers[name]
+                for name in self.STORED_HEADERS if name in response.headers
+            },
+            'content': base64.b64encode(response.content).decode('ascii'),
+        }
+        with self._lock:
+            self.responses[key] = recorded
+
+    def content(self, key: str) -> dict:
+        '''Return a recorded response, with its body decoded to bytes.'''
+        try:
+            recorded = self.responses[key]
+        except KeyError:
+            raise MissingFixture(
+                'No response recorded for request %s in %s' % (key, self.path)
+            ) from None
+
+        return {
+            **recorded, 'content': base64.b64decode(recorded['content'])
+        }
+
+    def response(self, key: str, stream: bool = False) -> requests.Response:
+        '''Rebuild a recorded response.
+
+        :param key: Key of the request
+        :type key: str
+        :param stream: Serve the body from ``response.raw``, as requests
+            does for streamed responses
+        :type stream: bool
+        :return: The recorded response
+        :rtype: requests.Response
+        '''
+        recorded = self.content(key)
+
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response.url = recorded['url']
+        response.encoding = recorded['encoding']
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        if stream:
+            response.raw = io.BytesIO(recorded['content'])
+        else:
+            response._content = recorded['content']
+
+        return response
+
+    def record_geocode(self, search_string: str, result: Any):
+        '''Record the geocoder result of a search string.'''
+        with self._lock:
+            self.geocode_results[normalise_search_string(search_string)] = \
+                result
+
+    def geocode(self, search_string: str) -> Any:
+        '''Return the recorded geocoder result of a search string.'''
+        try:
+            return self.geocode_results[
+                normalise_search_string(search_string)
+            ]
+        except KeyError:
+            raise MissingFixture(
+                'No geocoder result recorded for "%s" in %s'
+                % (search_string, self.path)
+            ) from None
+
+
+class _FixtureTransport(abc.ABC):
+    @abc.abstractmethod
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        '''Send a request (see ``requests.Session.request``).'''
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> '_FixtureTransport':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordingTransport(_FixtureTransport):
+    '''HTTP transport recording every response it gets into a fixture.
+
+    :param fixture: Fixture where the responses are recorded
+    :type fixture: Fixture
+    :param transport: Transport sending the requests. Defaults to the
+        transport shared by all connectors
+    :type transport: HttpTransport, optional
+    '''
+
+    def __init__(
+        self,
+        fixture: Fixture,
+        transport: Optional[HttpTransport] = None
+    ):
+        self.fixture = fixture
+        self.transport = transport or get_default_transport()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = self.transport.request(method, url, **kwargs)
+        self.fixture.record_response(
+            request_key(method, url, **kwargs), response
+        )
+
+        return response
+
+
+class ReplayTransport(_FixtureTransport):
+    '''HTTP transport answering every request with its recorded response,
+    without any network access. Requests that were not recorded raise
+    ``MissingFixture``.
+
+    :param fixture: Fixture with the recorded responses
+    :type fixture: Fixture
+    '''
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        stream: bool = False,
+        **kwargs
+    ) -> requests.Response:
+        key = request_key(method, url, **kwargs)
+
+        return self.fixture.response(key, stream)
+
+
+class RecordingGeocoder:
+    '''GoogleMaps client recording every result it gets into a fixture.
+
+    :param fixture: Fixture where the results are recorded
+    :type fixture: Fixture
+    :param gm_client: GoogleMaps client sending the searches
+    :type gm_client: googlemaps.Client
+    '''
+
+    def __init__(self, fixture: Fixture, gm_client: googlemaps.Client):
+        self.fixture = fixture
+        self.gm_client = gm_client
+
+    def geocode(self, search_string: str, **kwargs) -> list:
+        result = self.gm_client.geocode(search_string, **kwargs)
+        self.fixture.record_geocode(search_string, result)
+
+        return result
+
+
+class ReplayGeocoder:
+    '''Stand-in for a GoogleMaps client answering every search with its
+    recorded result.
+
+    :param fixture: Fixture with the recorded results
+    :type fixture: Fixture
+    '''
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+
+    def geocode(self, search_string: str, **kwargs) -> list:
+        return self.fixture.geocode(search_string)
+
+
+class _FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _answer(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+
+        try:
+            recorded = self.server.fixture.content(
+                self.headers.get(FixtureServer.KEY_HEADER, '')
+            )
+        except MissingFixture as error:
+            content = str(error).encode()
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/plain')
+        else:
+            content = recorded['content']
+            self.send_response(recorded['status'])
+            for name, value in recorded['headers'].items():
+                self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, format: str, *args):
+        logger.debug(format, *args)
+
+
+class FixtureServer:
+    '''Local HTTP server answering with the responses of a fixture, so that
+    connectors run offline still go through sockets and HTTP parsing.
+
+    Connectors reach it through the transport returned by ``transport``,
+    which sends every request to the server, with the key of the original
+    request in the ``KEY_HEADER`` header.
+
+    :param fixture: Fixture with the recorded responses
+    :type fixture: Fixture
+    :param host: Address the server listens on
+    :type host: str
+    :param port: Port the server listens on. Defaults to any free port
+    :type port: int
+    '''
+    KEY_HEADER = 'X-Fixture-Key'
+
+    def __init__(
+        self,
+        fixture: Fixture,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.server = ThreadingHTTPServer((host, port), _FixtureRequestHandler)
+        self.server.daemon_threads = True
+        self.server.fixture = fixture
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> 'FixtureServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def transport(self, **kwargs) -> HttpTransport:
+        '''Return a transport sending every request to this server.
+
+        Accepts the same keyword arguments as ``HttpTransport``.
+        '''
+        return _ServerTransport(self, **kwargs)
+
+
+class _ServerTransport(HttpTransport):
+    def __init__(self, server: FixtureServer, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs['headers'] = {
+            **(kwargs.get('headers') or {}),
+            FixtureServer.KEY_HEADER: request_key(method, url, **kwargs),
+        }
+
+        return super()._request(
+            method, self.server.url + urlsplit(url).path, **kwargs
+        )
+
+
+def record_source(
+    key: str,
+    path: str,
+    gm_client: Optional[googlemaps.Client] = None,
+    transport: Optional[HttpTransport] = None
+) -> Fixture:
+    '''Get the pubs of a source and record its responses into a fixture.
+
+    :param key: Key of the source in ``uk_pubs.registry.SOURCES``
+    :type key: str
+    :param path: Path of the fixture file
+    :type path: str
+    :param gm_client: GoogleMaps client. If given, the search strings of the
+        pubs are geocoded and their results recorded too
+    :type gm_client: googlemaps.Client, optional
+    :param transport: Transport sending the requests
+    :type transport: HttpTransport, optional
+    :return: The saved fixture
+    :rtype: Fixture
+    '''
+    source = SOURCES[key]
+    fixture = Fixture(path)
+
+    connector = source.connector_class(RecordingTransport(fixture, transport))
+    data = concat_batches(
+        source.process(batch) for batch in connector.iter_batches()
+    )
+    logger.info('Recorded %d pubs of %s', len(data), source.name)
+
+    if gm_client is not None:
+        get_geoinfo(
+            RecordingGeocoder(fixture, gm_client),
+            source.search_strings(data).dropna().unique()
+        )
+
+    fixture.save()
+
+    return fixture
+
+
+def main():
+    '''Command line entry point recording the fixture of a source.'''
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description='Record the responses of a data source (and optionally '
+        'of GoogleMaps) into a fixture, to replay it offline'
+    )
+    parser.add_argument('source', choices=sorted(SOURCES))
+    parser.add_argument(
+        'path',
+        help='Path of the fixture file. Defaults to '
+        'tests/fixtures/<source>.json.gz',
+        nargs='?'
+    )
+    parser.add_argument(
+        '--geocode',
+        help='Also record the GoogleMaps results of the pubs (uses the '
+        'GOOGLEMAPS_KEY environment variable)',
+        action='store_true'
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    gm_client = None
+    if args.geocode:
+        gm_client = googlemaps.Client(os.environ['GOOGLEMAPS_KEY'])
+
+    path = args.path \
+        or os.path.join('tests', 'fixtures', args.source + '.json.gz')
+
+    record_source(args.source, path, gm_client)
@@ -0,0 +1,175 @@
+from typing import Dict, Optional, Sequence
+import logging
+import re
+
+import numpy
+import pandas
+
+from uk_pubs.schema import GEOINFO_COLUMNS
+from uk_pubs.spatial import GridIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+COORDINATES_PATTERN = re.compile(
+    r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$'
+)
+
+
+def is_coordinates(search_strings: pandas.Series) -> pandas.Series:
+    '''Tell which search strings are ``"lat, long"`` coordinates.'''
+    return search_strings.astype(str).str.match(COORDINATES_PATTERN)
+
+
+class ReverseGeocoder:
+    '''Offline reverse geocoder: resolves ``"lat, long"`` search strings to
+    the locality of the nearest postcode of a reference file, such as an
+    extract of the ONS Postcode Directory (ONSPD).
+
+    The ONSPD gives the country of each postcode, as a code, but no town or
+    county names: ``City`` and ``Region`` (e.g. the post town and the county,
+    as GoogleMaps' ``postal_town`` and ``administrative_area_level_2``) must
+    be joined to the extract beforehand, or they are left empty.
+
+    :param reference: One row per postcode, with at least ``PostalCode``,
+        ``Lat`` and ``Long`` columns, and optionally ``City``, ``Region``,
+        ``State`` and ``Country``
+    :type reference: pandas.DataFrame
+    :param max_distance: Coordinates farther than this from every postcode, in
+        km, are left unresolved
+    :type max_distance: float
+    :param cell_size: Side of the spatial index's cells, in km. Derived from
+        the density of the postcodes if not given
+    :type cell_size: float, optional
+    '''
+    # Column names of the ONSPD and their equivalent in the reference data
+    ONSPD_COLUMNS = {
+        'pcds': 'PostalCode',
+        'lat': 'Lat',
+        'long': 'Long',
+        'ctry': 'State',
+    }
+    # Names of the ONSPD country codes, as GoogleMaps' administrative_area_
+    # level_1, for the countries of the United Kingdom
+    ONSPD_COUNTRIES = {
+        'E92000001': 'England',
+        'N92000002': 'Northern Ireland',
+        'S92000003': 'Scotland',
+        'W92000004': 'Wales',
+    }
+    OUTPUT_COLUMNS = GEOINFO_COLUMNS
+
+    def __init__(
+        self,
+        reference: pandas.DataFrame,
+        max_distance: float = 5.0,
+        cell_size: Optional[float] = None
+    ):
+        self.reference = reference.reset_index(drop=True)
+        self.max_distance = max_distance
+        self.index = GridIndex(
+            self.reference['Lat'].to_numpy(),
+            self.reference['Long'].to_numpy(),
+            cell_size
+        )
+
+        logger.info(
+            'Indexed %d postcodes in cells of %.3f km',
+            len(self.index), self.index.cell_size
+        )
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str,
+        columns: Optional[Dict[str, str]] = None,
+        **kwargs
+    ) -> 'ReverseGeocoder':
+        '''Load the reference data from a CSV file.
+
+        :param path: Path to the CSV file
+        :type path: str
+        :param columns: Names of the file's columns and their equivalent in
+            the reference data. Defaults to ``ONSPD_COLUMNS``; columns already
+            named as in the reference data are always kept. ONSPD country
+            codes in ``State`` are replaced by their name, with ``GB`` as the
+            ``Country``
+        :type columns: dict, optional
+        :return: Reverse geocoder over the file's postcodes
+        :rtype: ReverseGeocoder
+        '''
+        columns = columns or cls.ONSPD_COLUMNS
+        wanted = set(columns) | set(cls.OUTPUT_COLUMNS) | {'doterm'}
+
+        reference = pandas.read_csv(
+            path, usecols=lambda column: column in wanted, dtype=str
+        )
+
+        if 'doterm' in reference.columns:
+            # Terminated postcodes
+            reference = reference[reference['doterm'].isna()]
+            del reference['doterm']
+
+        reference = reference.rename(columns=columns)
+        reference[['Lat', 'Long']] = reference[['Lat', 'Long']]\
+            .astype('float64')
+        # ONSPD marks postcodes without coordinates with lat 99.999999
+        reference = reference[reference['Lat'].abs() <= 90]
+
+        if 'State' in reference.columns:
+            in_uk = reference['State'].isin(cls.ONSPD_COUNTRIES)
+            reference['State'] = reference['State']\
+                .replace(cls.ONSPD_COUNTRIES)
+            if 'Country' not in reference.columns:
+                reference['Country'] = numpy.where(in_uk, 'GB', None)
+
+        return cls(reference, **kwargs)
+
+    def geoinfo(self, search_strings: Sequence[str]) -> pandas.DataFrame:
+        '''Resolve ``"lat, long"`` search strings, with the same output as
+        ``uk_pubs.utils.get_geoinfo``.
+
+        :param search_strings: any sequence of ``"lat, long"`` strings
+        :type search_strings: Sequence[str]
+        :return: DataFrame with the columns of ``get_geoinfo`` output, indexed
+            by search string
+        :rtype: pandas.DataFrame
+        '''
+        search_strings = pandas.Series(search_strings, dtype=object)
+        strings = search_strings.astype(str)
+        valid = is_coordinates(strings).to_numpy()
+        lat = numpy.full(len(strings), numpy.nan)
+        lng = numpy.full(len(strings), numpy.nan)
+        if valid.any():
+            coordinates = strings[valid]\
+                .str.split(',', n=1, expand=True)\
+                .astype('float64')
+            lat[valid] = coordinates[0].to_numpy()
+            lng[valid] = coordinates[1].to_numpy()
+
+        nearest = numpy.full(len(lat), -1, dtype='int64')
+        distance = numpy.full(len(lat), numpy.inf)
+        nearest[valid], distance[valid] = self.index.nearest(
+            lat[valid], lng[valid], max_distance=self.max_distance
+        )
+        resolved = (nearest >= 0) & (distance <= self.max_distance)
+
+        logger.info(
+            'Resolved %d of %d coordinates offline',
+            resolved.sum(), len(search_strings)
+        )
+
+        # Columns are completed after taking the rows, not over the whole
+        # reference
+        columns = self.reference.columns.intersection(self.OUTPUT_COLUMNS)
+        output = self.reference[columns]\
+            .iloc[numpy.where(resolved, nearest, 0)]\
+            .reset_index(drop=True)\
+            .reindex(columns=self.OUTPUT_COLUMNS)
+        output.loc[~resolved, :] = numpy.nan
+        output['Lat'] = lat
+        output['Long'] = lng
+        output.index = pandas.Index(search_strings, name='SearchString')
+
+        return output
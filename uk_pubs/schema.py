@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional
+
+import numpy
+import pandas
+
+
+# Column types of the clean and geocoded pub records, shared by all sources.
+# Fields repeated across pubs (and across the days of a history) are
+# dictionary-encoded as categories, and float32 coordinates are precise to
+# about a metre
+PUB_SCHEMA = {
+    'Name': 'string',
+    'URL': 'string',
+    'StreetAddress': 'string',
+    'Description': 'string',
+    'AnnualRent': 'float64',
+    'Lat': 'float32',
+    'Long': 'float32',
+    'City': 'category',
+    'Region': 'category',
+    'State': 'category',
+    'Country': 'category',
+    'PostalCode': 'category',
+    'FormattedAddress': 'string',
+    'ScrapeDate': 'datetime64[ns]',
+    'Source': 'category',
+    'PubKey': 'string',
+    'PubId': 'string',
+}
+
+# Columns of the geo information added to the pubs by the geocoders
+GEOINFO_COLUMNS = [
+    'Lat',
+    'Long',
+    'StreetAddress',
+    'City',
+    'Region',
+    'State',
+    'Country',
+    'PostalCode',
+    'FormattedAddress',
+]
+
+
+def apply_schema(
+    data: pandas.DataFrame,
+    schema: Optional[Dict[str, str]]
+) -> pandas.DataFrame:
+    '''Cast the columns of a DataFrame to the types declared in a schema.
+
+    Columns missing from the data are ignored, and columns missing from the
+    schema keep their type.
+
+    :param data: Data to be cast
+    :type data: pandas.DataFrame
+    :param schema: Column types by column name
+    :type schema: dict, optional
+    :return: Data with the declared column types
+    :rtype: pandas.DataFrame
+    '''
+    if not schema:
+        return data
+
+    dtypes = {
+        column: dtype for column, dtype in schema.items()
+        if column in data.columns and str(data[column].dtype) != dtype
+    }
+
+    return data.astype(dtypes) if dtypes else data
+
+
+def conform(data: pandas.DataFrame) -> pandas.DataFrame:
+    '''Cast the columns of pub records to the canonical ``PUB_SCHEMA``, as
+    every data processor returns them.
+
+    :param data: Pub records, with any of the ``PUB_SCHEMA`` columns
+    :type data: pandas.DataFrame
+    :return: The records with the canonical column types
+    :rtype: pandas.DataFrame
+    '''
+    return apply_schema(data, PUB_SCHEMA)
+
+
+def unify_categories(
+    batches: List[pandas.DataFrame]
+) -> List[pandas.DataFrame]:
+    '''Give the categorical columns of batches the same categories, so they
+    stay categorical once concatenated.
+
+    :param batches: Batches with the same columns
+    :type batches: List[pandas.DataFrame]
+    :return: The batches, with the union of the categories of each
+        categorical column
+    :rtype: List[pandas.DataFrame]
+    '''
+    columns = [
+        column for column, dtype in batches[0].dtypes.items()
+        if isinstance(dtype, pandas.CategoricalDtype)
+        and all(
+            column in batch.columns
+            and isinstance(batch[column].dtype, pandas.CategoricalDtype)
+            for batch in batches
+        )
+    ]
+    if len(batches) < 2 or not columns:
+        return batches
+
+    # Categories built from text columns are text, others are objects
+    categories = {
+        column: pandas.Index(pandas.unique(numpy.concatenate([
+            batch[column].cat.categories.to_numpy(dtype=object)
+            for batch in batches
+        ])))
+        for column in columns
+    }
+
+    return [
+        batch.assign(**{
+            column: batch[column].cat.set_categories(categories[column])
+            for column in columns
+        })
+        for batch in batches
+    ]
@@ -0,0 +1,301 @@
+from typing import Dict, Optional, Tuple
+
+import numpy
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = numpy.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(
+    lat1: numpy.ndarray,
+    lng1: numpy.ndarray,
+    lat2: numpy.ndarray,
+    lng2: numpy.ndarray
+) -> numpy.ndarray:
+    '''Great-circle distance between pairs of points, in km.'''
+    lat1, lng1, lat2, lng2 = (
+        numpy.radians(numpy.asarray(values, dtype='float64'))
+        for values in (lat1, lng1, lat2, lng2)
+    )
+    a = numpy.sin((lat2 - lat1) / 2) ** 2 \
+        + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lng2 - lng1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1)))
+
+
+class GridIndex:
+    '''Spatial index of points on a regular grid of square cells.
+
+    Points are projected onto a plane (equirectangular projection centred on
+    the points' mean latitude, accurate enough at the scale of a country) and
+    sorted by cell, so the points of any cell are a contiguous slice found by
+    binary search. Queries are answered for whole arrays of points at once,
+    in chunks bounding the memory they take.
+
+    :param lat: Latitudes of the indexed points, in degrees
+    :type lat: numpy.ndarray
+    :param lng: Longitudes of the indexed points, in degrees
+    :type lng: numpy.ndarray
+    :param cell_size: Side of the grid cells, in km. If not given, it is
+        derived from the density of the points (see ``fit_cell_size``)
+    :type cell_size: float, optional
+    '''
+    # Number of points in the cell of a typical point aimed at by
+    # ``fit_cell_size``, and the smallest cell it gives, in km
+    CELL_POINTS = 4
+    MIN_CELL_SIZE = 0.01
+    # Most cells looked up at once by ``nearest``
+    MAX_CELLS_PER_CHUNK = 2 ** 21
+
+    def __init__(
+        self,
+        lat: numpy.ndarray,
+        lng: numpy.ndarray,
+        cell_size: Optional[float] = None
+    ):
+        lat = numpy.asarray(lat, dtype='float64')
+        lng = numpy.asarray(lng, dtype='float64')
+
+        self.cos_lat = numpy.cos(numpy.radians(lat.mean())) if len(lat) else 1
+
+        x, y = self.project(lat, lng)
+        self.cell_size = cell_size or self.fit_cell_size(x, y)
+        cells = self._cells(x, y)
+
+        self.order = numpy.argsort(cells, kind='stable')
+        self.lat = lat[self.order]
+        self.lng = lng[self.order]
+        self.x = x[self.order]
+        self.y = y[self.order]
+        self.cell_ids, self.cell_starts, self.cell_counts = numpy.unique(
+            cells[self.order], return_index=True, return_counts=True
+        )
+
+    # Attributes saved by ``state``
+    STATE = (
+        'cell_size', 'cos_lat', 'order', 'lat', 'lng', 'x', 'y',
+        'cell_ids', 'cell_starts', 'cell_counts',
+    )
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def state(self) -> Dict[str, numpy.ndarray]:
+        '''Return the arrays of the index, e.g. to save them with
+        ``numpy.savez``.
+        '''
+        return {
+            name: numpy.asarray(getattr(self, name)) for name in self.STATE
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, numpy.ndarray]) -> 'GridIndex':
+        '''Rebuild an index from its ``state``, without sorting its points
+        again.
+        '''
+        index = cls.__new__(cls)
+        for name in cls.STATE:
+            setattr(index, name, state[name])
+        index.cell_size = float(index.cell_size)
+        index.cos_lat = float(index.cos_lat)
+
+        return index
+
+    def project(
+        self,
+        lat: numpy.ndarray,
+        lng: numpy.ndarray
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''Project points to the index's plane, in km.'''
+        return (
+            numpy.asarray(lng, dtype='float64') * KM_PER_DEGREE * self.cos_lat,
+            numpy.asarray(lat, dtype='float64') * KM_PER_DEGREE
+        )
+
+    @classmethod
+    def fit_cell_size(cls, x: numpy.ndarray, y: numpy.ndarray) -> float:
+        '''Size of the cells such that the cell of a typical point (i.e. the
+        mean over the points, so that dense areas weigh as much as their
+        points) has about ``CELL_POINTS`` points.
+
+        The size starts from the mean density over the bounding box, and is
+        halved until the dense areas are split finely enough.
+
+        :param x: Projected x coordinates of the points, in km
+        :type x: numpy.ndarray
+        :param y: Projected y coordinates of the points, in km
+        :type y: numpy.ndarray
+        :return: Side of the cells, in km
+        :rtype: float
+        '''
+        if len(x) == 0:
+            return 1.0
+
+        area = max(numpy.ptp(x) * numpy.ptp(y), cls.MIN_CELL_SIZE ** 2)
+        cell_size = max(
+            numpy.sqrt(area * cls.CELL_POINTS / len(x)), cls.MIN_CELL_SIZE
+        )
+
+        while cell_size > cls.MIN_CELL_SIZE:
+            cells = cls._cell_id(
+                numpy.floor(x / cell_size).astype('int64'),
+                numpy.floor(y / cell_size).astype('int64')
+            )
+            _, counts = numpy.unique(cells, return_counts=True)
+            if (counts.astype('float64') ** 2).sum() / len(x) \
+                    <= cls.CELL_POINTS:
+                break
+            cell_size = max(cell_size / 2, cls.MIN_CELL_SIZE)
+
+        return float(cell_size)
+
+    def _cell_coordinates(
+        self,
+        x: numpy.ndarray,
+        y: numpy.ndarray
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        return (
+            numpy.floor(x / self.cell_size).astype('int64'),
+            numpy.floor(y / self.cell_size).astype('int64')
+        )
+
+    @staticmethod
+    def _cell_id(cx: numpy.ndarray, cy: numpy.ndarray) -> numpy.ndarray:
+        # Cells of points anywhere on Earth fit in 2 ** 32 columns
+        return (cx << 32) + (cy + 2 ** 31)
+
+    def _cells(self, x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+        return self._cell_id(*self._cell_coordinates(x, y))
+
+    def candidates(
+        self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        radius: int
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''Return the points in the cells up to ``radius`` cells away from each
+        query point, as pairs of (query position, position in the index).
+        '''
+        cx, cy = self._cell_coordinates(x, y)
+        offsets = numpy.arange(-radius, radius + 1)
+        dx, dy = numpy.meshgrid(offsets, offsets)
+
+        neighbours = self._cell_id(
+            cx[:, None] + dx.ravel()[None, :],
+            cy[:, None] + dy.ravel()[None, :]
+        ).ravel()
+        queries = numpy.repeat(numpy.arange(len(x)), dx.size)
+
+        position = numpy.searchsorted(self.cell_ids, neighbours)
+        position = numpy.minimum(position, len(self.cell_ids) - 1)
+        found = self.cell_ids[position] == neighbours
+
+        starts = self.cell_starts[position[found]]
+        counts = self.cell_counts[position[found]]
+        queries = numpy.repeat(queries[found], counts)
+
+        # Positions start, start + 1, ..., start + count - 1 of each cell
+        shifts = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts)
+        points = numpy.arange(counts.sum()) + shifts
+
+        return queries, points
+
+    def _nearest_candidates(
+        self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        radius: int
+    ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # Nearest of the candidates of each query with any, as (query
+        # position, position in the index, squared distance)
+        queries, points = self.candidates(x, y, radius)
+        if len(queries) == 0:
+            return queries, points, numpy.empty(0)
+
+        d2 = (self.x[points] - x[queries]) ** 2 \
+            + (self.y[points] - y[queries]) ** 2
+
+        # Candidates are grouped by query: take the first minimum of each
+        # group
+        starts = numpy.flatnonzero(numpy.diff(queries, prepend=-1))
+        minimums = numpy.minimum.reduceat(d2, starts)
+        is_minimum = d2 == numpy.repeat(
+            minimums, numpy.diff(starts, append=len(d2))
+        )
+        candidates = numpy.flatnonzero(is_minimum)
+        best = candidates[
+            numpy.flatnonzero(numpy.diff(queries[candidates], prepend=-1))
+        ]
+
+        return queries[starts], points[best], d2[best]
+
+    def nearest(
+        self,
+        lat: numpy.ndarray,
+        lng: numpy.ndarray,
+        max_radius: int = 64,
+        max_distance: float = numpy.inf
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''Find the nearest indexed point of each query point.
+
+        Query points are first matched against the points of their own and
+        neighbouring cells; those whose match is not guaranteed to be the
+        nearest are retried over wider rings of cells, up to ``max_radius``
+        cells, and finally against every point. Queries are processed in
+        chunks of at most ``MAX_CELLS_PER_CHUNK`` cells.
+
+        :param max_radius: Widest ring of cells searched before comparing
+            with every point
+        :type max_radius: int
+        :param max_distance: Query points farther than this from every point,
+            in km, are left without a nearest point
+        :type max_distance: float
+        :return: Position of the nearest point in the arrays used to build the
+            index (-1 if the index is empty, or if it is farther than
+            ``max_distance``) and its distance, in km
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        '''
+        x, y = self.project(lat, lng)
+        nearest = numpy.full(len(x), -1, dtype='int64')
+        distance = numpy.full(len(x), numpy.inf)
+
+        if len(self) == 0:
+            return nearest, distance
+
+        # Queries sorted by cell look up neighbouring cells in order
+        pending = numpy.argsort(self._cells(x, y), kind='stable')
+        radius = 1
+        while len(pending) and radius <= max_radius:
+            chunk_size = max(
+                self.MAX_CELLS_PER_CHUNK // (2 * radius + 1) ** 2, 1
+            )
+            for start in range(0, len(pending), chunk_size):
+                chunk = pending[start:start + chunk_size]
+                queries, points, d2 = self._nearest_candidates(
+                    x[chunk], y[chunk], radius
+                )
+                nearest[chunk[queries]] = points
+                distance[chunk[queries]] = numpy.sqrt(d2)
+
+            # Points beyond the ring are at least radius cells away, and
+            # farther than max_distance once the ring reaches it
+            reach = radius * self.cell_size
+            pending = pending[distance[pending] > reach]
+            if reach >= max_distance:
+                pending = pending[:0]
+            radius *= 2
+
+        for query in pending:
+            d2 = (self.x - x[query]) ** 2 + (self.y - y[query]) ** 2
+            nearest[query] = d2.argmin()
+            distance[query] = numpy.sqrt(d2[nearest[query]])
+
+        too_far = distance > max_distance
+        nearest[too_far] = -1
+        distance[too_far] = numpy.inf
+
+        found = nearest >= 0
+        nearest[found] = self.order[nearest[found]]
+
+        return nearest, distance
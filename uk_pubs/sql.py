@@ -0,0 +1,525 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+import abc
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas
+
+
+logger = logging.getLogger(__name__)
+
+
+class TableLocation(NamedTuple):
+    '''Location of a SQL table.'''
+    server: str
+    database: str
+    schema: str
+    table: str
+
+
+def parse_table(description: str) -> TableLocation:
+    '''Parse a full table description, ``SERVER/DATABASE.SCHEMA.TABLE``.
+
+    The server ``sqlite`` stands for a local SQLite database, whose file is
+    given as the database (e.g. ``sqlite/data/pubs.db.main.pubs``).
+
+    :param description: Full description of the table
+    :type description: str
+    :raises ValueError: If the description is not in the expected format
+    :return: Location of the table
+    :rtype: TableLocation
+    '''
+    server, _, path = description.partition('/')
+    parts = path.rsplit('.', 2)
+    if not server or len(parts) != 3 or not all(parts):
+        raise ValueError(
+            'Bad SQL table "%s". Format: SERVER/DATABASE.SCHEMA.TABLE'
+            % description
+        )
+
+    return TableLocation(server, *parts)
+
+
+class ConnectionPool:
+    '''Pool of DB-API connections, opened on demand and reused.
+
+    :param connect: Function opening a new connection
+    :type connect: Callable
+    :param size: Maximum number of open connections
+    :type size: int
+    '''
+
+    def __init__(self, connect: Callable, size: int = 4):
+        self.connect = connect
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        '''Borrow a connection, waiting for one if all of them are in use.
+
+        The connection is rolled back if the block raises.
+        '''
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            connection = self.connect() if can_open else self._idle.get()
+
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+
+    def __enter__(self) -> 'ConnectionPool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Dialect(abc.ABC):
+    '''SQL statements of a database engine used by ``SqlLoader``.'''
+    PLACEHOLDER = '?'
+    TYPES = {}
+    KEY_TYPE = ''
+    # Pool size used when none is given
+    POOL_SIZE = 4
+
+    def quote(self, name: str) -> str:
+        return '"%s"' % name.replace('"', '""')
+
+    def table(self, schema: str, table: str) -> str:
+        return '%s.%s' % (self.quote(schema), self.quote(table))
+
+    def column_type(self, dtype: str) -> str:
+        return self.TYPES.get(dtype, self.TYPES['string'])
+
+    def dates(self, values: pandas.Series) -> pandas.Series:
+        '''Convert a datetime column to the values sent for it.'''
+        return values.dt.date
+
+    def create_table(
+        self,
+        table: str,
+        columns: Dict[str, str],
+        key: Optional[str] = None
+    ) -> str:
+        definitions = ', '.join(
+            '%s %s' % (
+                self.quote(column),
+                self.KEY_TYPE if column == key else self.column_type(dtype)
+            )
+            for column, dtype in columns.items()
+        )
+        if key is not None:
+            definitions += ', PRIMARY KEY (%s)' % self.quote(key)
+
+        return self._create_if_missing(table, definitions)
+
+    def _create_if_missing(self, table: str, definitions: str) -> str:
+        return 'CREATE TABLE IF NOT EXISTS %s (%s)' % (table, definitions)
+
+    def select_none(self, table: str) -> str:
+        '''Select no rows, to read the columns of a table.'''
+        return 'SELECT * FROM %s WHERE 1 = 0' % table
+
+    def add_column(self, table: str, column: str, dtype: str) -> str:
+        return 'ALTER TABLE %s ADD COLUMN %s %s' % (
+            table, self.quote(column), self.column_type(dtype)
+        )
+
+    def insert(self, table: str, columns: Iterable[str]) -> str:
+        columns = list(columns)
+
+        return 'INSERT INTO %s (%s) VALUES (%s)' % (
+            table,
+            ', '.join(map(self.quote, columns)),
+            ', '.join([self.PLACEHOLDER] * len(columns))
+        )
+
+    @abc.abstractmethod
+    def upsert(
+        self,
+        target: str,
+        staging: str,
+        columns: Iterable[str],
+        key: str,
+        condition: str
+    ) -> str:
+        '''Insert or update the rows of the staging table matching the
+        condition into the target table.
+        '''
+
+    def delete(
+        self,
+        target: str,
+        staging: str,
+        key: str,
+        condition: str
+    ) -> str:
+        return 'DELETE FROM %s WHERE %s IN (SELECT %s FROM %s WHERE %s)' % (
+            target, self.quote(key), self.quote(key), staging, condition
+        )
+
+    def drop_table(self, table: str) -> str:
+        return 'DROP TABLE IF EXISTS %s' % table
+
+
+class SqliteDialect(Dialect):
+    '''SQLite, used to run the loads locally.'''
+    TYPES = {
+        'string': 'TEXT',
+        'float64': 'REAL',
+        'float32': 'REAL',
+        'datetime64[ns]': 'TEXT',
+    }
+    KEY_TYPE = 'TEXT NOT NULL'
+    # SQLite allows a single writer at a time
+    POOL_SIZE = 1
+
+    def dates(self, values: pandas.Series) -> pandas.Series:
+        # SQLite has no date type: dates are stored as ISO text
+        return values.dt.strftime('%Y-%m-%d')
+
+    def upsert(
+        self,
+        target: str,
+        staging: str,
+        columns: Iterable[str],
+        key: str,
+        condition: str
+    ) -> str:
+        columns = list(map(self.quote, columns))
+
+        # The WHERE clause is required to tell ON CONFLICT from a join
+        return (
+            'INSERT INTO %s (%s) SELECT %s FROM %s WHERE %s '
+            'ON CONFLICT (%s) DO UPDATE SET %s'
+        ) % (
+            target,
+            ', '.join(columns),
+            ', '.join(columns),
+            staging,
+            condition,
+            self.quote(key),
+            ', '.join(
+                '%s = excluded.%s' % (column, column) for column in columns
+            )
+        )
+
+
+class SqlServerDialect(Dialect):
+    '''Microsoft SQL Server, through pyodbc.'''
+    TYPES = {
+        'string': 'NVARCHAR(MAX)',
+        'float64': 'FLOAT',
+        'float32': 'FLOAT',
+        'datetime64[ns]': 'DATE',
+    }
+    # Primary keys cannot be NVARCHAR(MAX)
+    KEY_TYPE = 'NVARCHAR(450) NOT NULL'
+
+    def quote(self, name: str) -> str:
+        return '[%s]' % name.replace(']', ']]')
+
+    def _create_if_missing(self, table: str, definitions: str) -> str:
+        return 'IF OBJECT_ID(N\'%s\', N\'U\') IS NULL CREATE TABLE %s (%s)' \
+            % (table.replace('\'', '\'\''), table, definitions)
+
+    def add_column(self, table: str, column: str, dtype: str) -> str:
+        return 'ALTER TABLE %s ADD %s %s' % (
+            table, self.quote(column), self.column_type(dtype)
+        )
+
+    def upsert(
+        self,
+        target: str,
+        staging: str,
+        columns: Iterable[str],
+        key: str,
+        condition: str
+    ) -> str:
+        columns = list(map(self.quote, columns))
+
+        return (
+            'MERGE %s WITH (HOLDLOCK) AS target '
+            'USING (SELECT * FROM %s WHERE %s) AS source '
+            'ON target.%s = source.%s '
+            'WHEN MATCHED THEN UPDATE SET %s '
+            'WHEN NOT MATCHED BY TARGET THEN INSERT (%s) VALUES (%s);'
+        ) % (
+            target,
+            staging,
+            condition,
+            self.quote(key),
+            self.quote(key),
+            ', '.join(
+                'target.%s = source.%s' % (column, column)
+                for column in columns
+            ),
+            ', '.join(columns),
+            ', '.join('source.' + column for column in columns)
+        )
+
+
+class SqlLoader:
+    '''Bulk loader of pubs into a SQL table.
+
+    Rows are inserted in chunks into a staging table, through the pool's
+    connections, and then merged into the target table with a single
+    set-based upsert (and a single delete for the removed pubs).
+
+    :param pool: Connections to the database
+    :type pool: ConnectionPool
+    :param dialect: SQL dialect of the database
+    :type dialect: Dialect
+    :param schema: Schema of the target table
+    :type schema: str
+    :param table: Name of the target table
+    :type table: str
+    :param key: Column identifying each row of the target table
+    :type key: str
+    :param chunk_size: Number of rows sent to the staging table at once
+    :type chunk_size: int
+    '''
+    # Column of the staging table telling the rows to upsert and to delete
+    ACTION_COLUMN = 'LoadAction'
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        dialect: Dialect,
+        schema: str,
+        table: str,
+        key: str = 'PubKey',
+        chunk_size: int = 10_000
+    ):
+        self.pool = pool
+        self.dialect = dialect
+        self.schema = schema
+        self.table = table
+        self.key = key
+        self.chunk_size = chunk_size
+
+    def load(
+        self,
+        data: pandas.DataFrame,
+        deleted_keys: Iterable[str] = (),
+        column_types: Optional[Dict[str, str]] = None
+    ) -> int:
+        '''Upsert rows into the target table and delete the rows of some keys.
+
+        The target table is created if it does not exist, and the columns
+        of the data it does not have yet are added to it.
+
+        :param data: Rows to be inserted or updated, with a ``key`` column
+        :type data: pandas.DataFrame
+        :param deleted_keys: Keys of the rows to be deleted
+        :type deleted_keys: Iterable[str]
+        :param column_types: Types (such as ``string``, ``float64`` or
+            ``datetime64[ns]``) of the columns, by column name. Columns not
+            listed, or of other types (e.g. ``category``), are strings
+        :type column_types: dict, optional
+        :return: Number of rows sent to the database
+        :rtype: int
+        '''
+        column_types = column_types or {}
+        columns = {
+            column: column_types.get(column, 'string')
+            for column in data.columns
+        }
+        deleted_keys = list(deleted_keys)
+        staged = data.assign(**{self.ACTION_COLUMN: 'upsert'})
+        if deleted_keys:
+            staged = pandas.concat(
+                [
+                    staged,
+                    pandas.DataFrame({
+                        self.key: deleted_keys,
+                        self.ACTION_COLUMN: 'delete',
+                    }),
+                ],
+                ignore_index=True
+            )
+        # MERGE fails on duplicated keys: the last row of each key wins
+        staged = staged[staged[self.key].notna()]\
+            .drop_duplicates(self.key, keep='last')
+
+        target = self.dialect.table(self.schema, self.table)
+        staging = self.dialect.table(
+            self.schema, '%s_staging_%s' % (self.table, uuid.uuid4().hex[:8])
+        )
+        action = '%s = \'%%s\'' % self.dialect.quote(self.ACTION_COLUMN)
+
+        start = time.perf_counter()
+        with self.pool.connection() as connection:
+            self._execute(
+                connection,
+                self.dialect.create_table(target, columns, self.key)
+            )
+            self._add_missing_columns(connection, target, columns)
+            self._execute(
+                connection,
+                self.dialect.create_table(
+                    staging, {**columns, self.ACTION_COLUMN: 'string'}
+                )
+            )
+        try:
+            self._stage(staged, staging)
+            staged_at = time.perf_counter()
+
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(self.dialect.upsert(
+                    target, staging, columns, self.key, action % 'upsert'
+                ))
+                cursor.execute(self.dialect.delete(
+                    target, staging, self.key, action % 'delete'
+                ))
+                connection.commit()
+        finally:
+            with self.pool.connection() as connection:
+                self._execute(connection, self.dialect.drop_table(staging))
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            'Loaded %d rows into %s in %.1fs (%.0f rows/s; staging took '
+            '%.1fs, merging %.1fs)',
+            len(staged), target, elapsed, len(staged) / max(elapsed, 1e-9),
+            staged_at - start, elapsed - (staged_at - start)
+        )
+
+        return len(staged)
+
+    def _add_missing_columns(
+        self,
+        connection,
+        table: str,
+        columns: Dict[str, str]
+    ):
+        cursor = connection.cursor()
+        cursor.execute(self.dialect.select_none(table))
+        existing = {description[0] for description in cursor.description}
+        cursor.fetchall()
+
+        missing = [column for column in columns if column not in existing]
+        for column in missing:
+            cursor.execute(
+                self.dialect.add_column(table, column, columns[column])
+            )
+        connection.commit()
+
+        if missing:
+            logger.info(
+                'Added columns to %s: %s', table, ', '.join(missing)
+            )
+
+    def _stage(self, staged: pandas.DataFrame, staging: str):
+        statement = self.dialect.insert(staging, staged.columns)
+        staged = staged.assign(**{
+            column: self.dialect.dates(staged[column])
+            for column in staged.columns
+            if pandas.api.types.is_datetime64_any_dtype(staged[column])
+        })
+        # Missing values must be sent as NULL
+        rows = staged.astype(object)\
+            .where(staged.notna(), None)\
+            .itertuples(index=False, name=None)
+        rows = list(rows)
+        chunks = [
+            rows[start:start + self.chunk_size]
+            for start in range(0, len(rows), self.chunk_size)
+        ]
+
+        def insert(chunk: list):
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                if hasattr(cursor, 'fast_executemany'):
+                    # pyodbc: send each chunk as a single parameter array
+                    cursor.fast_executemany = True
+                cursor.executemany(statement, chunk)
+                connection.commit()
+
+        with ThreadPoolExecutor(self.pool.size) as executor:
+            # Consume the results to raise the first error
+            list(executor.map(insert, chunks))
+
+    @staticmethod
+    def _execute(connection, statement: str):
+        connection.cursor().execute(statement)
+        connection.commit()
+
+
+def connect(location: TableLocation) -> Callable:
+    '''Return a function opening connections to the database of a table.
+
+    SQL Server connections use pyodbc, with the ODBC driver named by the
+    ``SQL_DRIVER`` environment variable, and the credentials in
+    ``SQL_USERNAME`` and ``SQL_PASSWORD`` (or Windows authentication if they
+    are not set).
+    '''
+    if location.server == 'sqlite':
+        return lambda: sqlite3.connect(
+            location.database, check_same_thread=False
+        )
+
+    try:
+        import pyodbc
+    except ImportError:
+        raise ImportError(
+            'Loading data into SQL Server requires pyodbc. Install it with '
+            '`pip install uk-pubs[sql]`'
+        )
+
+    connection_string = 'DRIVER={%s};SERVER=%s;DATABASE=%s;' % (
+        os.environ.get('SQL_DRIVER', 'ODBC Driver 17 for SQL Server'),
+        location.server,
+        location.database
+    )
+    if os.environ.get('SQL_USERNAME'):
+        connection_string += 'UID=%s;PWD=%s;' % (
+            os.environ['SQL_USERNAME'], os.environ.get('SQL_PASSWORD', '')
+        )
+    else:
+        connection_string += 'Trusted_Connection=yes;'
+
+    return lambda: pyodbc.connect(connection_string)
+
+
+def get_loader(description: str, chunk_size: int = 10_000) -> SqlLoader:
+    '''Create the loader of a table from its full description (see
+    ``parse_table``).
+    '''
+    location = parse_table(description)
+    dialect = SqliteDialect() if location.server == 'sqlite' \
+        else SqlServerDialect()
+    pool = ConnectionPool(connect(location), dialect.POOL_SIZE)
+
+    return SqlLoader(
+        pool, dialect, location.schema, location.table, chunk_size=chunk_size
+    )
@@ -1,13 +1,89 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date
+from typing import Iterator, List, Optional, Tuple
 import logging
+import threading
+import time
 
 import pandas
-import requests
+
+from uk_pubs.batches import (
+    DEFAULT_BATCH_SIZE,
+    chunks,
+    concat_batches,
+    flat_keys,
+    make_batch,
+)
+from uk_pubs.fastjson import loads, project
+from uk_pubs.schema import apply_schema
+from uk_pubs.transport import HttpTransport, get_default_transport
 
 
 logger = logging.getLogger(__name__)
 
 
+class IncompleteResults(RuntimeError):
+    '''The pages received do not add up to the number of results announced
+    by the source.
+    '''
+
+
+class PageSizer:
+    '''Size of the pages requested to a server, adapted so that each page
+    takes about ``target_time`` seconds to be answered.
+
+    :param size: Size of the first page
+    :type size: int
+    :param min_size: Smallest page size
+    :type min_size: int
+    :param max_size: Largest page size
+    :type max_size: int
+    :param target_time: Response time aimed at, in seconds
+    :type target_time: float
+    '''
+    # Largest change of the page size after a single response
+    MAX_FACTOR = 2.0
+
+    def __init__(
+        self,
+        size: int,
+        min_size: int,
+        max_size: int,
+        target_time: float
+    ):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_time = target_time
+        self._lock = threading.Lock()
+
+    def update(self, size: int, elapsed: float):
+        '''Adapt the page size to the response time of a page.
+
+        :param size: Number of results of the page
+        :type size: int
+        :param elapsed: Time the page took, in seconds
+        :type elapsed: float
+        '''
+        factor = self.target_time / max(elapsed, 1e-3)
+        factor = min(max(factor, 1 / self.MAX_FACTOR), self.MAX_FACTOR)
+
+        with self._lock:
+            self.size = int(min(
+                max(size * factor, self.min_size), self.max_size
+            ))
+
+    def limit(self, max_size: int):
+        '''Never request more than ``max_size`` results (e.g. once the server
+        is found to truncate larger pages).
+        '''
+        with self._lock:
+            self.max_size = max(min(self.max_size, max_size), 1)
+            self.min_size = min(self.min_size, self.max_size)
+            self.size = min(self.size, self.max_size)
+
+
 class StonegateConnector:
     '''Connector with Stonegate data source on pubs in the UK.'''
     URL = 'https://www.stonegatepubpartners.co.uk/' \
@@ -23,17 +99,277 @@ class StonegateConnector:
         'longitude': -100,
         'maxDistance': 10000,
         'sortBy': 'distance',
-        'skip': 0,
-        'take': 10000,
-        'maxRows': 10000
     }
+    # Field of the responses with the number of results. Not confirmed
+    # against a live response: without it, pages are requested until the
+    # first empty one
+    TOTAL_FIELD = 'TotalRows'
+    # Most results expected without their number, past which the server is
+    # taken to ignore the skip of the pages
+    MAX_RESULTS = 100_000
+    # Number of pubs of the first page, and bounds of the adapted page sizes
+    PAGE_SIZE = 500
+    MIN_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 5000
+    # Response time aimed at by the adapted page sizes, in seconds
+    TARGET_PAGE_TIME = 2.0
+    # Fields used by StonegateDataProcessor, read by the fast JSON path
+    FIELDS = {
+        'GuideRent': ('GuideRent',),
+        'PubName': ('PubName',),
+        'PubLinkUrl': ('PubLinkUrl',),
+        'Latitude': ('Latitude',),
+        'Longitude': ('Longitude',),
+        'PubAddress': ('PubAddress',),
+        'Postcode': ('Postcode',),
+    }
+    RAW_SCHEMA = {
+        'PubName': 'string',
+        'PubLinkUrl': 'string',
+        'Latitude': 'float64',
+        'Longitude': 'float64',
+        'PubAddress': 'string',
+        'Postcode': 'string',
+        'ScrapeDate': 'string',
+    }
+
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        '''Create the connector.
+
+        :param transport: HTTP transport used to reach the source. Defaults
+            to the transport shared by all connectors
+        :type transport: HttpTransport, optional
+        '''
+        self.transport = transport or get_default_transport()
+
+    def fetch_page(
+        self,
+        skip: int,
+        take: int,
+        fast_json: bool = False
+    ) -> dict:
+        '''Get a page of the search results.
+
+        Pages are not cached, as their bounds change from run to run with
+        the adapted page sizes.
+
+        :param skip: Number of results before the page
+        :type skip: int
+        :param take: Number of results of the page
+        :type take: int
+        :param fast_json: Decode the response with orjson (if installed)
+        :type fast_json: bool
+        :return: The decoded response, with the pubs in ``Results``
+        :rtype: dict
+        '''
+        response = self.transport.post(
+            self.URL,
+            json={**self.DATA, 'skip': skip, 'take': take, 'maxRows': take}
+        )
+
+        return loads(response.content) if fast_json else response.json()
 
-    def get(self) -> pandas.DataFrame:
-        '''TODO: Doc'''
+    def _fetch_timed(
+        self,
+        skip: int,
+        take: int,
+        fast_json: bool
+    ) -> Tuple[dict, float]:
+        start = time.perf_counter()
+        content = self.fetch_page(skip, take, fast_json)
+
+        return content, time.perf_counter() - start
+
+    def iter_pages(
+        self,
+        max_in_flight: Optional[int] = None,
+        fast_json: bool = False
+    ) -> Iterator[List[dict]]:
+        '''Get the pubs page by page, as the pages arrive.
+
+        The first page tells the number of results, and the others are then
+        requested concurrently. Without the number of results, pages are
+        requested until the first empty one, which marks the end of the
+        results. The size of the pages is adapted to the response time of
+        the server (see ``PageSizer``), and the part of the pages the server
+        truncated is requested again.
+
+        :param max_in_flight: Maximum number of pages requested concurrently.
+            If not given, pages are requested one at a time
+        :type max_in_flight: int, optional
+        :param fast_json: Decode the responses with orjson (if installed)
+        :type fast_json: bool
+        :return: Iterator over the pubs of each non-empty page
+        :rtype: Iterator[List[dict]]
+        :raises IncompleteResults: If the pubs received do not add up to the
+            number of results, or to the end of the results (which must come
+            before ``MAX_RESULTS``)
+        '''
+        sizer = PageSizer(
+            self.PAGE_SIZE, self.MIN_PAGE_SIZE, self.MAX_PAGE_SIZE,
+            self.TARGET_PAGE_TIME
+        )
+        take = sizer.size
+        content, elapsed = self._fetch_timed(0, take, fast_json)
+        total = content.get(self.TOTAL_FIELD)
+
+        if total is None:
+            logger.warning(
+                'Stonegate did not send the number of results in %s (fields: '
+                '%s): getting pages until the first empty one',
+                self.TOTAL_FIELD, ', '.join(content)
+            )
+        else:
+            logger.info('Getting %d pubs from Stonegate', total)
+
+        workers = max(max_in_flight or 1, 1)
+        # Pages answered and not yet handled
+        answered = [(0, take, content, elapsed)]
+        # Ranges of results truncated by the server, to be requested again
+        truncated = deque()
+        # Number of results: the one announced, or the skip of the first
+        # empty page
+        end = total
+        next_skip = take
+        received = 0
+        in_flight = {}
+
+        with ThreadPoolExecutor(workers) as executor:
+            try:
+                while True:
+                    for skip, take, content, elapsed in answered:
+                        records = content['Results']
+                        sizer.update(len(records) or take, elapsed)
+
+                        if not records and total is None:
+                            end = skip if end is None else min(end, skip)
+                        elif not records:
+                            logger.warning(
+                                'Stonegate sent no pubs from %d to %d',
+                                skip, skip + take
+                            )
+                        elif len(records) < (
+                            take if end is None else min(take, end - skip)
+                        ):
+                            # The server caps the size of the pages
+                            sizer.limit(len(records))
+                            truncated.append((
+                                skip + len(records), take - len(records)
+                            ))
+
+                        if records:
+                            yield records
+                        received += len(records)
+
+                    while len(in_flight) < workers:
+                        if truncated:
+                            skip, take = truncated.popleft()
+                            if end is not None and skip >= end:
+                                continue
+                        elif end is None and next_skip >= self.MAX_RESULTS:
+                            raise IncompleteResults(
+                                'Stonegate sent no empty page in its first '
+                                '%d results' % self.MAX_RESULTS
+                            )
+                        elif end is None or next_skip < end:
+                            skip, take = next_skip, sizer.size
+                            next_skip += take
+                        else:
+                            break
+                        if end is not None:
+                            take = min(take, end - skip)
+                        in_flight[executor.submit(
+                            self._fetch_timed, skip, take, fast_json
+                        )] = (skip, take)
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    answered = []
+                    for future in done:
+                        skip, take = in_flight.pop(future)
+                        answered.append((skip, take, *future.result()))
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+        if total is not None and received != total:
+            raise IncompleteResults(
+                'Received %d pubs from Stonegate instead of %d'
+                % (received, total)
+            )
+        if total is None and received != end:
+            raise IncompleteResults(
+                'Received %d pubs from Stonegate, whose results end at %d'
+                % (received, end)
+            )
+
+    def iter_batches(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        fast_json: bool = False,
+        max_in_flight: Optional[int] = None
+    ) -> Iterator[pandas.DataFrame]:
+        '''Get the pubs, in batches typed as the ``RAW_SCHEMA``, as the pages
+        of results arrive (see ``iter_pages``).
+
+        :param batch_size: Largest number of pubs in each batch
+        :type batch_size: int
+        :param fast_json: Decode the responses with orjson (if installed) and
+            keep only the ``FIELDS`` used by the data processor, instead of
+            flattening every field
+        :type fast_json: bool
+        :param max_in_flight: Maximum number of pages requested concurrently.
+            If not given, pages are requested one at a time
+        :type max_in_flight: int, optional
+        :return: Iterator over the batches of pubs
+        :rtype: Iterator[pandas.DataFrame]
+        '''
         logger.info('Getting data from Stonegate at %s', self.URL)
 
-        response = requests.post(self.URL, json=self.DATA)
-        data = pandas.json_normalize(response.json()['Results'])
-        data['ScrapeDate'] = str(date.today())
+        scrape_date = str(date.today())
+        # Every batch has the columns of the schema and of the pages so far
+        columns = None
+
+        for records in self.iter_pages(max_in_flight, fast_json):
+            if not fast_json and columns is None:
+                columns = [
+                    column for column in dict.fromkeys([
+                        *self.RAW_SCHEMA, *flat_keys(records)
+                    ])
+                    if column != 'ScrapeDate'
+                ]
+            elif not fast_json:
+                new_columns = [
+                    column for column in flat_keys(records)
+                    if column not in columns
+                ]
+                if new_columns:
+                    logger.info(
+                        'Stonegate fields missing from earlier pages: %s',
+                        ', '.join(new_columns)
+                    )
+                    columns += new_columns
+
+            for chunk in chunks(records, batch_size):
+                if fast_json:
+                    batch = pandas.DataFrame(project(chunk, self.FIELDS))
+                    batch['ScrapeDate'] = scrape_date
+
+                    yield apply_schema(batch, self.RAW_SCHEMA)
+                else:
+                    yield make_batch(
+                        chunk, self.RAW_SCHEMA, columns,
+                        ScrapeDate=scrape_date
+                    )
 
-        return data
+    def get(
+        self,
+        fast_json: bool = False,
+        max_in_flight: Optional[int] = None
+    ) -> pandas.DataFrame:
+        '''Get all the pubs (see ``iter_batches``).'''
+        return concat_batches(self.iter_batches(
+            fast_json=fast_json, max_in_flight=max_in_flight
+        ))
@@ -1,6 +1,8 @@
 import pandas
 
-from uk_pubs.punch_pubs.constants import NAME
+from uk_pubs.rent import annual_rent
+from uk_pubs.schema import conform
+from uk_pubs.stonegate.constants import NAME
 
 
 class StonegateDataProcessor:
@@ -36,6 +38,7 @@ class StonegateDataProcessor:
             'Postcode': 'PostalCode',
         }, inplace=True)
 
+        output['AnnualRent'] = annual_rent(output['AnnualRent'])
         output['Source'] = NAME
 
-        return output
+        return conform(output)
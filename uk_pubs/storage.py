@@ -0,0 +1,367 @@
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+import abc
+import logging
+import os
+import re
+
+import pandas
+import pyarrow
+import pyarrow.parquet
+
+from uk_pubs.metrics import RunMetrics, Stage
+from uk_pubs.schema import apply_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+class StageStorage(abc.ABC):
+    '''Storage of the output of each ETL stage, one file per day and stage
+    (e.g. ``<directory>/YYYY-MM-DD-raw.parquet``).
+
+    :param directory: Directory where the stage outputs are saved
+    :type directory: str
+    :param schemas: Column types of each stage, by stage name. Data is cast to
+        them when saved and when loaded
+    :type schemas: dict, optional
+    :param export_csv: Also write a CSV copy of every saved stage
+    :type export_csv: bool
+    :param metrics: Run metrics where every save and load is measured
+    :type metrics: RunMetrics, optional
+    :param labels: Labels of the measured saves and loads (e.g. ``source``)
+    :type labels: dict, optional
+    '''
+    EXTENSION = ''
+
+    def __init__(
+        self,
+        directory: str,
+        schemas: Optional[Dict[str, Dict[str, str]]] = None,
+        export_csv: bool = False,
+        metrics: Optional[RunMetrics] = None,
+        labels: Optional[Dict[str, str]] = None
+    ):
+        self.directory = directory
+        self.schemas = schemas or {}
+        self.export_csv = export_csv
+        self.metrics = metrics
+        self.labels = labels or {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _measure(self, operation: str, stage: str) -> Stage:
+        if self.metrics is None:
+            return Stage(operation, step=stage, **self.labels)
+
+        return self.metrics.stage(operation, step=stage, **self.labels)
+
+    def path(self, day: Union[date, str], stage: str) -> str:
+        '''Return the path of the output of a stage.'''
+        return os.path.join(
+            self.directory, '{}-{}{}'.format(day, stage, self.EXTENSION)
+        )
+
+    def exists(self, day: Union[date, str], stage: str) -> bool:
+        return os.path.exists(self.path(day, stage))
+
+    def days(self, stage: str) -> List[str]:
+        '''Return the days with a saved output of a stage, oldest first.'''
+        pattern = re.compile(
+            r'^(\d{4}-\d{2}-\d{2})-%s%s$'
+            % (re.escape(stage), re.escape(self.EXTENSION))
+        )
+        matches = map(pattern.match, os.listdir(self.directory))
+
+        return sorted(match.group(1) for match in matches if match)
+
+    def latest_day(
+        self,
+        stage: str,
+        before: Union[date, str]
+    ) -> Optional[str]:
+        '''Return the last day before ``before`` with a saved output of a
+        stage, if any.
+        '''
+        days = [day for day in self.days(stage) if day < str(before)]
+
+        return days[-1] if days else None
+
+    def save(
+        self,
+        data: pandas.DataFrame,
+        day: Union[date, str],
+        stage: str
+    ) -> str:
+        '''Save the output of a stage. The index is not saved.
+
+        :return: Path of the saved file
+        :rtype: str
+        '''
+        filepath = self.path(day, stage)
+
+        with self._measure('save', stage) as measured:
+            data = apply_schema(
+                data.reset_index(drop=True), self.schemas.get(stage)
+            )
+            self._write(data, filepath)
+
+            if self.export_csv \
+                    and self.EXTENSION != CsvStageStorage.EXTENSION:
+                data.to_csv(
+                    filepath[:-len(self.EXTENSION)]
+                    + CsvStageStorage.EXTENSION,
+                    index=False
+                )
+
+            measured.rows = len(data)
+            measured.bytes_out = os.path.getsize(filepath)
+
+        return filepath
+
+    def write_batches(
+        self,
+        batches: Iterable[pandas.DataFrame],
+        day: Union[date, str],
+        stage: str
+    ) -> Iterator[pandas.DataFrame]:
+        '''Save the output of a stage batch by batch, as the batches are
+        consumed.
+
+        Every batch is written as soon as it arrives and then yielded, cast
+        to the stage's schema, so the stage can be saved and processed
+        further without holding all of it. Batches must have the columns of
+        the first one: missing columns are left empty, and other columns are
+        dropped. The file only appears once the last batch was written.
+
+        :return: Iterator over the saved batches
+        :rtype: Iterator[pandas.DataFrame]
+        '''
+        measured = self._measure('save', stage)
+
+        return measured.iter(
+            self._write_batches(batches, day, stage, measured)
+        )
+
+    def _write_batches(
+        self,
+        batches: Iterable[pandas.DataFrame],
+        day: Union[date, str],
+        stage: str,
+        measured: Stage
+    ) -> Iterator[pandas.DataFrame]:
+        filepath = self.path(day, stage)
+        partial_path = filepath + '.partial'
+        schema = self.schemas.get(stage)
+        writer = None
+        columns = None
+
+        try:
+            for batch in batches:
+                batch = apply_schema(batch.reset_index(drop=True), schema)
+
+                if columns is None:
+                    columns = list(batch.columns)
+                    dtypes = batch.dtypes
+                elif list(batch.columns) != columns:
+                    dropped = set(batch.columns) - set(columns)
+                    if dropped:
+                        logger.warning(
+                            'Dropping columns missing from the first batch '
+                            'of %s: %s', filepath, ', '.join(sorted(dropped))
+                        )
+                    missing = [
+                        column for column in columns
+                        if column not in batch.columns
+                        and dtypes[column].kind not in 'biu'
+                    ]
+                    batch = batch.reindex(columns=columns)\
+                        .astype(dtypes[missing].to_dict())
+
+                writer = self._write_batch(writer, batch, partial_path)
+
+                yield batch
+
+            if writer is None:
+                self._write(pandas.DataFrame(), partial_path)
+            else:
+                self._close_writer(writer)
+                writer = None
+            os.replace(partial_path, filepath)
+            measured.bytes_out = os.path.getsize(filepath)
+        finally:
+            if writer is not None:
+                self._close_writer(writer)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        if self.export_csv and self.EXTENSION != CsvStageStorage.EXTENSION:
+            self.load(day, stage).to_csv(
+                filepath[:-len(self.EXTENSION)] + CsvStageStorage.EXTENSION,
+                index=False
+            )
+
+    def load(self, day: Union[date, str], stage: str) -> pandas.DataFrame:
+        '''Load the output of a stage.'''
+        filepath = self.path(day, stage)
+
+        with self._measure('load', stage) as measured:
+            data = apply_schema(
+                self._read(filepath, self.schemas.get(stage)),
+                self.schemas.get(stage)
+            )
+
+            measured.rows = len(data)
+            measured.bytes_in = os.path.getsize(filepath)
+
+        return data
+
+    @abc.abstractmethod
+    def _write(self, data: pandas.DataFrame, filepath: str):
+        '''Write a whole stage output to a file.'''
+
+    @abc.abstractmethod
+    def _write_batch(
+        self,
+        writer: Optional[Any],
+        batch: pandas.DataFrame,
+        filepath: str
+    ) -> Any:
+        '''Append a batch to a file, opening the writer on the first batch
+        (``writer`` is then ``None``), and return the writer.
+        '''
+
+    @abc.abstractmethod
+    def _close_writer(self, writer: Any):
+        '''Close a writer returned by ``_write_batch``.'''
+
+    @abc.abstractmethod
+    def _read(
+        self,
+        filepath: str,
+        schema: Optional[Dict[str, str]]
+    ) -> pandas.DataFrame:
+        '''Read a stage output. The schema (if any) gives the column types
+        to formats that do not keep them.
+        '''
+
+
+class CsvStageStorage(StageStorage):
+    '''Stage outputs saved as CSV files.'''
+    EXTENSION = '.csv'
+
+    def _write(self, data: pandas.DataFrame, filepath: str):
+        data.to_csv(filepath, index=False)
+
+    def _write_batch(
+        self,
+        writer: Optional[Any],
+        batch: pandas.DataFrame,
+        filepath: str
+    ) -> Any:
+        if writer is None:
+            writer = open(filepath, 'w', newline='')
+            batch.to_csv(writer, index=False)
+        else:
+            batch.to_csv(writer, index=False, header=False)
+
+        return writer
+
+    def _close_writer(self, writer: Any):
+        writer.close()
+
+    def _read(
+        self,
+        filepath: str,
+        schema: Optional[Dict[str, str]]
+    ) -> pandas.DataFrame:
+        # Dates are parsed by ``apply_schema`` once read
+        dtypes = {
+            column: dtype for column, dtype in (schema or {}).items()
+            if not dtype.startswith('datetime')
+        }
+
+        return pandas.read_csv(filepath, dtype=dtypes)
+
+
+class ParquetStageStorage(StageStorage):
+    '''Stage outputs saved as zstd-compressed Parquet files, which keep the
+    column types and are read back as columns instead of being parsed.
+    '''
+    EXTENSION = '.parquet'
+    COMPRESSION = 'zstd'
+
+    def _write(self, data: pandas.DataFrame, filepath: str):
+        try:
+            table = pyarrow.Table.from_pandas(data, preserve_index=False)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            # Undeclared columns of mixed Python objects (e.g. nested JSON)
+            logger.warning(
+                'Saving mixed-type columns of %s as text', filepath
+            )
+            data = data.copy()
+            for column in data.columns[data.dtypes == object]:
+                data[column] = data[column].astype('string')
+            table = pyarrow.Table.from_pandas(data, preserve_index=False)
+
+        pyarrow.parquet.write_table(
+            table, filepath, compression=self.COMPRESSION
+        )
+
+    def _write_batch(
+        self,
+        writer: Optional[Any],
+        batch: pandas.DataFrame,
+        filepath: str
+    ) -> Any:
+        # Undeclared object columns are saved as text, so a column that is
+        # empty in the first batch does not fix its type for the others
+        batch = batch.astype({
+            column: 'string'
+            for column in batch.columns[batch.dtypes == object]
+        })
+
+        if writer is None:
+            table = pyarrow.Table.from_pandas(batch, preserve_index=False)
+            writer = pyarrow.parquet.ParquetWriter(
+                filepath, table.schema, compression=self.COMPRESSION
+            )
+        else:
+            table = pyarrow.Table.from_pandas(
+                batch, schema=writer.schema, preserve_index=False
+            )
+        writer.write_table(table)
+
+        return writer
+
+    def _close_writer(self, writer: Any):
+        writer.close()
+
+    def _read(
+        self,
+        filepath: str,
+        schema: Optional[Dict[str, str]]
+    ) -> pandas.DataFrame:
+        return pyarrow.parquet.read_table(filepath).to_pandas(
+            split_blocks=True, self_destruct=True
+        )
+
+
+STORAGE_FORMATS = {
+    'parquet': ParquetStageStorage,
+    'csv': CsvStageStorage,
+}
+
+
+def get_storage(
+    storage_format: str,
+    directory: str,
+    schemas: Optional[Dict[str, Dict[str, str]]] = None,
+    export_csv: bool = False,
+    metrics: Optional[RunMetrics] = None,
+    labels: Optional[Dict[str, str]] = None
+) -> StageStorage:
+    '''Create the stage storage for one of the ``STORAGE_FORMATS``.'''
+    return STORAGE_FORMATS[storage_format](
+        directory, schemas, export_csv, metrics, labels
+    )
@@ -0,0 +1,243 @@
+from typing import Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+import json
+import logging
+import random
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+import requests
+
+from uk_pubs.http_cache import ResponseCache
+
+
+logger = logging.getLogger(__name__)
+
+
+def _accept_encoding() -> str:
+    '''Return the content codings this environment can decode. Brotli is only
+    negotiated when a brotli decoder is installed (urllib3 picks it up).
+    '''
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        return 'gzip, deflate, br'
+
+    return 'gzip, deflate'
+
+
+def request_key(method: str, url: str, **kwargs) -> str:
+    '''Return the key of a request, from its method, URL, query parameters
+    and body (see ``ResponseCache.key``).
+
+    Accepts the same keyword arguments as ``requests.Session.request``;
+    parameters and bodies given as dicts are keyed in sorted order.
+    '''
+    if 'json' in kwargs:
+        body = json.dumps(kwargs['json'], sort_keys=True)
+    elif isinstance(kwargs.get('data'), dict):
+        body = urlencode(sorted(kwargs['data'].items()))
+    else:
+        body = kwargs.get('data')
+    if kwargs.get('params'):
+        url = url + '?' + urlencode(sorted(kwargs['params'].items()))
+
+    return ResponseCache.key(method, url, body)
+
+
+class RetryPolicy:
+    '''How failed requests to a host are retried.
+
+    Connection errors, timeouts and responses whose status is in ``statuses``
+    are retried up to ``retries`` times. The wait before attempt ``n`` is
+    drawn uniformly from ``[0, min(max_backoff, backoff * 2 ** n)]`` (full
+    jitter), unless the server sends a ``Retry-After`` header.
+    '''
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        statuses: Iterable[int] = (429, 500, 502, 503, 504)
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+
+    def wait_time(
+        self,
+        attempt: int,
+        response: Optional[requests.Response] = None
+    ) -> float:
+        '''Seconds to wait before retrying after the given (0-based) attempt.
+        '''
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt)
+        )
+
+
+class HttpTransport:
+    '''Pooled, keep-alive HTTP transport shared by the connectors.
+
+    Wraps a single ``requests.Session`` whose connection pool is sized by
+    ``pool_size``, so consecutive requests to the same host reuse their
+    TCP/TLS connections. Compressed responses are negotiated and decoded
+    transparently, every request gets ``timeout`` unless it passes its own,
+    and retries follow the ``RetryPolicy`` of the request's host.
+
+    :param pool_size: Maximum number of connections kept open per host
+    :type pool_size: int
+    :param timeout: Default ``(connect, read)`` timeout, in seconds
+    :type timeout: float or tuple
+    :param retry_policy: Retry policy for hosts not in ``host_policies``
+    :type retry_policy: RetryPolicy, optional
+    :param host_policies: Retry policies by host name
+    :type host_policies: dict, optional
+    :param headers: Headers sent with every request
+    :type headers: dict, optional
+    :param cache: Cache used by requests sent with ``use_cache=True``
+    :type cache: ResponseCache, optional
+    '''
+    DEFAULT_TIMEOUT = (10, 120)
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        retry_policy: Optional[RetryPolicy] = None,
+        host_policies: Optional[Dict[str, RetryPolicy]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        cache: Optional[ResponseCache] = None
+    ):
+        self.timeout = timeout
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.host_policies = host_policies or {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': _accept_encoding(),
+            'Connection': 'keep-alive',
+        })
+        self.session.headers.update(headers or {})
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        use_cache: bool = False,
+        **kwargs
+    ) -> requests.Response:
+        '''Send a request, retrying it according to the host's policy.
+
+        Accepts the same keyword arguments as ``requests.Session.request``.
+        The last response is returned even if its status is still retryable;
+        the last exception is raised if every attempt failed to connect.
+
+        With ``use_cache`` and a ``cache`` configured, the request is sent as
+        a conditional request and a ``304`` answer is replaced by the cached
+        response.
+        '''
+        if use_cache and self.cache is not None:
+            return self._cached_request(method, url, **kwargs)
+
+        return self._request(method, url, **kwargs)
+
+    def _cached_request(
+        self,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> requests.Response:
+        key = request_key(method, url, **kwargs)
+        kwargs['headers'] = {
+            **(kwargs.get('headers') or {}), **self.cache.validators(key)
+        }
+
+        response = self._request(method, url, **kwargs)
+
+        if response.status_code == 304:
+            return self.cache.replay(key, response)
+        if response.ok:
+            self.cache.store(key, response)
+
+        return response
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).hostname
+        policy = self.host_policies.get(host, self.retry_policy)
+
+        for attempt in range(policy.retries + 1):
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == policy.retries:
+                    raise
+                logger.warning('%s %s failed: %s', method, url, error)
+            else:
+                if (
+                    response.status_code not in policy.statuses
+                    or attempt == policy.retries
+                ):
+                    return response
+                logger.warning(
+                    '%s %s returned %d', method, url, response.status_code
+                )
+
+            wait_time = policy.wait_time(attempt, response)
+            logger.info(
+                'Retrying %s %s in %.1fs (attempt %d of %d)',
+                method, url, wait_time, attempt + 2, policy.retries + 1
+            )
+            time.sleep(wait_time)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self) -> 'HttpTransport':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> HttpTransport:
+    '''Return the process-wide transport used by connectors that are not given
+    one explicitly.
+    '''
+    global _default_transport
+
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+
+    return _default_transport
@@ -1,12 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, Optional, Sequence, Tuple, Union
+import functools
 import logging
-from multiprocessing.pool import ThreadPool
-from typing import Sequence
+import math
 
-from lxml import html
+from lxml import etree, html
 import googlemaps
 import pandas
 import numpy
 
+from uk_pubs.geocache import GeocodeCache, normalise_search_string
+from uk_pubs.ratelimit import TokenBucket
+from uk_pubs.reverse_geocoder import ReverseGeocoder
+
 
 logger = logging.getLogger(__name__)
 
@@ -52,34 +58,271 @@ the page's elements.
         logger.debug('Returning root element')
         return root
 
-    result = {}
-    for elem_name, elem_info in structure.items():
-        if isinstance(elem_info, str):                          # Leaf
-            xpath = elem_info
-            inner_result = root.xpath(xpath)
-        elif isinstance(elem_info, (list, tuple, set)):         # Inner node
-            xpath = elem_info[0]
-            inner_structure = elem_info[1]
-
-            inner_result = [
-                mount_html_elements(elem, inner_structure)
-                for elem in root.xpath(xpath)
+    result = compile_structure(structure).mount(root)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Mounted page: %s', result)
+
+    return result
+
+
+class ExtractionPlan:
+    '''A page structure, as described in ``mount_html_elements``, compiled
+    into ``lxml.etree.XPath`` objects so its xpaths are parsed only once.
+
+    :param structure: the structure of the page from its root
+    :type structure: dict
+    '''
+
+    def __init__(self, structure: dict):
+        self.leaves = []
+        self.inner_nodes = []
+        self.names = list(structure)
+
+        for elem_name, elem_info in structure.items():
+            if isinstance(elem_info, str):                      # Leaf
+                self.leaves.append((
+                    elem_name, etree.XPath(elem_info, smart_strings=False)
+                ))
+            elif isinstance(elem_info, (list, tuple, set)):     # Inner node
+                xpath, inner_structure = elem_info
+                self.inner_nodes.append((
+                    elem_name,
+                    etree.XPath(xpath, smart_strings=False),
+                    ExtractionPlan(inner_structure)
+                    if inner_structure else None
+                ))
+            else:
+                logger.warning(
+                    'Bad structure: %s. Returning "None"', elem_info
+                )
+
+    def mount(self, root: html.HtmlElement) -> dict:
+        '''Return the elements under ``root``, with the same output as
+        ``mount_html_elements``.
+        '''
+        result = dict.fromkeys(self.names)
+
+        for elem_name, xpath in self.leaves:
+            result[elem_name] = xpath(root)
+        for elem_name, xpath, plan in self.inner_nodes:
+            result[elem_name] = [
+                plan.mount(elem) if plan else elem for elem in xpath(root)
+            ]
+
+        return result
+
+    def record(self, root: html.HtmlElement, separator: str = ', ') -> dict:
+        '''Return the leaves under ``root`` as strings, each one being its
+        matches joined by ``separator``.
+        '''
+        return {
+            elem_name: separator.join(xpath(root))
+            for elem_name, xpath in self.leaves
+        }
+
+    def columns(
+        self,
+        root: html.HtmlElement,
+        separator: str = ', '
+    ) -> dict:
+        '''Return the elements under ``root`` as flat columns.
+
+        Each leaf of an inner node becomes a list with one string per matched
+        element (its matches joined by ``separator``), ready to be turned
+        into a DataFrame. Leaves directly under ``root`` are returned as they
+        are matched.
+
+        Examples:
+            .. code-block:: python
+
+                plan = compile_structure(structure)
+                print(plan.columns(html_obj)['shopping_items'])
+
+            .. code-block:: bash
+
+                # Stdout:
+                {'name': ['Name1', ..], 'link': ['Link1', ..]}
+        '''
+        result = dict.fromkeys(self.names)
+
+        for elem_name, xpath in self.leaves:
+            result[elem_name] = xpath(root)
+        for elem_name, xpath, plan in self.inner_nodes:
+            elements = xpath(root)
+            if plan is None:
+                result[elem_name] = elements
+                continue
+
+            columns = {name: [] for name, _ in plan.leaves}
+            appenders = [
+                (columns[name].append, leaf_xpath)
+                for name, leaf_xpath in plan.leaves
             ]
+            for elem in elements:
+                for append, leaf_xpath in appenders:
+                    append(separator.join(leaf_xpath(elem)))
+            for name, inner_xpath, inner_plan in plan.inner_nodes:
+                columns[name] = [
+                    [
+                        inner_plan.mount(inner) if inner_plan else inner
+                        for inner in inner_xpath(elem)
+                    ]
+                    for elem in elements
+                ]
+
+            result[elem_name] = columns
+
+        return result
+
+
+# Most extraction plans kept by ``compile_structure``
+PLAN_CACHE_SIZE = 64
+
+
+def _freeze(structure: dict) -> tuple:
+    # Hashable form of a structure, inner nodes being (xpath, frozen inner
+    # structure) pairs
+    frozen = []
+    for elem_name, elem_info in structure.items():
+        if isinstance(elem_info, (list, tuple, set)):
+            xpath, inner_structure = elem_info
+            elem_info = (
+                xpath, _freeze(inner_structure) if inner_structure else None
+            )
+        frozen.append((elem_name, elem_info))
+
+    return tuple(frozen)
+
+
+def _thaw(frozen: tuple) -> dict:
+    return {
+        elem_name: (elem_info[0], elem_info[1] and _thaw(elem_info[1]))
+        if isinstance(elem_info, tuple) else elem_info
+        for elem_name, elem_info in frozen
+    }
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile(frozen: tuple) -> ExtractionPlan:
+    return ExtractionPlan(_thaw(frozen))
+
+
+def compile_structure(structure: dict) -> ExtractionPlan:
+    '''Return the ``ExtractionPlan`` of a structure. The plans of the last
+    ``PLAN_CACHE_SIZE`` structures used are cached by their content, so equal
+    structures share a plan.
+    '''
+    return _compile(_freeze(structure))
+
+
+# Most threads sending GoogleMaps requests, whatever the rate limit
+MAX_GEOCODE_THREADS = 100
+
+
+def iter_geocode(
+    gm_client: googlemaps.Client,
+    search_strings: Sequence[str],
+    n_threads: Optional[int] = None,
+    cache: Optional[GeocodeCache] = None,
+    qps: float = 50,
+    burst: Optional[float] = None
+) -> Iterator[Tuple[str, list]]:
+    '''Geocode search strings, yielding ``(search_string, result)`` pairs as
+    the results arrive.
+
+    Search strings that are equal once normalised are sent to GoogleMaps only
+    once, and requests are throttled by a token bucket of ``qps`` requests per
+    second, with bursts of up to ``burst`` requests. Queries that fail are
+    logged, yield an empty result and are not cached, so they are retried on
+    the next run.
+
+    :param gm_client: GoogleMaps client to be used to perform the searches
+    :type gm_client: googlemaps.Client
+    :param search_strings: any sequence of strings
+    :type search_strings: Sequence[str]
+    :param n_threads: Maximum number of concurrent GoogleMaps requests.
+        Defaults to ``burst``, the most requests the bucket lets through at
+        once (up to ``MAX_GEOCODE_THREADS``)
+    :type n_threads: int, optional
+    :param cache: persistent cache of GoogleMaps responses
+    :type cache: GeocodeCache, optional
+    :param qps: Maximum number of GoogleMaps requests per second
+    :type qps: float
+    :param burst: Maximum number of GoogleMaps requests sent at once.
+        Defaults to ``qps``
+    :type burst: float, optional
+    :return: Iterator over each search string and its GoogleMaps result
+    :rtype: Iterator[Tuple[str, list]]
+    '''
+    queries = {}
+    for search_string in search_strings:
+        queries.setdefault(
+            normalise_search_string(search_string), []
+        ).append(search_string)
+
+    pending = {}
+    for key, group in queries.items():
+        result = cache.get(group[0]) if cache is not None else None
+
+        if result is None:
+            pending[key] = group
         else:
-            logger.warning('Bad structure: %s. Returning "None"', elem_info)
-            inner_result = None
+            for search_string in group:
+                yield search_string, result
 
-        result.update({elem_name: inner_result})
+    if not pending:
+        return
 
-    logger.debug('Mounted page: %s', result)
+    bucket = TokenBucket(qps, burst)
+    n_threads = n_threads or math.ceil(
+        min(bucket.burst, len(pending), MAX_GEOCODE_THREADS)
+    )
 
-    return result
+    logger.info(
+        'Getting GoogleMaps results for %d unique search strings (out of %d) '
+        'using %d threads at up to %s requests per second',
+        len(pending), len(search_strings), n_threads, qps
+    )
+
+    def geocode(search_string: str) -> list:
+        bucket.acquire()
+        return gm_client.geocode(search_string)
+
+    executor = ThreadPoolExecutor(n_threads)
+    try:
+        futures = {
+            executor.submit(geocode, group[0]): group
+            for group in pending.values()
+        }
+
+        for future in as_completed(futures):
+            group = futures[future]
+
+            try:
+                result = future.result()
+            except Exception as error:
+                logger.warning(
+                    'GoogleMaps search for "%s" failed: %r', group[0], error
+                )
+                result = []
+            else:
+                if cache is not None:
+                    cache.set(group[0], result)
+
+            for search_string in group:
+                yield search_string, result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
 def get_geoinfo(
-    gm_client: googlemaps.Client,
+    gm_client: Union[googlemaps.Client, ReverseGeocoder],
     search_strings: Sequence[str],
-    n_threads: int = 50
+    n_threads: Optional[int] = None,
+    cache: Optional[GeocodeCache] = None,
+    qps: float = 50,
+    burst: Optional[float] = None
 ) -> pandas.DataFrame:
     '''Return the following information about locations, given their search
     strings:
@@ -94,78 +337,164 @@ def get_geoinfo(
     - FormattedAddress
     - NutsL1Region (TODO)
 
-    :param gm_client: GoogleMaps client to be used to perform the searches
-    :type gm_client: googlemaps.Client
+    :param gm_client: GoogleMaps client to be used to perform the searches,
+        or a ``ReverseGeocoder`` to resolve ``"lat, long"`` search strings
+        offline (in which case the other arguments are ignored)
+    :type gm_client: googlemaps.Client or ReverseGeocoder
     :param search_str: any sequence of strings
     :type search_str: Sequence[str]
+    :param n_threads: Maximum number of concurrent GoogleMaps requests.
+        Defaults to the number allowed by ``qps`` and ``burst`` (see
+        ``iter_geocode``)
+    :type n_threads: int, optional
+    :param cache: persistent cache of GoogleMaps responses. Only the search
+        strings missing from (or expired in) the cache are sent to GoogleMaps
+    :type cache: GeocodeCache, optional
+    :param qps: Maximum number of GoogleMaps requests per second
+    :type qps: float
+    :param burst: Maximum number of GoogleMaps requests sent at once.
+        Defaults to ``qps``
+    :type burst: float, optional
     :return: DataFrame with all the information above
     :rtype: pandas.DataFrame
     '''
-    pool = ThreadPool(n_threads)
+    if isinstance(gm_client, ReverseGeocoder):
+        return gm_client.geoinfo(search_strings)
 
-    logger.info(
-        'Getting GoogleMaps results for %d search strings using %d threads',
-        len(search_strings), n_threads
-    )
+    search_strings = list(search_strings)
+
+    results = dict(iter_geocode(
+        gm_client, search_strings, n_threads, cache, qps, burst
+    ))
+    gm_results = [results[search_string] for search_string in search_strings]
 
-    gm_results = pool.map(gm_client.geocode, search_strings)
+    if cache is not None:
+        cache.log_stats()
 
     logger.info('Geoinfo data retrieved. Now formatting')
 
-    full_data = []
+    return format_geoinfo(search_strings, gm_results)
 
-    for index in range(len(gm_results)):
-        search_string = search_strings[index]
-        result = gm_results[index]
 
-        logger.info('Formatting GoogleMaps results for %s', search_string)
+# GoogleMaps address component types (the first type of each component) and
+# the column of ``get_geoinfo`` output they fill
+ADDRESS_COMPONENT_COLUMNS = {
+    'street_number': 'StreetNumber',
+    'route': 'Route',
+    'postal_town': 'City',
+    'administrative_area_level_2': 'Region',
+    'administrative_area_level_1': 'State',
+    'country': 'Country',
+    'postal_code': 'PostalCode',
+}
 
-        if len(result) != 0:
-            data = {
-                component['types'][0]: component['short_name']
-                for component in result[0]['address_components']
-            }
-            data.update({
-                'lat': result[0]['geometry']['location']['lat'],
-                'lng': result[0]['geometry']['location']['lng'],
-                'formatted_address': result[0]['formatted_address']
-            })
-        else:
-            logger.warning(
-                '"%s" rendered no response from GoogleMaps',
-                search_string
-            )
-            data = {}
-
-        full_data.append(data)
-
-    full_data = pandas.DataFrame(full_data).fillna('')
-
-    final_data = pandas.DataFrame()
-
-    final_data[['Lat', 'Long']] = full_data[['lat', 'lng']]
-    final_data['StreetAddress'] = (
-        full_data['street_number'] + ', ' + full_data['route']
-    ).str.strip(to_strip=', ')
-    final_data[[
-        'City',
-        'Region',
-        'State',
-        'Country',
-        'PostalCode',
-        'FormattedAddress'
-    ]] = full_data[[
-        'postal_town',
-        'administrative_area_level_2',
-        'administrative_area_level_1',
-        'country',
-        'postal_code',
-        'formatted_address'
-    ]]
-
-    final_data.replace('', numpy.nan, inplace=True)
-
-    final_data['SearchString'] = search_strings
-    final_data.set_index('SearchString', inplace=True)
-
-    return final_data
+
+def format_geoinfo(
+    search_strings: Sequence[str],
+    gm_results: Sequence[list]
+) -> pandas.DataFrame:
+    '''Build the output of ``get_geoinfo`` from the GoogleMaps results of
+    each search string, in a single pass over preallocated columns.
+
+    :param search_strings: any sequence of strings
+    :type search_strings: Sequence[str]
+    :param gm_results: GoogleMaps geocode result of each search string
+    :type gm_results: Sequence[list]
+    :return: DataFrame with the geo information, indexed by search string
+    :rtype: pandas.DataFrame
+    '''
+    size = len(search_strings)
+    lat = [numpy.nan] * size
+    lng = [numpy.nan] * size
+    formatted_address = [None] * size
+    columns = {
+        column: [None] * size for column in ADDRESS_COMPONENT_COLUMNS.values()
+    }
+    # Component type -> column list, so each component costs one lookup;
+    # components of other types are written to a column that is dropped
+    ignored = [None] * size
+    slot = {
+        component_type: columns[column]
+        for component_type, column in ADDRESS_COMPONENT_COLUMNS.items()
+    }.get
+    empty = []
+
+    for index, result in enumerate(gm_results):
+        if not result:
+            empty.append(index)
+            continue
+
+        result = result[0]
+        location = result['geometry']['location']
+        lat[index] = location['lat']
+        lng[index] = location['lng']
+        formatted_address[index] = result['formatted_address'] or None
+
+        for component in result['address_components']:
+            slot(component['types'][0], ignored)[index] = \
+                component['short_name']
+
+    if empty:
+        logger.warning(
+            '%d search strings rendered no response from GoogleMaps, e.g. %s',
+            len(empty),
+            ', '.join('"%s"' % search_strings[index] for index in empty[:5])
+        )
+
+    # Object arrays, which pandas takes as they are instead of inferring the
+    # type of every value
+    columns = {
+        column: _object_array(values) for column, values in columns.items()
+    }
+
+    # "number, route", or whichever of them is not empty
+    number = columns.pop('StreetNumber')
+    route = columns.pop('Route')
+    has_number = number.astype(bool)
+    has_route = route.astype(bool)
+    street_address = numpy.full(size, None, dtype=object)
+    street_address[has_route] = route[has_route]
+    street_address[has_number] = number[has_number]
+    both = has_number & has_route
+    street_address[both] = number[both] + ', ' + route[both]
+
+    return pandas.DataFrame(
+        {
+            'Lat': numpy.array(lat, dtype='float64'),
+            'Long': numpy.array(lng, dtype='float64'),
+            'StreetAddress': street_address,
+            **columns,
+            'FormattedAddress': _object_array(formatted_address),
+        },
+        index=pandas.Index(search_strings, name='SearchString')
+    )
+
+
+def _object_array(values: list) -> numpy.ndarray:
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+
+    return array
+
+
+def merge_geoinfo(
+    data: pandas.DataFrame,
+    geo_info: pandas.DataFrame
+) -> pandas.DataFrame:
+    '''Add the information returned by ``get_geoinfo`` to data with a
+    ``SearchString`` column. Values found by the geocoder take precedence over
+    the ones already in the data.
+
+    :param data: Data with a ``SearchString`` column
+    :type data: pandas.DataFrame
+    :param geo_info: Output of ``get_geoinfo``, indexed by search string
+    :type geo_info: pandas.DataFrame
+    :return: Data with the geo information, without the ``SearchString``
+        column
+    :rtype: pandas.DataFrame
+    '''
+    geo_info = geo_info[~geo_info.index.duplicated()]\
+        .reindex(data['SearchString'])\
+        .set_axis(data.index, axis=0)
+
+    return geo_info.combine_first(data.drop(columns='SearchString'))